@@ -0,0 +1,83 @@
+"""Headless stand-ins for the window, clipboard and hotkey used by the benchmarks"""
+import re
+import threading
+import time
+
+BRIDGE_CALL = re.compile(r'^bridgeCall\("(\w+)"')
+
+
+class FakeWindow:
+    """Records every evaluate_js script and the page function it calls"""
+
+    def __init__(self):
+        self.scripts = []
+        self.calls = []
+        self._condition = threading.Condition()
+
+    def evaluate_js(self, script):
+        match = BRIDGE_CALL.match(script)
+        with self._condition:
+            self.scripts.append(script)
+            if match:
+                self.calls.append((match.group(1), time.perf_counter()))
+                self._condition.notify_all()
+
+    def count(self, *functions):
+        with self._condition:
+            return sum(1 for name, _ in self.calls if name in functions)
+
+    def wait_for(self, functions, count, timeout=60):
+        """Wait until ``count`` calls to any of ``functions`` were recorded; returns their times"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                times = [at for name, at in self.calls if name in functions]
+                if len(times) >= count:
+                    return times
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f'Only {len(times)} of {count} calls to {functions}')
+                self._condition.wait(remaining)
+
+    def reset(self):
+        with self._condition:
+            self.scripts.clear()
+            self.calls.clear()
+
+    def show(self):
+        pass
+
+    def hide(self):
+        pass
+
+    def destroy(self):
+        pass
+
+
+class FakeClipboard:
+    """Clipboard handler that keeps the clipboard in memory"""
+
+    def __init__(self, selection=''):
+        self.selection = selection
+        self.clipboard = ''
+        self.replaced = []
+        self.callbacks = []
+        self.last_capture_latency = 0.0
+
+    def register_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def get_highlighted_text(self):
+        for callback in self.callbacks:
+            callback(self.selection)
+
+    def copy_text(self, text):
+        self.clipboard = text
+
+    def replace_text(self, text):
+        self.replaced.append(text)
+
+
+class FakeHotkey:
+    def update_hotkey(self, new_combination):
+        pass
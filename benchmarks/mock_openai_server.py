@@ -0,0 +1,230 @@
+"""Local stand-in for an OpenAI-compatible chat-completions endpoint.
+
+Answers ``POST /v1/chat/completions`` both streamed (server-sent events) and
+non-streamed, after a configurable time to first token and at a configurable
+token rate, so rewrites can be measured offline. The reply echoes the
+``<text>`` of the request, or filler words if there is none, cut off at
+``max_tokens`` with ``finish_reason`` "length". Usage is reported like the
+real API: in the response, or in a last chunk when a stream asks for it.
+
+Failures and tail latency can be injected to exercise retries and hedging:
+``error_rate`` of the requests fail with ``error_status`` (and ``Retry-After``
+when ``retry_after`` is set), and ``slow_rate`` of them wait ``slow_latency``
+instead of ``latency`` before the first token.
+
+Run it:      python -m benchmarks.mock_openai_server --port 8765 --latency-ms 300
+Point the app at it with base_url ``http://127.0.0.1:8765/v1/`` and any API key.
+
+Or start it in-process:
+
+    with MockOpenAIServer(latency=0.2, tokens_per_second=100) as server:
+        ...  # use server.base_url
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = 'The quick brown fox jumps over the lazy dog.'
+
+def tokenize(text):
+    # Whitespace-preserving word pieces, roughly like model tokens
+    return re.findall(r'\s*\S+', text) or ['']
+
+def reply_for(messages, max_tokens):
+    """Reply tokens and finish reason for a request"""
+    user = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    match = re.search(r'<text>(.*)</text>', user, re.S)
+    tokens = tokenize(match.group(1) if match else FILLER)
+    if max_tokens and len(tokens) > max_tokens:
+        return tokens[:max_tokens], 'length'
+    return tokens, 'stop'
+
+def usage_for(messages, tokens):
+    prompt_tokens = sum(len(tokenize(m.get('content', ''))) for m in messages)
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+            'total_tokens': prompt_tokens + len(tokens)}
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock-model', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        self.server.record_request()
+
+        if random.random() < self.server.error_rate:
+            headers = {}
+            if self.server.retry_after is not None:
+                headers['Retry-After'] = str(self.server.retry_after)
+            self._send_json(self.server.error_status,
+                {'error': {'message': 'Injected failure', 'type': 'server_error'}}, headers)
+            return
+
+        messages = request.get('messages', [])
+        tokens, finish_reason = reply_for(messages, request.get('max_tokens'))
+        usage = usage_for(messages, tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get('model', 'mock-model')
+        slow = random.random() < self.server.slow_rate
+        time.sleep(self.server.slow_latency if slow else self.server.latency)
+
+        if request.get('stream'):
+            include_usage = (request.get('stream_options') or {}).get('include_usage')
+            self._stream(completion_id, model, tokens, finish_reason, usage if include_usage else None)
+            return
+
+        time.sleep(len(tokens) * self.server.token_interval)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'finish_reason': finish_reason,
+            }],
+            'usage': usage,
+        })
+
+    def _stream(self, completion_id, model, tokens, finish_reason, usage=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(delta, finish_reason=None, usage=None):
+            body = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [] if usage else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            if usage:
+                body['usage'] = usage
+            return f"data: {json.dumps(body)}\n\n"
+
+        try:
+            self._write_chunk(event({'role': 'assistant', 'content': ''}))
+            for token in tokens:
+                self._write_chunk(event({'content': token}))
+                time.sleep(self.server.token_interval)
+            self._write_chunk(event({}, finish_reason))
+            if usage:
+                self._write_chunk(event({}, usage=usage))
+            self._write_chunk('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request
+            self.close_connection = True
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Threaded mock endpoint; ``latency`` and ``tokens_per_second`` shape the replies"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2, tokens_per_second=50, verbose=False,
+            error_rate=0.0, error_status=503, retry_after=None, slow_rate=0.0, slow_latency=2.0):
+        super().__init__((host, port), MockOpenAIHandler)
+        self.latency = latency
+        self.token_interval = 1 / tokens_per_second if tokens_per_second else 0
+        self.verbose = verbose
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible mock server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=200, help='time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=50, help='0 sends all tokens at once')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--retry-after', type=float, help='Retry-After seconds sent with failures')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='fraction of requests that are slow')
+    parser.add_argument('--slow-latency-ms', type=float, default=2000, help='time to first token when slow')
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency_ms / 1000, args.tokens_per_second, args.verbose,
+        error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency_ms / 1000)
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""Local stand-in for a GitHub release and its download host.
+
+Serves a generated fake release asset with Range, ETag and ``.sha256``
+support, plus a ``releases/latest`` document pointing at it, so update checks
+and downloads can be exercised offline. Like the GitHub API, the release
+document honours If-None-Match with 304s that don't count against
+``rate_limit`` and sends X-RateLimit headers. Asset responses can be
+throttled, and cut off after ``drop_after`` bytes to simulate an
+interrupted download.
+
+Run it:      python -m benchmarks.mock_release_server --size-mb 50 --rate-mbps 20
+
+Or start it in-process and download with resume and verification:
+
+    with MockReleaseServer(size=8 * 1024 * 1024, drop_after=1024 * 1024) as server:
+        SegmentedDownloader().download(server.asset_url, 'update.exe', server.sha256)
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ASSET_NAME = 'open-rewrite-windows-x64.exe'
+REPO = 'SomaRe/open_rewrite'
+
+
+class MockReleaseHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?')[0]
+        if path == f'/repos/{REPO}/releases/latest':
+            self._send_release()
+        elif path == f'/download/{ASSET_NAME}.sha256':
+            self._send(200, f"{server.sha256}  {ASSET_NAME}\n".encode(), 'text/plain')
+        elif path == f'/download/{ASSET_NAME}':
+            self._send_asset()
+        else:
+            self._send(404, b'{"message": "Not Found"}')
+
+    def _send_release(self):
+        server = self.server
+        body = json.dumps(server.release()).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        with server._count_lock:
+            server.release_requests += 1
+            if self.headers.get('If-None-Match') == etag:
+                server.not_modified += 1
+                status = 304
+            elif server.rate_limit is not None and server.rate_remaining <= 0:
+                status = 403
+            else:
+                if server.rate_limit is not None:
+                    server.rate_remaining -= 1
+                status = 200
+            headers = {'ETag': etag}
+            if server.rate_limit is not None:
+                headers.update({
+                    'X-RateLimit-Limit': str(server.rate_limit),
+                    'X-RateLimit-Remaining': str(max(0, server.rate_remaining)),
+                    'X-RateLimit-Reset': str(int(server.rate_reset)),
+                })
+        if status == 304:
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+        elif status == 403:
+            self._send(403, b'{"message": "API rate limit exceeded"}', headers=headers)
+        else:
+            self._send(200, body, headers=headers)
+
+    def _send_asset(self):
+        server = self.server
+        server.record_request()
+        data = server.asset
+        start, end = 0, len(data) - 1
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if start > end:
+                self._send(416, b'', headers={'Content-Range': f'bytes */{len(data)}'})
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f'"{server.sha256[:16]}"')
+        self.end_headers()
+
+        sent = 0
+        chunk_size = 64 * 1024
+        try:
+            for offset in range(start, end + 1, chunk_size):
+                chunk = data[offset:min(offset + chunk_size, end + 1)]
+                if server.drop_after is not None and sent + len(chunk) > server.drop_after:
+                    # Send part of the body, then hang up like a flaky connection
+                    self.wfile.write(chunk[:server.drop_after - sent])
+                    self.close_connection = True
+                    return
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if server.rate:
+                    time.sleep(len(chunk) / server.rate)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class MockReleaseServer(ThreadingHTTPServer):
+    """Threaded mock release host serving ``size`` bytes of deterministic data"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, size=4 * 1024 * 1024, version='99.0.0', rate=None,
+            drop_after=None, verbose=False, rate_limit=None, rate_reset_in=3600):
+        super().__init__((host, port), MockReleaseHandler)
+        # Pseudo-random but repeatable, so a resumed download must match exactly
+        seed = hashlib.sha256(b'open-rewrite').digest()
+        self.asset = (seed * (size // len(seed) + 1))[:size]
+        self.asset = bytes(b ^ (i % 251) for i, b in enumerate(self.asset))
+        self.sha256 = hashlib.sha256(self.asset).hexdigest()
+        self.version = version
+        self.rate = rate
+        self.drop_after = drop_after
+        self.verbose = verbose
+        self.request_count = 0
+        self.release_requests = 0
+        self.not_modified = 0
+        self.rate_limit = rate_limit
+        self.rate_remaining = rate_limit or 0
+        self.rate_reset = time.time() + rate_reset_in
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def asset_url(self):
+        return f"{self.base_url}/download/{ASSET_NAME}"
+
+    @property
+    def latest_release_url(self):
+        return f"{self.base_url}/repos/{REPO}/releases/latest"
+
+    def release(self):
+        return {
+            'tag_name': f'v{self.version}',
+            'body': 'Fake release served by the mock release server.',
+            'assets': [
+                {'name': ASSET_NAME, 'browser_download_url': self.asset_url,
+                 'size': len(self.asset), 'digest': f'sha256:{self.sha256}'},
+                {'name': f'{ASSET_NAME}.sha256', 'browser_download_url': f'{self.asset_url}.sha256'},
+            ],
+        }
+
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-release', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of a GitHub release and its asset')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--version', default='99.0.0')
+    parser.add_argument('--rate-mbps', type=float, help='throttle every response to this many MB/s')
+    parser.add_argument('--drop-after-kb', type=float, help='cut every response off after this many KB')
+    parser.add_argument('--rate-limit', type=int, help='release API requests allowed before 403s')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = MockReleaseServer(args.host, args.port, int(args.size_mb * 1024 * 1024), args.version,
+        rate=args.rate_mbps * 1024 * 1024 if args.rate_mbps else None,
+        drop_after=int(args.drop_after_kb * 1024) if args.drop_after_kb else None, verbose=args.verbose,
+        rate_limit=args.rate_limit)
+    print(f"Mock release at {server.latest_release_url}")
+    print(f"Asset {server.asset_url} (sha256 {server.sha256})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Benchmark the rewrite pipeline headlessly against the mock chat-completions server.
+
+Drives ``WebViewAPI`` and ``RewriteManager`` with a fake window (recording
+evaluate_js) and a fake clipboard, against ``MockOpenAIServer``. For each LLM
+backend it runs these scenarios:
+
+- sequential: one click at a time, waiting for each result
+- superseding: rapid clicks where each one cancels the previous request
+- large selection: selections over the chunk budget, split and merged
+- fan-out: many concurrent rewrites, plus one compare of several options
+
+and reports throughput, p50/p99 latency, peak RSS and peak thread count.
+Results are written as JSON so releases can be compared:
+
+    python -m benchmarks.pipeline_benchmark
+    python -m benchmarks.pipeline_benchmark --compare benchmarks/results/old.json
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fakes import FakeClipboard, FakeHotkey, FakeWindow
+from benchmarks.mock_openai_server import MockOpenAIServer
+from src import __version__
+from src.apis.webview_api import WebViewAPI
+from src.managers.llm.async_openai_manager import AsyncOpenAIManager
+from src.managers.llm.openai_manager import OpenAIManager
+from src.managers.rewrite_manager import RewriteManager
+from src.managers.settings_manager import SettingsManager
+from src.utils.tracing import percentile
+from src.utils.worker_pool import WorkerPool
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+SELECTION = 'Please could you let me know when the report will be ready, as the team is waiting on it. '
+DONE = ('showResult', 'showError')
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unknown"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage')
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    try:
+        import resource
+        # ru_maxrss is the lifetime peak, in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+class ResourceSampler:
+    """Samples RSS and thread count in the background and keeps the peaks"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, current_rss() or 0)
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+class Pipeline:
+    """A WebViewAPI wired to the mock server with fake window and clipboard"""
+
+    def __init__(self, backend, base_url, workdir, max_concurrent):
+        self.settings_manager = SettingsManager(
+            settings_file=os.path.join(workdir, f'settings-{backend}.json'), save_delay=60)
+        self.settings_manager.settings.update({
+            'api_key': 'benchmark',
+            'base_url': base_url,
+            'model': 'mock-model',
+            'cache_enabled': False,
+            'stream_responses': True,
+            'max_concurrent_requests': max_concurrent,
+            'llm_backend': backend,
+        })
+        self.settings_manager.save_settings()
+
+        if backend == 'asyncio':
+            self.llm_manager = AsyncOpenAIManager(max_concurrent)
+        else:
+            self.llm_manager = OpenAIManager(WorkerPool(max_workers=max_concurrent, name='llm'))
+        self.window = FakeWindow()
+        self.clipboard = FakeClipboard(SELECTION)
+        self.rewrite_manager = RewriteManager(self.llm_manager, self.settings_manager, self.clipboard)
+        self.api = WebViewAPI(self.settings_manager, self.rewrite_manager, self.clipboard, FakeHotkey())
+        self.api.set_window(self.window)
+
+    def close(self):
+        self.llm_manager.close()
+        # Write now, while the temporary directory still exists, instead of at exit
+        self.settings_manager.flush()
+        atexit.unregister(self.settings_manager.flush)
+
+
+def summarize(latencies, elapsed, sampler, **extra):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': percentile(latencies_ms, 0.5) if latencies_ms else None,
+        'p99_ms': percentile(latencies_ms, 0.99) if latencies_ms else None,
+        'peak_rss_mb': sampler.peak_rss / (1024 * 1024),
+        'peak_threads': sampler.peak_threads,
+        **extra,
+    }
+
+def scenario_sequential(pipeline, server, rounds):
+    """One click at a time, each waiting for its result"""
+    latencies = []
+    started = time.perf_counter()
+    for index in range(rounds):
+        click = time.perf_counter()
+        pipeline.api.rewrite_text(SELECTION, 'Professional', 'tones')
+        done = pipeline.window.wait_for(DONE, index + 1)[-1]
+        latencies.append(done - click)
+    return latencies, time.perf_counter() - started, {}
+
+def scenario_superseding(pipeline, server, rounds, gap=0.02):
+    """Rapid clicks; only the last one should reach the page"""
+    requests_before = server.request_count
+    started = time.perf_counter()
+    for option in ['Friendly', 'Professional', 'Polite', 'Casual', 'Concise'] * (rounds // 5 or 1):
+        last_click = time.perf_counter()
+        pipeline.api.rewrite_text(SELECTION, option, 'tones')
+        time.sleep(gap)
+    done = pipeline.window.wait_for(DONE, 1)[-1]
+    # Give superseded requests time to report, which they must not do
+    time.sleep(0.5)
+    return [done - last_click], time.perf_counter() - started, {
+        'results_shown': pipeline.window.count(*DONE),
+        'provider_requests': server.request_count - requests_before,
+    }
+
+def scenario_large_selection(pipeline, server, rounds, chars=40_000):
+    """Selections over the chunk budget are split, sent concurrently and joined"""
+    text = (SELECTION * (chars // len(SELECTION) + 1))[:chars]
+    text = '\n\n'.join(text[start:start + 2000] for start in range(0, len(text), 2000))
+    requests_before = server.request_count
+    latencies = []
+    started = time.perf_counter()
+    for index in range(rounds):
+        click = time.perf_counter()
+        pipeline.api.rewrite_text(text, 'Professional', 'tones')
+        done = pipeline.window.wait_for(DONE, index + 1)[-1]
+        latencies.append(done - click)
+    return latencies, time.perf_counter() - started, {
+        'chars': len(text),
+        'provider_requests': server.request_count - requests_before,
+    }
+
+def scenario_fan_out(pipeline, server, rounds):
+    """Many rewrites in flight at once through RewriteManager, then one compare"""
+    latencies = []
+    lock = threading.Lock()
+    all_done = threading.Event()
+
+    def on_done(click):
+        with lock:
+            latencies.append(time.perf_counter() - click)
+            if len(latencies) == rounds:
+                all_done.set()
+
+    started = time.perf_counter()
+    for index in range(rounds):
+        click = time.perf_counter()
+        pipeline.rewrite_manager.rewrite_text(f'{SELECTION} ({index})', 'Rewrite this professionally.',
+            lambda response, click=click: on_done(click), lambda error, click=click: on_done(click),
+            on_chunk=lambda delta: None)
+    if not all_done.wait(120):
+        raise TimeoutError(f'Only {len(latencies)} of {rounds} fan-out requests finished')
+    elapsed = time.perf_counter() - started
+
+    options = [['Friendly', 'tones'], ['Professional', 'tones'], ['Summary', 'formats'], ['List', 'formats']]
+    click = time.perf_counter()
+    pipeline.api.compare_options(SELECTION, options)
+    compare_done = pipeline.window.wait_for(('showCompareResult', 'showCompareError'), len(options))[-1]
+    return latencies, elapsed, {'compare_options': len(options), 'compare_ms': (compare_done - click) * 1000}
+
+SCENARIOS = {
+    'sequential': (scenario_sequential, 20),
+    'superseding': (scenario_superseding, 20),
+    'large_selection': (scenario_large_selection, 2),
+    'fan_out': (scenario_fan_out, 64),
+}
+
+def run(backends, latency, tokens_per_second, max_concurrent):
+    results = {}
+    with MockOpenAIServer(latency=latency, tokens_per_second=tokens_per_second) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        for backend in backends:
+            pipeline = Pipeline(backend, server.base_url, workdir, max_concurrent)
+            # Warm up the client so the first scenario doesn't pay for imports and connects
+            scenario_sequential(pipeline, server, 1)
+            results[backend] = {}
+            for name, (scenario, rounds) in SCENARIOS.items():
+                pipeline.window.reset()
+                with ResourceSampler() as sampler:
+                    latencies, elapsed, extra = scenario(pipeline, server, rounds)
+                results[backend][name] = summarize(latencies, elapsed, sampler, **extra)
+                print(f"{backend:<8} {name:<16} " + ', '.join(
+                    f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                    for key, value in results[backend][name].items()))
+            pipeline.close()
+    return results
+
+def compare(current, baseline_path):
+    """Print the change of every metric against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['meta']['version']} ({baseline['meta']['timestamp']}):")
+    for backend, scenarios in current['results'].items():
+        for name, metrics in scenarios.items():
+            old = baseline['results'].get(backend, {}).get(name, {})
+            for key in ('throughput_rps', 'p50_ms', 'p99_ms', 'peak_rss_mb', 'peak_threads'):
+                if metrics.get(key) is None or not old.get(key):
+                    continue
+                change = (metrics[key] - old[key]) / old[key] * 100
+                print(f"  {backend:<8} {name:<16} {key:<15} {old[key]:>10.1f} -> {metrics[key]:>10.1f} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rewrite pipeline against a mock provider')
+    parser.add_argument('--backend', choices=['threads', 'asyncio', 'all'], default='all')
+    parser.add_argument('--latency-ms', type=float, default=100, help='mock time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=200, help='mock token rate')
+    parser.add_argument('--max-concurrent', type=int, default=4)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<version>-<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    backends = ['threads', 'asyncio'] if args.backend == 'all' else [args.backend]
+    results = run(backends, args.latency_ms / 1000, args.tokens_per_second, args.max_concurrent)
+
+    timestamp = datetime.now(timezone.utc)
+    report = {
+        'meta': {
+            'version': __version__,
+            'timestamp': timestamp.isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mock_latency_ms': args.latency_ms,
+            'mock_tokens_per_second': args.tokens_per_second,
+            'max_concurrent': args.max_concurrent,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{__version__}-{timestamp:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
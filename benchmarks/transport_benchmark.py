@@ -0,0 +1,80 @@
+"""Compare ways of handing a result from Python to the page.
+
+Measures the Python side of one showResult call for 1 KB, 100 KB and 1 MB
+payloads: building the scripts, plus the escaping pywebview applies before
+evaluating them. It reports the characters sent to the webview and the
+largest single script, which is evaluated in one go on the UI thread.
+
+- repr: the old ``showResult(repr(text))`` script
+- json: ``JSBridge`` with the payload inline in one script
+- json chunked: ``JSBridge`` with 64 KB chunks (the default)
+- json pull: payload fetched by the page through a js_api call, which
+  pywebview answers with another evaluate_js script
+
+Run from the repository root: python -m benchmarks.transport_benchmark
+"""
+import json
+import random
+import statistics
+import time
+
+from webview.util import escape_string
+
+from src.utils.js_bridge import JSBridge
+
+SIZES = {'1 KB': 1024, '100 KB': 100 * 1024, '1 MB': 1024 * 1024}
+ROUNDS = 20
+
+def make_payload(size):
+    # Markdown-ish text with quotes, backslashes, newlines and non-ASCII characters
+    rng = random.Random(size)
+    words = ['rewrite', 'text', "it's", '"quoted"', 'C:\\path', 'naïve', 'über', '—', '**bold**', '- item\n', '\n\n']
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    return ' '.join(parts)[:size]
+
+def evaluate_js_script(script):
+    # What pywebview's evaluate_js builds around a script before running it
+    return f'var value = eval("{escape_string(script)}");'
+
+def js_api_reply(result):
+    # What pywebview's js_bridge_call builds to hand a js_api result back
+    result = json.dumps(result).replace('\\', '\\\\').replace("'", "\\'")
+    return evaluate_js_script(f'window.pywebview._returnValues["fetch_result"]["id"] = {{value: \'{result}\'}}')
+
+def legacy(payload):
+    return [evaluate_js_script(f"showResult({repr(payload)})")]
+
+def json_inline(payload):
+    return [evaluate_js_script(script) for script in JSBridge(chunk_size=float('inf')).encode_call('showResult', payload)]
+
+def json_chunked(payload):
+    return [evaluate_js_script(script) for script in JSBridge().encode_call('showResult', payload)]
+
+def json_pull(payload):
+    return [evaluate_js_script('fetchResult(1)'), js_api_reply(payload)]
+
+def measure(transport, payload):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        scripts = transport(payload)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, sum(map(len, scripts)), max(map(len, scripts))
+
+def main():
+    transports = {'repr': legacy, 'json': json_inline, 'json chunked': json_chunked, 'json pull': json_pull}
+    print(f"{'payload':<8} {'transport':<13} {'median ms':>10} {'chars sent':>12} {'largest script':>15}")
+    for label, size in SIZES.items():
+        payload = make_payload(size)
+        for name, transport in transports.items():
+            elapsed, sent, largest = measure(transport, payload)
+            print(f"{label:<8} {name:<13} {elapsed:>10.3f} {sent:>12} {largest:>15}")
+
+
+if __name__ == '__main__':
+    main()
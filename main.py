@@ -1,28 +1,43 @@
-import webview
+import time
+_process_start = time.perf_counter()
+
 import logging
 import os
-from dotenv import load_dotenv
-from src.app import Application
-
-load_dotenv()
+import sys
+from src.utils.startup_profiler import StartupProfiler
+from src.utils.logging_setup import configure_logging
 
 def main():
+    profiler = StartupProfiler(enabled='--profile-startup' in sys.argv, start=_process_start)
+
+    # Heavy modules are imported here so --profile-startup can time them
+    with profiler.phase('import webview'):
+        import webview
+    with profiler.phase('import dotenv'):
+        from dotenv import load_dotenv
+    with profiler.phase('import src.app (pynput, pyperclip)'):
+        from src.app import Application
+    load_dotenv()
+
     # Configure logging
-    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+    configure_logging()
     logger = logging.getLogger(__name__)
     logger.debug('main function called')
-    app = Application()
-    app.initialize()
+    with profiler.phase('Application()'):
+        app = Application()
+    with profiler.phase('Application.initialize()'):
+        app.initialize()
+    profiler.mark('hotkey ready (since process start)')
 
     use_debug = os.environ.get('WEBVIEW_DEBUG', 'False').lower() == 'true'
 
-    # Start the application
+    # Start the application; deferred modules are pre-warmed once the GUI loop runs
     if use_debug:
         logger.debug('Starting in debug mode')
-        webview.start(debug=True)
+        webview.start(app.prewarm, (profiler,), debug=True)
     else:
         logger.debug('Starting in production mode')
-        webview.start(ssl=True)
+        webview.start(app.prewarm, (profiler,), ssl=True)
     logger.debug('webview.start finished')
 
 if __name__ == '__main__':
@@ -1,13 +1,59 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# The updater replaces the app's executable, so it ships as its own small
+# frozen program; the app bundles it and runs a copy of it to install updates.
+updater = Analysis(
+    ['src/updater.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=0,
+)
+updater_pyz = PYZ(updater.pure)
+
+updater_exe = EXE(
+    updater_pyz,
+    updater.scripts,
+    updater.binaries,
+    updater.datas,
+    [],
+    name='open-rewrite-updater',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    runtime_tmpdir=None,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
 
 a = Analysis(
     ['main.py'],
     pathex=[],
-    binaries=[],
+    # EXE builds on construction, so the updater exists by now
+    binaries=[(os.path.join(DISTPATH, 'open-rewrite-updater.exe'), '.')],
     datas=[
-        ('src/ui', 'src/ui'),
-        ('src/updater.py', '.'),
+        # The loose icons are packed into icon_atlas.png, so only the built assets ship
+        ('src/ui/*.html', 'src/ui'),
+        ('src/ui/static/*.css', 'src/ui/static'),
+        ('src/ui/static/*.js', 'src/ui/static'),
+        ('src/ui/static/icon_atlas.png', 'src/ui/static'),
+        ('src/ui/static/icon_manifest.json', 'src/ui/static'),
+        ('src/ui/static/app', 'src/ui/static/app'),
+        ('src/ui/static/settings', 'src/ui/static/settings'),
+        ('src/ui/static/vendor', 'src/ui/static/vendor'),
         ('pyproject.toml', '.')
         ],
     hiddenimports=[],
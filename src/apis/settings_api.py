@@ -1,50 +1,71 @@
 import os
-import time
 import logging
-import winreg as reg
 import sys
-import requests
-import subprocess
-import tempfile
 import webview
 from src.utils.resource_path import resource_path
+from src.utils.icon_manifest import IconManifest
+from src.utils.tracing import Tracer
+from src.utils.downloader import DownloadError, SegmentedDownloader
+from src.utils.delta import DeltaError, apply_delta
+from src.managers.update_checker import UpdateChecker, is_newer
+from src.utils.js_bridge import to_js
+from src.utils.logging_setup import Preview, Redacted
 from src import __version__ as CURRENT_APP_VERSION
 
+UPDATER_EXE = 'open-rewrite-updater.exe'
+
 class SettingsAPI:
     """API for handling application settings, updates, and system integrations"""
     
-    def __init__(self, settings_manager, hotkey):
+    def __init__(self, settings_manager, hotkey, llm_manager=None, tracer=None, update_checker=None):
         logging.debug('SettingsAPI.__init__ called')
         self.settings_manager = settings_manager
         self.hotkey = hotkey
+        self.llm_manager = llm_manager
+        self.tracer = tracer or Tracer()
+        self.update_checker = update_checker or UpdateChecker(os.path.join(
+            os.path.dirname(os.path.abspath(settings_manager.settings_file)), 'update_cache.json'))
+        self.icon_manifest = IconManifest()
         self._window = None
         logging.debug('SettingsAPI.__init__ finished')
 
     def get_current_version(self):
         """Returns the hardcoded current application version."""
-        logging.info(f"Reporting current app version: {CURRENT_APP_VERSION}")
+        logging.info("Reporting current app version: %s", CURRENT_APP_VERSION)
         return CURRENT_APP_VERSION
 
+    def get_cached_update(self):
+        """Update status from the last background check, without any network access."""
+        release, checked_at = self.update_checker.latest_release()
+        if release is None:
+            return {"update_available": False, "checked_at": checked_at}
+        latest_version = release.get("tag_name", "0.0.0").lstrip('v')
+        return {
+            "update_available": is_newer(latest_version, CURRENT_APP_VERSION),
+            "latest_version": latest_version,
+            "checked_at": checked_at,
+        }
+
     def check_for_update(self):
         """Checks GitHub for the latest release and compares versions."""
         logging.info("Checking for updates...")
-        repo = "SomaRe/open_rewrite"
-        api_url = f"https://api.github.com/repos/{repo}/releases/latest"
         asset_name = "open-rewrite-windows-x64.exe"
+        # Imported on first use to keep it off the startup path
+        import requests
 
         try:
-            response = requests.get(api_url, timeout=10)
-            response.raise_for_status()
-            latest_release = response.json()
-            logging.debug(f"Latest release data: {latest_release}")
+            # Conditional request; served from the cache while rate limited
+            latest_release = self.update_checker.check(force=True)
+            if latest_release is None:
+                return {"update_available": False, "error": "No release information available."}
+            logging.debug("Latest release data: %s", Preview(latest_release, 200))
             latest_version = latest_release.get("tag_name", "0.0.0").lstrip('v') # Remove leading 'v' if present
             assets = latest_release.get("assets", [])
 
-            logging.debug(f"Latest release tag: {latest_version}, Current version: {CURRENT_APP_VERSION}")
+            logging.debug("Latest release tag: %s, Current version: %s", latest_version, CURRENT_APP_VERSION)
 
-            # Simple version comparison (can be improved with packaging.version)
-            if latest_version > CURRENT_APP_VERSION:
-                logging.info(f"Update found: {latest_version}")
+            if is_newer(latest_version, CURRENT_APP_VERSION):
+                logging.info("Update found: %s", latest_version)
                 download_url = None
                 for asset in assets:
                     if asset.get("name") == asset_name:
@@ -52,96 +73,166 @@ class SettingsAPI:
                         break
 
                 if download_url:
-                    logging.info(f"Asset found: {asset_name} at {download_url}")
-                    return {
+                    logging.info("Asset found: %s at %s", asset_name, download_url)
+                    result = {
                         "update_available": True,
                         "latest_version": latest_version,
                         "download_url": download_url,
+                        "sha256": self._published_sha256(assets, asset_name),
                         "release_notes": latest_release.get("body", "No release notes available.")
                     }
+                    # A delta only applies to the exact executable it was made from
+                    delta_name = f"{asset_name}.from-{CURRENT_APP_VERSION}.delta"
+                    for asset in assets:
+                        if getattr(sys, 'frozen', False) and asset.get("name") == delta_name:
+                            logging.info("Delta update found: %s (%s bytes)", delta_name, asset.get("size"))
+                            result["delta_url"] = asset.get("browser_download_url")
+                            result["delta_sha256"] = self._published_sha256(assets, delta_name)
+                    return result
                 else:
-                    logging.warning(f"Update found ({latest_version}), but asset '{asset_name}' not found in latest release.")
+                    logging.warning("Update found (%s), but asset '%s' not found in latest release.", latest_version, asset_name)
                     return {"update_available": False, "message": f"Version {latest_version} found, but required asset missing."}
             else:
                 logging.info("Application is up to date.")
                 return {"update_available": False, "message": "You are running the latest version."}
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error checking for updates: {e}")
+            logging.error("Error checking for updates: %s", e)
             return {"update_available": False, "error": f"Network error: {e}"}
         except Exception as e:
-            logging.error(f"Unexpected error checking for updates: {e}")
+            logging.error("Unexpected error checking for updates: %s", e)
             return {"update_available": False, "error": f"An unexpected error occurred: {e}"}
 
-    def download_and_install_update(self, download_url):
-        """Downloads the update and triggers the external updater script."""
-        logging.info(f"Starting update download from: {download_url}")
+    @staticmethod
+    def _published_sha256(assets, asset_name):
+        """SHA-256 of the release asset, from GitHub's digest or a .sha256 asset"""
+        import requests
+        for asset in assets:
+            digest = asset.get("digest") or ""
+            if asset.get("name") == asset_name and digest.startswith("sha256:"):
+                return digest[len("sha256:"):]
+        for asset in assets:
+            if asset.get("name") == asset_name + ".sha256":
+                try:
+                    response = requests.get(asset.get("browser_download_url"), timeout=10)
+                    response.raise_for_status()
+                    # sha256sum format: "<hex>  <file name>"
+                    return response.text.split()[0]
+                except (requests.exceptions.RequestException, IndexError) as e:
+                    logging.error("Could not fetch published checksum: %s", e)
+        return None
+
+    def _report_download_progress(self, downloaded, total):
+        if self._window is not None:
+            self._window.evaluate_js(
+                f"updateDownloadProgress({to_js({'downloaded': downloaded, 'total': total})})")
+
+    def _download_delta_update(self, downloader, delta_url, delta_sha256, sha256, output_path):
+        """Build the new executable from a delta against the running one.
+
+        Returns False if that was not possible, so the full asset is downloaded instead.
+        """
+        delta_path = output_path + ".delta"
+        try:
+            downloader.download(delta_url, delta_path, expected_sha256=delta_sha256,
+                on_progress=self._report_download_progress)
+            patched_sha256 = apply_delta(sys.executable, delta_path, output_path)
+            if patched_sha256 != sha256.lower():
+                logging.warning("Patched executable does not match the published checksum")
+                os.remove(output_path)
+                return False
+            logging.info("Update built from delta %s", delta_url)
+            return True
+        except (DownloadError, DeltaError, OSError) as e:
+            logging.warning("Delta update failed, downloading the full update: %s", e)
+            return False
+        finally:
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+
+    @staticmethod
+    def _updater_command(temp_dir):
+        """Command that starts the updater, or None if it is missing"""
+        if getattr(sys, 'frozen', False):
+            # The frozen app bundles the updater as its own executable (see the spec file)
+            bundled_path = resource_path(UPDATER_EXE)
+            if not os.path.exists(bundled_path):
+                return None
+            # The one-file bundle is unpacked to a folder that is deleted when the app exits,
+            # so run a copy that outlives this process
+            import shutil
+            helper_path = os.path.join(temp_dir, UPDATER_EXE)
+            shutil.copy2(bundled_path, helper_path)
+            return [helper_path]
+
+        # Development: run the script with this interpreter, without a console window
+        updater_script_path = resource_path(os.path.join('src', 'updater.py'))
+        if not os.path.exists(updater_script_path):
+            return None
+        python_executable = sys.executable.replace("python.exe", "pythonw.exe") if "python.exe" in sys.executable else sys.executable
+        return [python_executable, updater_script_path]
+
+    def download_and_install_update(self, download_url, sha256=None, delta_url=None, delta_sha256=None):
+        """Downloads the update, verifies it and triggers the external updater script."""
+        logging.info("Starting update download from: %s", download_url)
+        import subprocess
+        import tempfile
+
+        if not sha256:
+            logging.error("No published checksum for %s, refusing to install", download_url)
+            return {"success": False, "error": "The release has no published SHA-256 checksum."}
+
         try:
-            # Create a temporary file for the download
+            # A fixed path lets an interrupted download resume on the next attempt
             temp_dir = tempfile.gettempdir()
             downloaded_exe_path = os.path.join(temp_dir, "open_rewrite_update.exe")
 
-            # Download the file
-            response = requests.get(download_url, stream=True, timeout=60) # Longer timeout for download
-            response.raise_for_status()
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
-
-            with open(downloaded_exe_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    downloaded_size += len(chunk)
-
-            logging.info(f"Update downloaded successfully to: {downloaded_exe_path}")
-
-            # Find the updater script (assuming it's packaged next to the main exe)
-            app_dir = os.path.dirname(sys.executable)
-            updater_script_path = os.path.join(app_dir, "updater.py")
-
-            if not os.path.exists(updater_script_path):
-                 # Fallback for development: check relative path
-                 dev_updater_path = resource_path(os.path.join('src', 'updater.py'))
-                 if os.path.exists(dev_updater_path):
-                     updater_script_path = dev_updater_path
-                 else:
-                    logging.error("updater.py not found!")
-                    return {"success": False, "error": "Updater script not found."}
-
-            # Prepare arguments for the updater script
-            current_exe_path = sys.executable
+            downloader = SegmentedDownloader(
+                segments=self.settings_manager.get('update_download_segments', 4))
+            if not (delta_url and delta_sha256 and self._download_delta_update(
+                    downloader, delta_url, delta_sha256, sha256, downloaded_exe_path)):
+                downloader.download(download_url, downloaded_exe_path, expected_sha256=sha256,
+                    on_progress=self._report_download_progress)
 
-            # Launch the updater script in a new process
-            # Use pythonw.exe to run without a console window
-            python_executable = sys.executable.replace("python.exe", "pythonw.exe") if "python.exe" in sys.executable else sys.executable
+            logging.info("Update downloaded successfully to: %s", downloaded_exe_path)
 
-            logging.info(f"Launching updater: {python_executable} {updater_script_path} \"{current_exe_path}\" \"{downloaded_exe_path}\"")
-            subprocess.Popen([python_executable, updater_script_path, current_exe_path, downloaded_exe_path])
+            updater_command = self._updater_command(temp_dir)
+            if updater_command is None:
+                logging.error("Updater not found!")
+                return {"success": False, "error": "Updater not found."}
 
-            # Exit the current application
+            # Prepare arguments for the updater
+            current_exe_path = sys.executable
+
+            # The updater stages the new file, then waits for this process to exit before the swap
+            updater_args = updater_command + [current_exe_path, downloaded_exe_path,
+                            "--sha256", sha256, "--pid", str(os.getpid())]
+            logging.info("Launching updater: %s", updater_args)
+            subprocess.Popen(updater_args)
+
+            # Exit the current application; os._exit skips atexit, so persist settings first
             logging.info("Exiting application to allow update.")
-            # Need to give the Popen call a moment to start
-            time.sleep(1)
-            # Force exit if webview doesn't close immediately
-            os._exit(0) # Force exit if necessary
+            self.settings_manager.flush()
+            # Popen returns once the updater process exists, so exit right away
+            os._exit(0)
 
             # This part might not be reached if os._exit works
             return {"success": True, "message": "Update process initiated."}
 
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error downloading update: {e}")
-            return {"success": False, "error": f"Download failed: {e}"}
+        except DownloadError as e:
+            logging.error("Error downloading update: %s", e)
+            return {"success": False, "error": str(e)}
         except Exception as e:
-            logging.error(f"Error during update process: {e}")
+            logging.error("Error during update process: %s", e)
             return {"success": False, "error": f"An unexpected error occurred: {e}"}
 
     def get_prompt(self, option, category):
         """Get prompt for a specified option and category."""
-        logging.debug(f"Getting prompt for {category}.{option}")
-        settings = self.settings_manager.get_all()
-        if category in settings and option in settings[category]:
-            return settings[category][option]['prompt']
-        logging.warning(f"Prompt not found for {category}.{option}")
-        return None
+        logging.debug("Getting prompt for %s.%s", category, option)
+        prompt = self.settings_manager.snapshot().prompt_for(option, category)
+        if prompt is None:
+            logging.warning("Prompt not found for %s.%s", category, option)
+        return prompt
 
     def set_window(self, window):
         """Set the window reference"""
@@ -150,21 +241,31 @@ class SettingsAPI:
     def get_settings(self):
         logging.debug('SettingsAPI.get_settings called')
         settings = self.settings_manager.get_all()
-        logging.debug(f'SettingsAPI.get_settings returning: {settings}')
+        logging.debug('SettingsAPI.get_settings returning: %s', Redacted(settings))
         return settings
 
     def save_settings(self, settings):
-        logging.debug(f'SettingsAPI.save_settings called with settings: {settings}')
+        logging.debug('SettingsAPI.save_settings called with settings: %s', Redacted(settings))
         try:
             if not all(key in settings for key in ['hotkey','api_key', 'base_url', 'model', 'system_message', 'tones', 'formats']):
                 raise ValueError("Missing required settings fields")
             
             new_hotkey = settings.get('hotkey', '<alt>+r')
             if new_hotkey != self.hotkey.hotkey_combination:
-                logging.debug(f"New hotkey found!")
+                logging.debug("New hotkey found!")
                 self.hotkey.update_hotkey(new_hotkey)
 
+            # Keep settings the UI does not edit (e.g. streaming options)
+            current = self.settings_manager.get_all()
+            credentials_changed = any(
+                current.get(key) != settings.get(key) for key in ('api_key', 'base_url')
+            )
+            settings = {**current, **settings}
             self.settings_manager.set_all(settings)
+
+            if credentials_changed and self.llm_manager is not None:
+                logging.debug("API credentials or endpoint changed, dropping pooled clients")
+                self.llm_manager.invalidate_clients()
             
             # Notify MAIN window to refresh content
             if webview.windows and len(webview.windows) > 0:
@@ -174,12 +275,15 @@ class SettingsAPI:
             logging.debug('SettingsAPI.save_settings: settings saved successfully')
             return True
         except Exception as e:
-            logging.error(f"Error saving settings: {str(e)}")
+            logging.error("Error saving settings: %s", e)
             return False
 
     def reset_to_defaults(self):
         logging.debug('SettingsAPI.reset_to_defaults called')
         self.settings_manager.reset_to_defaults()
+        if self.llm_manager is not None:
+            # The defaults replace api_key and base_url, so pooled clients are stale
+            self.llm_manager.invalidate_clients()
         logging.debug('SettingsAPI.reset_to_defaults finished')
         return True
 
@@ -192,6 +296,7 @@ class SettingsAPI:
     def check_startup_status(self):
         """Check if the app is in Windows startup"""
         try:
+            import winreg as reg
             key = reg.OpenKey(reg.HKEY_CURRENT_USER, 
                             r"Software\Microsoft\Windows\CurrentVersion\Run", 
                             0, reg.KEY_READ)
@@ -201,12 +306,13 @@ class SettingsAPI:
             except FileNotFoundError:
                 return 'disabled'
         except Exception as e:
-            print(f"Error checking startup status: {e}")
+            logging.error("Error checking startup status: %s", e)
             return 'disabled'
 
     def toggle_startup(self):
         """Toggle the app in Windows startup"""
         try:
+            import winreg as reg
             key = reg.OpenKey(reg.HKEY_CURRENT_USER, 
                             r"Software\Microsoft\Windows\CurrentVersion\Run", 
                             0, reg.KEY_SET_VALUE)
@@ -220,23 +326,51 @@ class SettingsAPI:
                 reg.SetValueEx(key, "OpenRewrite", 0, reg.REG_SZ, sys.executable)
                 return {'success': True, 'message': 'Added to startup'}
         except Exception as e:
-            print(f"Error toggling startup: {e}")
+            logging.error("Error toggling startup: %s", e)
             return {'success': False, 'message': str(e)}
 
     def get_available_icons(self):
         """Get list of available material icons (white versions) organized by category"""
-        import os
-        icons = {}
-        icon_dir = os.path.join('src', 'ui', 'static', 'material_icons_round')
-        for root, dirs, files in os.walk(icon_dir):
-            category = os.path.basename(root)
-            if category == 'material_icons_round':
-                continue
-            icons[category] = []
-            for file in files:
-                if file.endswith('white.png'):
-                    # Get relative path from static folder
-                    rel_path = os.path.relpath(os.path.join(root, file), 
-                                             os.path.join('src', 'ui', 'static'))
-                    icons[category].append(rel_path.replace('\\', '/'))
-        return {k: sorted(v) for k, v in icons.items()}
\ No newline at end of file
+        return self.icon_manifest.icons
+
+    def get_icon_categories(self):
+        """Get icon categories with the number of icons in each"""
+        return self.icon_manifest.categories()
+
+    def get_icons_page(self, category, offset=0, limit=60):
+        """Get one page of icons for a category"""
+        return self.icon_manifest.page(category, offset, limit)
+
+    def get_trace_summary(self):
+        """Get p50/p95 timings of the recorded traces per stage"""
+        return {
+            'traces': len(self.tracer.traces()),
+            'enabled': self.tracer.enabled,
+            'stages': self.tracer.summary(),
+        }
+
+    def clear_traces(self):
+        """Drop all recorded traces"""
+        self.tracer.clear()
+        return True
+
+    def export_traces(self, format='json'):
+        """Save the recorded traces as JSON or in the Chrome trace format"""
+        logging.info("Exporting traces as %s", format)
+        if format == 'chrome':
+            content = self.tracer.export_chrome_trace()
+            filename = 'open-rewrite-trace.chrome.json'
+        else:
+            content = self.tracer.export_json()
+            filename = 'open-rewrite-traces.json'
+        try:
+            result = self._window.create_file_dialog(webview.SAVE_DIALOG, save_filename=filename)
+            if not result:
+                return {'success': False, 'message': 'Export cancelled'}
+            path = result if isinstance(result, str) else result[0]
+            with open(path, 'w') as f:
+                f.write(content)
+            return {'success': True, 'message': f'Saved to {path}'}
+        except Exception as e:
+            logging.error("Error exporting traces: %s", e)
+            return {'success': False, 'message': str(e)}
@@ -1,27 +1,112 @@
 import os
 import time
 import logging
+import threading
 import webview
 from src.apis.settings_api import SettingsAPI
-from src.managers.llm.openai_manager import OpenAIManager
 from src.utils.resource_path import resource_path
+from src.utils.stream_batcher import StreamBatcher
+from src.utils.worker_pool import CancelToken
+from src.utils.js_bridge import JSBridge
+from src.utils.tracing import Tracer, LLMTiming
+from src.utils.logging_setup import Preview, Redacted
 
 class WebViewAPI:
     """API for handling webview interactions and text rewriting operations"""
     
-    def __init__(self, settings_manager, rewrite_manager, clipboard_handler, hotkey):
+    def __init__(self, settings_manager, rewrite_manager, clipboard_handler, hotkey, prefetch_manager=None, tracer=None,
+            update_checker=None):
         logging.debug('WebViewAPI.__init__ called')
+        self.settings_manager = settings_manager
         self.rewrite_manager = rewrite_manager
         self.clipboard_handler = clipboard_handler
-        self.openai_manager = OpenAIManager()
-        self.settings_api = SettingsAPI(settings_manager, hotkey)
+        self.prefetch_manager = prefetch_manager
+        self.tracer = tracer or Tracer()
+        self.settings_api = SettingsAPI(settings_manager, hotkey, rewrite_manager.llm_manager, self.tracer,
+            update_checker)
         self._window = None
+        self.js_bridge = JSBridge()
+        self._selection_trace = None
+        self._request_trace = None
+        self._request_lock = threading.Lock()
+        self._request_counter = 0
+        self._active_request = None
         logging.debug('WebViewAPI.__init__ finished')
 
     def set_window(self, window):
         """Set the window reference"""
         self._window = window
 
+    def call_js(self, function, *args):
+        """Call a function of the main window's page with JSON-encoded arguments"""
+        self.js_bridge.call(self._window, function, *args)
+
+    def set_selection_trace(self, trace):
+        """Attach the trace of the selection now shown, to receive its paint report"""
+        self._selection_trace = trace
+
+    def trace_paint(self, view):
+        """Called by the page once a view has been painted for the first time"""
+        trace = self._selection_trace if view == 'options' else self._request_trace
+        if trace is not None:
+            trace.mark('first paint', once=True)
+        return True
+
+    def _start_request_trace(self, name, **attrs):
+        trace = self.tracer.start_trace(name, **attrs)
+        self._request_trace = trace
+        return trace
+
+    def _begin_request(self, token=None):
+        """Supersede the window's in-flight request and return the token of the new one.
+
+        A token from a claimed prefetch slot can be passed in so the speculative
+        request becomes the window's active one.
+        """
+        with self._request_lock:
+            if self._active_request is not None:
+                logging.debug('WebViewAPI: superseding request %s', self._active_request.request_id)
+                self._active_request.cancel()
+            self._request_counter += 1
+            self._active_request = token or CancelToken(self._request_counter)
+            return self._active_request
+
+    def _cancel_prefetch(self):
+        if self.prefetch_manager is not None:
+            self.prefetch_manager.cancel_all()
+
+    def cancel_request(self):
+        """Cancel the in-flight request, if any"""
+        with self._request_lock:
+            if self._active_request is not None:
+                self._active_request.cancel()
+                self._active_request = None
+        return True
+
+    def _create_stream_batcher(self, token, snapshot, index=None):
+        """Create a batcher that appends streamed deltas to the result view.
+
+        With an ``index`` the deltas go to that card of the compare view instead.
+        """
+        interval_ms = snapshot.get('stream_flush_interval_ms', 50)
+
+        def flush(text):
+            if token.cancelled:
+                return
+            if index is None:
+                self.call_js('appendResult', text)
+            else:
+                self.call_js('appendCompareResult', index, text)
+
+        return StreamBatcher(flush, interval=interval_ms / 1000)
+
+    def _create_progress_callback(self, token):
+        """Create a callback that reports chunk progress of large selections"""
+        def on_progress(completed, total):
+            if not token.cancelled:
+                self.call_js('showProgress', completed, total)
+        return on_progress
+
     def create_settings_window(self):
         logging.debug('WebViewAPI.create_settings_window called')
         """Creates and shows the settings window."""
@@ -29,6 +114,7 @@ class WebViewAPI:
         existing_settings_windows = [w for w in webview.windows if w.title == "Settings"]
 
         if self._window:
+            self._cancel_prefetch()
             self._window.hide()
         
         if not existing_settings_windows:
@@ -52,66 +138,182 @@ class WebViewAPI:
         logging.debug('WebViewAPI.get_settings called')
         """Get application settings"""
         settings = self.settings_api.get_settings()
-        logging.debug(f'WebViewAPI.get_settings returning: {settings}')
+        logging.debug('WebViewAPI.get_settings returning: %s', Redacted(settings))
         return settings
 
-    def rewrite_text(self, text, option, category):
-        logging.debug(f'WebViewAPI.rewrite_text called with text: {text[:20]+"..."}, option: {option}, category: {category}')
+    def rewrite_text(self, text, option, category, regenerate=False):
+        logging.debug('WebViewAPI.rewrite_text called with text: %s, option: %s, category: %s', Preview(text, 20), option, category)
         """Rewrite text using selected option"""
-        prompt = self.settings_api.get_prompt(option, category)
-        logging.debug(f'WebViewAPI.rewrite_text: prompt retrieved: {prompt}')
+        snapshot = self.settings_manager.snapshot()
+        prompt = snapshot.prompt_for(option, category)
+        logging.debug('WebViewAPI.rewrite_text: prompt retrieved: %s', Preview(prompt))
+        slot = None
+        if self.prefetch_manager is not None and not regenerate:
+            self.prefetch_manager.record_usage(option, category)
+            slot = self.prefetch_manager.claim(text, option, category)
+        token = self._begin_request(slot.token if slot else None)
+        batcher = self._create_stream_batcher(token, snapshot)
+        trace = self._start_request_trace('rewrite', option=option, category=category,
+            prefetched=slot is not None, regenerate=regenerate, chars=len(text))
+        timing = LLMTiming(trace)
+
+        def on_chunk(delta):
+            timing.on_chunk(delta)
+            batcher.add(delta)
         
         def on_response(response):
-            logging.debug(f'WebViewAPI.rewrite_text.on_response called with response: {response}')
-            self._window.evaluate_js(f"showResult({repr(response)})")
+            logging.debug('WebViewAPI.rewrite_text.on_response called with response: %s', Preview(response))
+            timing.finish(response)
+            batcher.close()
+            if token.cancelled:
+                logging.debug('WebViewAPI.rewrite_text.on_response: dropping stale response')
+                trace.finish(cancelled=True)
+                return
+            with trace.span('showResult'):
+                self.call_js('showResult', response)
+            trace.finish()
             logging.debug('WebViewAPI.rewrite_text.on_response finished')
             
         def on_error(error):
-            logging.error(f'WebViewAPI.rewrite_text.on_error called with error: {error}')
-            self._window.evaluate_js(f"showError({repr(str(error))})")
+            logging.error('WebViewAPI.rewrite_text.on_error called with error: %s', error)
+            timing.finish()
+            batcher.close()
+            trace.finish(error=str(error), cancelled=token.cancelled)
+            if token.cancelled:
+                return
+            self.call_js('showError', str(error))
             logging.debug('WebViewAPI.rewrite_text.on_error finished')
             
-        self.rewrite_manager.rewrite_text(text, prompt, on_response, on_error)
+        if slot is not None:
+            logging.debug('WebViewAPI.rewrite_text: using prefetched result')
+            slot.attach(on_response, on_error, on_chunk, self._create_progress_callback(token))
+        else:
+            reduce = option in snapshot.get('reduce_options', ['Summary', 'Keypoints'])
+            self.rewrite_manager.rewrite_text(text, prompt, on_response, on_error,
+                on_chunk=on_chunk, cancel_token=token, regenerate=regenerate,
+                reduce=reduce, on_progress=self._create_progress_callback(token), snapshot=snapshot,
+                option=option, on_usage=timing.on_usage)
         logging.debug('WebViewAPI.rewrite_text finished')
         return True
 
-    def handle_custom_request(self, text, custom_prompt):
-        logging.debug(f'WebViewAPI.handle_custom_request called with text: {text[:20]+"..."}, prompt: {custom_prompt}')
+    def handle_custom_request(self, text, custom_prompt, regenerate=False):
+        logging.debug('WebViewAPI.handle_custom_request called with text: %s, prompt: %s', Preview(text, 20), Preview(custom_prompt))
         """Handle custom user requests through dedicated endpoint"""
+        token = self._begin_request()
+        batcher = self._create_stream_batcher(token, self.settings_manager.snapshot())
+        trace = self._start_request_trace('custom', regenerate=regenerate, chars=len(text))
+        timing = LLMTiming(trace)
+
+        def on_chunk(delta):
+            timing.on_chunk(delta)
+            batcher.add(delta)
         
         def on_response(response):
-            logging.debug(f'WebViewAPI.handle_custom_request.on_response called with response: {response}')
-            self._window.evaluate_js(f"showResult({repr(response)})")
+            logging.debug('WebViewAPI.handle_custom_request.on_response called with response: %s', Preview(response))
+            timing.finish(response)
+            batcher.close()
+            if token.cancelled:
+                logging.debug('WebViewAPI.handle_custom_request.on_response: dropping stale response')
+                trace.finish(cancelled=True)
+                return
+            with trace.span('showResult'):
+                self.call_js('showResult', response)
+            trace.finish()
             logging.debug('WebViewAPI.handle_custom_request.on_response finished')
             
         def on_error(error):
-            logging.error(f'WebViewAPI.handle_custom_request.on_error called with error: {error}')
-            self._window.evaluate_js(f"showError({repr(str(error))})")
+            logging.error('WebViewAPI.handle_custom_request.on_error called with error: %s', error)
+            timing.finish()
+            batcher.close()
+            trace.finish(error=str(error), cancelled=token.cancelled)
+            if token.cancelled:
+                return
+            self.call_js('showError', str(error))
             logging.debug('WebViewAPI.handle_custom_request.on_error finished')
             
-        self.rewrite_manager.handle_custom_request(text, custom_prompt, on_response, on_error)
+        self.rewrite_manager.handle_custom_request(text, custom_prompt, on_response, on_error,
+            on_chunk=on_chunk, cancel_token=token, regenerate=regenerate,
+            on_progress=self._create_progress_callback(token), on_usage=timing.on_usage)
         logging.debug('WebViewAPI.handle_custom_request finished')
         return True
 
+    def compare_options(self, text, selections):
+        logging.debug('WebViewAPI.compare_options called with text: %s, selections: %s', Preview(text, 20), selections)
+        """Rewrite the text with several options at once for side-by-side comparison"""
+        token = self._begin_request()
+        snapshot = self.settings_manager.snapshot()
+        trace = self._start_request_trace('compare', options=len(selections), chars=len(text))
+        remaining = [len(selections)]
+        remaining_lock = threading.Lock()
+
+        def request_done():
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    trace.finish(cancelled=token.cancelled)
+
+        def start(index, option, category):
+            prompt = snapshot.prompt_for(option, category)
+            batcher = self._create_stream_batcher(token, snapshot, index)
+            timing = LLMTiming(trace, f'llm {option}')
+
+            def on_chunk(delta):
+                timing.on_chunk(delta)
+                batcher.add(delta)
+
+            def on_response(response):
+                timing.finish(response)
+                batcher.close()
+                if not token.cancelled:
+                    self.call_js('showCompareResult', index, response)
+                request_done()
+
+            def on_error(error):
+                logging.error('WebViewAPI.compare_options: %s.%s failed: %s', category, option, error)
+                timing.finish(error=str(error))
+                batcher.close()
+                if not token.cancelled:
+                    self.call_js('showCompareError', index, str(error))
+                request_done()
+
+            # Requests run concurrently on the worker pool and report as they complete
+            self.rewrite_manager.rewrite_text(text, prompt, on_response, on_error,
+                on_chunk=on_chunk, cancel_token=token, snapshot=snapshot, option=option,
+                on_usage=timing.on_usage)
+
+        for index, (option, category) in enumerate(selections):
+            start(index, option, category)
+        logging.debug('WebViewAPI.compare_options finished')
+        return True
+
     def copy_to_clipboard(self, text):
-        logging.debug(f'WebViewAPI.copy_to_clipboard called with text: {text}')
+        logging.debug('WebViewAPI.copy_to_clipboard called with text: %s', Preview(text))
         """Copy text to clipboard"""
         self.clipboard_handler.copy_text(text)
         logging.debug('WebViewAPI.copy_to_clipboard finished')
         return True
 
     def replace_text(self, text):
-        logging.debug(f'WebViewAPI.replace_text called with text: {text}')
+        logging.debug('WebViewAPI.replace_text called with text: %s', Preview(text))
         """Replace selected text with new text"""
-        self._window.hide()
-        time.sleep(0.1)
-        self.clipboard_handler.replace_text(text)
+        trace = self.tracer.start_trace('replace', chars=len(text))
+        self._cancel_prefetch()
+        with trace.span('hide window'):
+            self._window.hide()
+        with trace.span('settle delay'):
+            time.sleep(0.1)
+        with trace.span('paste'):
+            self.clipboard_handler.replace_text(text)
+        trace.finish()
         logging.debug('WebViewAPI.replace_text finished')
         return True
 
     def exit_app(self):
         logging.debug('WebViewAPI.exit_app called')
         """Exit the application"""
+        self.cancel_request()
+        self._cancel_prefetch()
+        self.settings_manager.flush()
         if self._window:
             self._window.destroy()
         logging.debug('WebViewAPI.exit_app finished')
@@ -120,6 +322,8 @@ class WebViewAPI:
     def close_window(self):
         logging.debug('WebViewAPI.close_window called')
         """Hide the window"""
+        self.cancel_request()
+        self._cancel_prefetch()
         if self._window:
             self._window.hide()
         logging.debug('WebViewAPI.close_window finished')
@@ -1,79 +1,99 @@
 import os
 import time
+import importlib
 import webview
 import logging
-import sys
 from src.managers.settings_manager import SettingsManager
 from src.managers.llm.openai_manager import OpenAIManager
+from src.managers.llm.async_openai_manager import AsyncOpenAIManager
+from src.managers.llm.resilience import EndpointHealth, RetryPolicy
 from src.managers.rewrite_manager import RewriteManager
+from src.managers.cache_manager import RewriteCache
+from src.managers.prefetch_manager import PrefetchManager
+from src.managers.update_checker import UpdateChecker
 from src.utils.global_hotkey import GlobalHotKey
 from src.utils.clipboard_handler import ClipboardHandler
 from src.utils.resource_path import resource_path
+from src.utils.worker_pool import WorkerPool
+from src.utils.logging_setup import Preview
+from src.utils.tracing import Tracer
 from src.apis.webview_api import WebViewAPI
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-
 try:
     from . import __version__ as CURRENT_APP_VERSION
-    logging.info(f"Current app version: {CURRENT_APP_VERSION}")
 except ImportError:
-    logging.warning("_version.py not found. Falling back to '0.0.0-dev'.")
     CURRENT_APP_VERSION = "0.0.0-dev"
 
 
 class Application:
     def __init__(self):
         logging.debug('Application.__init__ called')
+        logging.info("Current app version: %s", CURRENT_APP_VERSION)
         self.settings_manager = SettingsManager()
-        self.openai_manager = OpenAIManager()
-        self.clipboard_handler = ClipboardHandler()
+        self.tracer = Tracer(
+            capacity=self.settings_manager.get('trace_buffer_size', 200),
+            enabled=self.settings_manager.get('tracing_enabled', True)
+        )
+        self._selection_trace = None
+        self.openai_manager = self.create_llm_manager()
+        self.clipboard_handler = ClipboardHandler(
+            capture_timeout=self.settings_manager.get('clipboard_timeout_ms', 500) / 1000,
+            restore_clipboard=self.settings_manager.get('restore_clipboard', True)
+        )
         self.hotkey = GlobalHotKey(
             self.settings_manager.get('hotkey', '<alt>+r')
         )
         
         # Create the API instance
-        self.rewrite_manager = RewriteManager(self.openai_manager, self.settings_manager, self.clipboard_handler)
+        self.rewrite_cache = RewriteCache(
+            max_entries=self.settings_manager.get('cache_max_entries', 200),
+            ttl_seconds=self.settings_manager.get('cache_ttl_hours', 168) * 3600
+        )
+        self.rewrite_manager = RewriteManager(
+            self.openai_manager,
+            self.settings_manager,
+            self.clipboard_handler,
+            self.rewrite_cache
+        )
+        self.prefetch_manager = PrefetchManager(self.rewrite_manager, self.settings_manager)
+        self.update_checker = UpdateChecker(
+            os.path.join(os.path.dirname(os.path.abspath(self.settings_manager.settings_file)), 'update_cache.json'),
+            interval=self.settings_manager.get('update_check_interval_hours', 6) * 3600
+        )
         self.web_api = WebViewAPI(
             self.settings_manager,
             self.rewrite_manager,
             self.clipboard_handler,
-            self.hotkey
+            self.hotkey,
+            self.prefetch_manager,
+            self.tracer,
+            self.update_checker
         )
         logging.debug('Application.__init__ finished')
 
+    def create_llm_manager(self):
+        """Create the LLM backend selected by the llm_backend setting"""
+        max_concurrent = self.settings_manager.get('max_concurrent_requests', 4)
+        backend = self.settings_manager.get('llm_backend', 'threads')
+        logging.info("Using %s LLM backend", backend)
+        settings = self.settings_manager.snapshot()
+        policy = RetryPolicy.from_settings(settings)
+        health = EndpointHealth.from_settings(settings)
+        if backend == 'asyncio':
+            return AsyncOpenAIManager(max_concurrent, policy=policy, health=health)
+        if backend != 'threads':
+            logging.warning("Unknown llm_backend %s, using threads", backend)
+        return OpenAIManager(WorkerPool(max_workers=max_concurrent, name='llm'), policy=policy, health=health)
+
     def calculate_window_height(self):
         """Calculate window height based on number of options"""
-        # Fixed heights
-        header_height = 44  # 2.75rem
-        input_height = 44   # 2.75rem
-        separator_height = 18  # 0.25rem + margins
-        
-        # Get number of options
-        settings = self.settings_manager.get_all()
-        num_tones = len(settings.get('tones', {}))
-        num_formats = len(settings.get('formats', {}))
-        total_options = num_tones + num_formats
-        
-        # Each option is 28px (1.75rem)
-        options_height = total_options * 28
-
-        # Extra height because of header.
-        if sys.platform == "win32": # windows
-            extra_height = 56
-        else:
-            extra_height = 0
-        
-        # Total height is sum of all components
-        total_height = header_height + input_height + separator_height + options_height + extra_height + 25
-        
-        # Add some padding
-        return min(max(total_height, 300), 800)  # Keep between 300-800px
+        return self.settings_manager.snapshot().window_height
 
     def initialize(self):
         logging.debug('Application.initialize called')
         # Create window
         html_path = resource_path(os.path.join('src', 'ui', 'app.html'))
-        logging.debug(f'Application.initialize: html_path = {html_path}')
+        logging.debug('Application.initialize: html_path = %s', html_path)
         
         # Calculate dynamic height
         window_height = self.calculate_window_height()
@@ -101,19 +121,63 @@ class Application:
         logging.debug('Application.initialize: hotkey and clipboard handler connected')
         logging.debug('Application.initialize finished')
 
+    def prewarm(self, profiler=None):
+        """Import deferred modules and warm the LLM client in the background.
+
+        Runs on the thread pywebview starts once the (hidden) window exists, so
+        none of this sits between launch and the hotkey being ready.
+        """
+        logging.debug('Application.prewarm called')
+        for module in ('openai', 'requests'):
+            started = time.perf_counter()
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                logging.warning('Application.prewarm: could not import %s: %s', module, e)
+            if profiler is not None:
+                profiler.record(f'prewarm import {module}', time.perf_counter() - started)
+
+        api_key = self.settings_manager.get('api_key')
+        if api_key:
+            try:
+                self.openai_manager.client_pool.get_client(api_key, self.settings_manager.get('base_url'))
+            except Exception as e:
+                logging.warning('Application.prewarm: could not create client: %s', e)
+
+        if self.settings_manager.get('update_check_enabled', True):
+            self.update_checker.start()
+
+        if profiler is not None:
+            profiler.mark('prewarm finished (since process start)')
+            profiler.report()
+        logging.debug('Application.prewarm finished')
+
     def on_hotkey_activated(self):
         logging.debug('Application.on_hotkey_activated called')
         """Handle global hotkey activation"""
+        # The selection trace runs from the hotkey to the options being painted
+        self._selection_trace = self.tracer.start_trace('selection')
+        self._selection_trace.begin('clipboard capture')
         self.clipboard_handler.get_highlighted_text()
         logging.debug('Application.on_hotkey_activated finished')
         
     def on_text_copied(self, text):
-        logging.debug(f'Application.on_text_copied called with text: {text}')
+        logging.debug('Application.on_text_copied called with text: %s', Preview(text))
         """Handle copied text"""
+        trace, self._selection_trace = self._selection_trace, None
+        if trace is None:
+            trace = self.tracer.start_trace('selection')
+        trace.end('clipboard capture', timed_out=not text)
         if text.strip():
             if webview.windows:
-                self._window.evaluate_js(f"handleSelectedText({repr(text)})")
-                self._window.show()
+                # Speculation starts first so requests are in flight while the window opens
+                self.prefetch_manager.start(text)
+                with trace.span('handleSelectedText'):
+                    self.web_api.call_js('handleSelectedText', text)
+                with trace.span('window.show'):
+                    self._window.show()
+                self.web_api.set_selection_trace(trace)
                 logging.debug('Application.on_text_copied: main window shown and text evaluated')
+        trace.finish(chars=len(text))
         logging.debug('Application.on_text_copied finished')
 
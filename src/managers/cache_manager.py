@@ -0,0 +1,125 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+class RewriteCache:
+    """LRU cache of rewrite results, kept in memory and mirrored to a JSON file.
+
+    Keys are SHA-256 hashes of everything that determines the model output, so
+    the selected text itself is never stored as a key. Entries older than
+    ``ttl_seconds`` are treated as misses and dropped. Changes are written
+    at most every ``save_delay`` seconds, off the request threads, and once
+    more at exit.
+    """
+
+    def __init__(self, cache_file="rewrite_cache.json", max_entries=200, ttl_seconds=7 * 24 * 3600,
+            save_delay=2.0):
+        logging.info("Initializing RewriteCache with cache file: %s", cache_file)
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.save_delay = save_delay
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        self.load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(model, base_url, system_message, prompt, text, temperature, max_tokens=None):
+        """Build a content-hash key for a rewrite request"""
+        payload = json.dumps([model, base_url, system_message, prompt, text, temperature, max_tokens],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def load(self):
+        """Load cached entries from disk, skipping expired ones."""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning("Could not read rewrite cache, starting empty: %s", e)
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                for key, entry in entries:
+                    if now - entry['created'] <= self.ttl_seconds and 'result' in entry:
+                        self._entries[key] = entry
+            except (KeyError, TypeError, ValueError) as e:
+                # Valid JSON, but not the [key, entry] pairs written by _save
+                logging.warning("Malformed rewrite cache, starting empty: %s", e)
+                self._entries.clear()
+            self._trim()
+        logging.debug("Loaded %s cached rewrites", len(self._entries))
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['created'] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry['result']
+
+    def put(self, key, result):
+        """Store a result and schedule a write of the cache."""
+        with self._lock:
+            self._entries[key] = {'result': result, 'created': time.time()}
+            self._entries.move_to_end(key)
+            self._trim()
+            self._schedule_save()
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+
+    def _schedule_save(self):
+        # Called with _lock held; puts within save_delay share one write
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes to disk immediately."""
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                entries = list(self._entries.items())
+                self._dirty = False
+            self._save(entries)
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, entries):
+        # Write to a temp file first so a crash never leaves a torn cache behind
+        temp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            logging.error("Error saving rewrite cache: %s", e)
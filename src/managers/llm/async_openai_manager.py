@@ -0,0 +1,179 @@
+import asyncio
+import functools
+from src.managers.llm.base_manager import LLMManager, StreamReply
+from src.managers.llm.client_pool import AsyncOpenAIClientPool
+from src.managers.llm.resilience import AttemptRace, EndpointHealth, RetryLoop, RetryPolicy
+from src.utils.event_loop import BackgroundEventLoop
+from src.utils.worker_pool import WorkerPool
+from src.utils.logging_setup import Preview
+
+import logging
+logger = logging.getLogger(__name__)
+
+class AsyncOpenAIManager(LLMManager):
+    """LLM backend running every request as a task on one shared event loop.
+
+    Concurrent rewrites share the loop instead of holding an OS thread each;
+    at most ``max_concurrent`` requests are sent at once. Callbacks are handed
+    to a single callback thread, in order, so a slow UI update never stalls
+    the loop. Retries, timeouts and hedging follow ``policy``; a hedged
+    attempt shares its request's concurrency slot.
+    """
+
+    def __init__(self, max_concurrent=4, event_loop=None, policy=None, health=None):
+        logger.debug('AsyncOpenAIManager.__init__ called')
+        self.event_loop = event_loop or BackgroundEventLoop('llm-loop')
+        self.client_pool = AsyncOpenAIClientPool(self.event_loop)
+        self.callback_pool = WorkerPool(max_workers=1, name='llm-callbacks')
+        self.policy = policy or RetryPolicy()
+        self.health = health or EndpointHealth()
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        logger.debug('AsyncOpenAIManager.__init__ finished')
+
+    def invalidate_clients(self):
+        """Drop pooled clients, e.g. after the API key or base URL changed"""
+        self.client_pool.invalidate()
+        self.health.reset()
+
+    def close(self):
+        self.client_pool.invalidate()
+        self.event_loop.stop()
+
+    def generate_response(self, api_key, base_url, model, system_message,
+            prompt, selected_text, on_success, on_error, on_chunk=None, cancel_token=None,
+            temperature=0.7, max_tokens=None, on_usage=None):
+        logger.debug('AsyncOpenAIManager.generate_response called')
+        """Schedule a completion on the event loop and return its Future"""
+        messages = self.build_messages(system_message, prompt, selected_text)
+        params = self.request_params(temperature, max_tokens)
+        future = self.event_loop.submit(self._run(api_key, base_url, model, messages, params,
+            on_success, on_error, on_chunk, on_usage, cancel_token))
+        logger.debug('AsyncOpenAIManager.generate_response finished')
+        return future
+
+    def dispatch(self, callback, *args):
+        """Run a callback on the callback thread, after those already queued"""
+        return self.callback_pool.submit(callback, *args)
+
+    async def _run(self, api_key, base_url, model, messages, params,
+            on_success, on_error, on_chunk, on_usage, cancel_token):
+        def is_cancelled():
+            return cancel_token is not None and cancel_token.cancelled
+
+        if is_cancelled():
+            logger.debug('AsyncOpenAIManager: request skipped, it was cancelled')
+            return
+        if cancel_token is not None:
+            # Cancelling the task aborts the request wherever it is waiting
+            task = asyncio.current_task()
+            cancel_token.on_cancel(lambda: self.event_loop.call_soon(task.cancel))
+
+        try:
+            async with self._semaphore:
+                client = self.client_pool.get_client(api_key, base_url)
+                reply = await self._call_with_retries(client, base_url, model, messages, params,
+                    on_chunk, on_usage, is_cancelled)
+
+            if is_cancelled():
+                logger.debug('AsyncOpenAIManager: dropping response of cancelled request')
+                return
+            logger.debug("response: %s", Preview(reply, 20))
+            self.dispatch(on_success, reply)
+
+        except asyncio.CancelledError:
+            logger.debug('AsyncOpenAIManager: request cancelled')
+        except Exception as e:
+            if is_cancelled():
+                logger.debug('AsyncOpenAIManager: request stopped after cancellation: %s', e)
+                return
+            logger.error('OpenAI API error: %s', e)
+            self.dispatch(on_error, e)
+
+    async def _call_with_retries(self, client, base_url, model, messages, params,
+            on_chunk, on_usage, is_cancelled):
+        """Run attempts until one succeeds or the error is final"""
+        # Callbacks go through the callback thread, never run on the loop
+        retries = RetryLoop(self.policy, self.health.breaker(base_url),
+            None if on_chunk is None else functools.partial(self.dispatch, on_chunk))
+        report = None if on_usage is None else functools.partial(self.dispatch, on_usage)
+        while True:
+            try:
+                retries.begin()
+                return retries.succeeded(await self._hedged_attempt(client, base_url, model,
+                    messages, params, retries.on_chunk, report, is_cancelled))
+            except Exception as e:
+                delay = retries.failed(e, is_cancelled())
+                if delay is None:
+                    raise
+                # Cancelling the request cancels this sleep too
+                await asyncio.sleep(delay)
+            finally:
+                retries.end()
+
+    async def _hedged_attempt(self, client, base_url, model, messages, params, on_chunk,
+            on_usage, is_cancelled):
+        """One attempt, plus a second one if the first has no output after the hedge delay"""
+        race = AttemptRace()
+        delay = self.health.hedge_delay(base_url, self.policy)
+        if delay is None:
+            return await self._attempt(client, base_url, model, messages, params, on_chunk,
+                on_usage, is_cancelled, race, 0)
+
+        attempts = [asyncio.ensure_future(self._attempt(client, base_url, model, messages,
+            params, on_chunk, on_usage, is_cancelled, race, 0))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and race.winner is None:
+                logger.debug('Hedging request to %s after %.0f ms', base_url, delay * 1000)
+                attempts.append(asyncio.ensure_future(self._attempt(client, base_url, model,
+                    messages, params, on_chunk, on_usage, is_cancelled, race, 1)))
+
+            # Wait for the winner to finish its reply, or for every attempt to fail
+            pending = set(attempts)
+            while pending and race.winner is None:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if race.winner is not None:
+                return await attempts[race.winner]
+            return attempts[0].result()
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _attempt(self, client, base_url, model, messages, params, on_chunk,
+            on_usage, is_cancelled, race, index):
+        """Send one request; returns the reply, or None if another attempt won"""
+        claim = race.claimer(index, self.health.latency(base_url))
+        race.on_lose(index, asyncio.current_task().cancel)
+        if on_chunk is None:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=self.policy.timeout(),
+                **params
+            )
+            if not claim():
+                return None
+            return self.response_reply(response, on_usage)
+        return await self._stream_completion(client, model, messages, params, on_chunk,
+            on_usage, is_cancelled, claim)
+
+    async def _stream_completion(self, client, model, messages, params, on_chunk,
+            on_usage, is_cancelled, claim):
+        """Stream a completion, forwarding deltas once this attempt won the race"""
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            timeout=self.policy.timeout(),
+            **self.stream_params(params, on_usage)
+        )
+        reply = StreamReply(claim, on_chunk)
+        try:
+            async for chunk in stream:
+                if is_cancelled():
+                    break
+                if not reply.add(chunk):
+                    return None
+        finally:
+            await stream.close()
+        return reply.finish(on_usage)
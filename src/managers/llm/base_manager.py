@@ -0,0 +1,112 @@
+class LLMManager:
+    """Interface of the LLM backends used by RewriteManager.
+
+    A backend sends one chat completion per ``generate_response`` call without
+    blocking the caller and reports through callbacks:
+
+    - ``on_chunk(delta)`` for every streamed content delta, when given
+    - ``on_usage(usage)`` once with the finish reason and the token counts
+      the provider reported (None if it sent none), right before
+      ``on_success``, when given (see ``usage_dict``)
+    - ``on_success(reply)`` once with the full reply
+    - ``on_error(error)`` instead of ``on_success`` if the request failed
+
+    Callbacks for one request are called in that order and never from the
+    caller's thread. If ``cancel_token`` is cancelled the request is aborted
+    and no further callbacks are made. ``max_tokens`` caps the reply when
+    set. ``generate_response`` returns a ``concurrent.futures.Future`` that
+    completes when the request is done.
+    """
+
+    def generate_response(self, api_key, base_url, model, system_message,
+            prompt, selected_text, on_success, on_error, on_chunk=None, cancel_token=None,
+            temperature=0.7, max_tokens=None, on_usage=None):
+        raise NotImplementedError
+
+    def dispatch(self, callback, *args):
+        """Run ``callback(*args)`` off the caller's thread, like the request callbacks"""
+        raise NotImplementedError
+
+    def invalidate_clients(self):
+        """Drop pooled clients, e.g. after the API key or base URL changed"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the backend's clients and threads"""
+
+    @staticmethod
+    def build_messages(system_message, prompt, selected_text):
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": f"<prompt>{prompt}</prompt>\n<text>{selected_text}</text>"}
+        ]
+
+    @staticmethod
+    def request_params(temperature, max_tokens):
+        """Sampling arguments for ``chat.completions.create``"""
+        params = {'temperature': temperature}
+        if max_tokens:
+            params['max_tokens'] = max_tokens
+        return params
+
+    @staticmethod
+    def stream_params(params, on_usage):
+        """``params`` for a streamed call; streams only report usage when asked"""
+        if on_usage is None:
+            return params
+        return dict(params, stream_options={'include_usage': True})
+
+    @classmethod
+    def response_reply(cls, response, on_usage):
+        """Content of a non-streamed response, after passing its usage to ``on_usage``"""
+        if on_usage is not None:
+            on_usage(cls.usage_dict(response.usage, response.choices[0].finish_reason))
+        return response.choices[0].message.content
+
+    @staticmethod
+    def usage_dict(usage, finish_reason=None):
+        """Token counts of a response as passed to ``on_usage``"""
+        return {
+            'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+            'completion_tokens': getattr(usage, 'completion_tokens', None),
+            'total_tokens': getattr(usage, 'total_tokens', None),
+            'finish_reason': finish_reason,
+        }
+
+
+class StreamReply:
+    """Collects a streamed completion for one attempt of a request.
+
+    Content deltas go to ``on_chunk`` once ``claim`` won the attempt race;
+    the usage arrives in a last chunk without choices.
+    """
+
+    def __init__(self, claim, on_chunk):
+        self.claim = claim
+        self.on_chunk = on_chunk
+        self.parts = []
+        self.usage = None
+        self.finish_reason = None
+
+    def add(self, chunk):
+        """Take one stream chunk; returns False if another attempt won the race"""
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return True
+        self.finish_reason = chunk.choices[0].finish_reason or self.finish_reason
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not self.parts and not self.claim():
+                return False
+            self.parts.append(delta)
+            self.on_chunk(delta)
+        return True
+
+    def finish(self, on_usage):
+        """The full reply, or None if another attempt won; passes the usage to ``on_usage`` first"""
+        if not self.parts and not self.claim():
+            return None
+        if on_usage is not None:
+            on_usage(LLMManager.usage_dict(self.usage, self.finish_reason))
+        return ''.join(self.parts)
@@ -0,0 +1,108 @@
+import importlib.util
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+class OpenAIClientPool:
+    """Registry of long-lived OpenAI clients keyed by (api_key, base_url).
+
+    Reusing a client keeps its httpx connection pool (and the TLS session to
+    the endpoint) warm between rewrites. Clients that have not been used for
+    ``idle_timeout`` seconds are closed on the next lookup.
+    """
+
+    def __init__(self, idle_timeout=300, max_keepalive_connections=5):
+        logger.debug('OpenAIClientPool.__init__ called')
+        self.idle_timeout = idle_timeout
+        self.max_keepalive_connections = max_keepalive_connections
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._http2 = importlib.util.find_spec('h2') is not None
+        logger.debug('OpenAIClientPool.__init__ finished (http2=%s)', self._http2)
+
+    def get_client(self, api_key, base_url):
+        """Return a warm client for the credentials, creating it if needed"""
+        key = (api_key, base_url)
+        with self._lock:
+            self._evict_idle()
+            entry = self._clients.get(key)
+            if entry is None:
+                logger.debug('OpenAIClientPool: creating client for %s', base_url)
+                entry = {'client': self._create_client(api_key, base_url)}
+                self._clients[key] = entry
+            entry['last_used'] = time.monotonic()
+            return entry['client']
+
+    def invalidate(self):
+        """Close and forget every pooled client"""
+        with self._lock:
+            logger.debug('OpenAIClientPool.invalidate: closing %s client(s)', len(self._clients))
+            for entry in self._clients.values():
+                self._close(entry['client'])
+            self._clients.clear()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, entry in list(self._clients.items()):
+            if now - entry['last_used'] > self.idle_timeout:
+                logger.debug('OpenAIClientPool: evicting idle client for %s', key[1])
+                self._close(entry['client'])
+                del self._clients[key]
+
+    def _create_client(self, api_key, base_url):
+        import httpx
+        from openai import OpenAI, DefaultHttpxClient
+
+        http_client = DefaultHttpxClient(
+            http2=self._http2,
+            limits=httpx.Limits(
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.idle_timeout
+            )
+        )
+        # Retries are done by the manager's RetryPolicy, not by the SDK
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning('OpenAIClientPool: error closing client: %s', e)
+
+
+class AsyncOpenAIClientPool(OpenAIClientPool):
+    """Pool of AsyncOpenAI clients used on one event loop.
+
+    Async clients must be closed on the loop they run on, so closing is
+    scheduled there instead of done inline.
+    """
+
+    def __init__(self, event_loop, idle_timeout=300, max_keepalive_connections=5):
+        super().__init__(idle_timeout, max_keepalive_connections)
+        self.event_loop = event_loop
+
+    def _create_client(self, api_key, base_url):
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        http_client = DefaultAsyncHttpxClient(
+            http2=self._http2,
+            limits=httpx.Limits(
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.idle_timeout
+            )
+        )
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    def _close(self, client):
+        self.event_loop.submit(self._aclose(client))
+
+    @staticmethod
+    async def _aclose(client):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning('AsyncOpenAIClientPool: error closing client: %s', e)
@@ -1,63 +1,190 @@
+from src.managers.llm.base_manager import LLMManager, StreamReply
+from src.managers.llm.client_pool import OpenAIClientPool
+from src.managers.llm.resilience import AttemptRace, EndpointHealth, RetryLoop, RetryPolicy
+from src.utils.worker_pool import WorkerPool
+from src.utils.logging_setup import Preview
+from concurrent.futures import FIRST_COMPLETED, wait
 import threading
-from openai import OpenAI
+import time
 
 import logging
 logger = logging.getLogger(__name__)
 
-class OpenAIManager:
-    # def __init__(self):
-    #     logger.debug('OpenAIManager.__init__ called')
-    #     self.settings_manager = settings_manager
-    #     self.load_settings()
-    #     logger.debug('OpenAIManager.__init__ finished')
-
-    # def load_settings(self):
-    #     logger.debug('OpenAIManager.load_settings called')
-    #     """Load OpenAI settings from the settings manager"""
-    #     self.api_key = self.settings_manager.get('api_key', '')
-    #     self.base_url = self.settings_manager.get('base_url', 'https://api.openai.com/v1/')
-    #     self.model = self.settings_manager.get('model', 'gpt-4o-mini')
-    #     self.system_message = self.settings_manager.get('system_message', '')
-    #     logger.debug('OpenAIManager.load_settings finished')
+class OpenAIManager(LLMManager):
+    """LLM backend running each request with the sync client on a worker thread.
+
+    Calls are retried, timed out and optionally hedged as set by ``policy``;
+    with hedging on, the attempts of a request run on a separate pool so the
+    request's own worker can start a second attempt when the first is slow.
+    """
+
+    def __init__(self, worker_pool=None, policy=None, health=None):
+        logger.debug('OpenAIManager.__init__ called')
+        self.client_pool = OpenAIClientPool()
+        self.worker_pool = worker_pool or WorkerPool(name='llm')
+        self.policy = policy or RetryPolicy()
+        self.health = health or EndpointHealth()
+        self.hedge_pool = WorkerPool(max_workers=self.worker_pool.max_workers * 2, name='llm-hedge')
+        logger.debug('OpenAIManager.__init__ finished')
+
+    def dispatch(self, callback, *args):
+        """Run a callback on the worker pool"""
+        return self.worker_pool.submit(callback, *args)
+
+    def invalidate_clients(self):
+        """Drop pooled clients, e.g. after the API key or base URL changed"""
+        self.client_pool.invalidate()
+        self.health.reset()
+
+    def close(self):
+        self.client_pool.invalidate()
 
     def generate_response(self, api_key, base_url, model, system_message,
-            prompt, selected_text, on_success, on_error):
+            prompt, selected_text, on_success, on_error, on_chunk=None, cancel_token=None,
+            temperature=0.7, max_tokens=None, on_usage=None):
         logger.debug('OpenAIManager.generate_response called')
-        """Generate a response from OpenAI"""
+        """Generate a response from OpenAI.
+
+        When ``on_chunk`` is given the completion is streamed and every content
+        delta is passed to it as it arrives; ``on_success`` still receives the
+        full reply once the stream is finished. ``on_usage`` receives the token
+        usage first, if given; streams are then asked to report it.
+
+        If ``cancel_token`` is cancelled the open stream is closed and neither
+        callback is invoked. Returns the Future of the scheduled call.
+        """
+        def is_cancelled():
+            return cancel_token is not None and cancel_token.cancelled
+
         def run_openai_call():
+            if is_cancelled():
+                logger.debug('run_openai_call skipped, request was cancelled')
+                return
             try:
                 logger.debug('run_openai_call try block')
-                client = OpenAI(
-                    api_key=api_key,
-                    base_url=base_url
-                )
+                client = self.client_pool.get_client(api_key, base_url)
 
-                messages = [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"<prompt>{prompt}</prompt>\n<text>{selected_text}</text>"}
-                ]
+                messages = self.build_messages(system_message, prompt, selected_text)
+                params = self.request_params(temperature, max_tokens)
 
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.7,
-                )
+                reply = self._call_with_retries(client, base_url, model, messages, params,
+                    on_chunk, on_usage, cancel_token)
 
-                reply = response.choices[0].message.content
+                if is_cancelled():
+                    logger.debug('run_openai_call dropping response of cancelled request')
+                    return
 
-                logger.debug(f"response: {reply[:20]+'...'}")
+                logger.debug("response: %s", Preview(reply, 20))
 
                 # Call the success callback with the response
                 on_success(reply)
                 logger.debug('run_openai_call success callback finished')
 
             except Exception as e:
-                logger.error(f'OpenAI API error: {e}')
+                if is_cancelled():
+                    logger.debug('run_openai_call stopped after cancellation: %s', e)
+                    return
+                logger.error('OpenAI API error: %s', e)
                 # Call the error callback with the error
                 on_error(e)
 
-        # Run in a separate thread to not block the UI
-        thread = threading.Thread(target=run_openai_call)
-        thread.daemon = True
-        thread.start()
+        # Run on the shared worker pool to not block the UI
+        future = self.worker_pool.submit(run_openai_call)
         logger.debug('OpenAIManager.generate_response finished')
+        return future
+
+    def _call_with_retries(self, client, base_url, model, messages, params, on_chunk, on_usage, cancel_token):
+        """Run attempts until one succeeds, the error is final or the request is cancelled"""
+        retries = RetryLoop(self.policy, self.health.breaker(base_url), on_chunk)
+        while True:
+            try:
+                retries.begin()
+                return retries.succeeded(self._hedged_attempt(client, base_url, model, messages,
+                    params, retries.on_chunk, on_usage, cancel_token))
+            except Exception as e:
+                delay = retries.failed(e, cancel_token is not None and cancel_token.cancelled)
+                if delay is None or self._wait(delay, cancel_token):
+                    raise
+            finally:
+                retries.end()
+
+    @staticmethod
+    def _wait(delay, cancel_token):
+        """Sleep for ``delay`` seconds; returns True if cancelled meanwhile"""
+        if cancel_token is None:
+            time.sleep(delay)
+            return False
+        woken = threading.Event()
+        cancel_token.on_cancel(woken.set)
+        return woken.wait(delay)
+
+    def _hedged_attempt(self, client, base_url, model, messages, params, on_chunk, on_usage, cancel_token):
+        """One attempt, plus a second one if the first has no output after the hedge delay"""
+        race = AttemptRace()
+        delay = self.health.hedge_delay(base_url, self.policy)
+        if delay is None:
+            return self._attempt(client, base_url, model, messages, params, on_chunk, on_usage,
+                cancel_token, race, 0)
+
+        attempts = [self.hedge_pool.submit(self._attempt, client, base_url, model, messages,
+            params, on_chunk, on_usage, cancel_token, race, 0)]
+        if not race.decided.wait(delay) and not attempts[0].done() and not (
+                cancel_token is not None and cancel_token.cancelled):
+            logger.debug('Hedging request to %s after %.0f ms', base_url, delay * 1000)
+            attempts.append(self.hedge_pool.submit(self._attempt, client, base_url, model,
+                messages, params, on_chunk, on_usage, cancel_token, race, 1))
+
+        # Wait for the winner to finish its reply, or for every attempt to fail
+        pending = set(attempts)
+        while pending and race.winner is None:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        if race.winner is not None:
+            return attempts[race.winner].result()
+        return attempts[0].result()
+
+    def _attempt(self, client, base_url, model, messages, params, on_chunk, on_usage, cancel_token,
+            race, index):
+        """Send one request; returns the reply, or None if another attempt won"""
+        claim = race.claimer(index, self.health.latency(base_url))
+        if on_chunk is None:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=self.policy.timeout(),
+                **params
+            )
+            if not claim():
+                return None
+            return self.response_reply(response, on_usage)
+        return self._stream_completion(client, model, messages, params, on_chunk, on_usage,
+            cancel_token, race, index, claim)
+
+    def _stream_completion(self, client, model, messages, params, on_chunk, on_usage, cancel_token,
+            race, index, claim):
+        """Stream a completion, forwarding deltas once this attempt won the race"""
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            timeout=self.policy.timeout(),
+            **self.stream_params(params, on_usage)
+        )
+        # Closing the stream drops the connection so the provider stops generating
+        race.on_lose(index, stream.close)
+        if cancel_token is not None:
+            cancel_token.on_cancel(stream.close)
+        reply = StreamReply(claim, on_chunk)
+        try:
+            for chunk in stream:
+                if cancel_token is not None and cancel_token.cancelled:
+                    break
+                if not reply.add(chunk):
+                    return None
+        except Exception:
+            if race.winner not in (None, index):
+                # Closed because the other attempt won
+                return None
+            raise
+        finally:
+            stream.close()
+        return reply.finish(on_usage)
@@ -0,0 +1,343 @@
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+from src.utils.tracing import percentile
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to an endpoint that keeps failing"""
+
+    def __init__(self, base_url, retry_in):
+        super().__init__(f'{base_url} is failing, not retrying for {retry_in:.0f}s')
+        self.base_url = base_url
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    """How LLM calls are timed out, retried and hedged.
+
+    Every attempt gets its own connect and read deadline (the read deadline
+    applies between streamed chunks, so a long reply is never cut off).
+    Transient failures are retried with full-jitter exponential backoff, or
+    after the delay the provider asks for in ``Retry-After``. Once a streamed
+    reply has produced output it is never retried, which would repeat text.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, connect_timeout=5.0,
+            read_timeout=60.0, hedge=False, hedge_min_delay=0.2):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            max_attempts=settings.get('retry_max_attempts', 3),
+            base_delay=settings.get('retry_base_delay_ms', 500) / 1000,
+            max_delay=settings.get('retry_max_delay_ms', 8000) / 1000,
+            connect_timeout=settings.get('connect_timeout_ms', 5000) / 1000,
+            read_timeout=settings.get('read_timeout_ms', 60000) / 1000,
+            hedge=settings.get('hedge_requests', False),
+            hedge_min_delay=settings.get('hedge_min_delay_ms', 200) / 1000,
+        )
+
+    def timeout(self):
+        """Per-attempt timeout passed to the OpenAI client"""
+        import httpx
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @staticmethod
+    def is_transient(error):
+        """Whether the error says something about the endpoint rather than the request"""
+        import openai
+        if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUSES or error.status_code >= 500
+        return False
+
+    def should_retry(self, error, attempt):
+        return attempt < self.max_attempts and self.is_transient(error)
+
+    def backoff(self, attempt, error=None):
+        """Seconds to wait before the attempt after ``attempt`` (1-based)"""
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def retry_after(error):
+        """Delay requested by the provider through Retry-After(-Ms), if any"""
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if not headers:
+            return None
+        try:
+            if headers.get('retry-after-ms'):
+                return max(0.0, float(headers['retry-after-ms']) / 1000)
+        except ValueError:
+            pass
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """Stops sending requests to an endpoint after repeated transient failures.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail immediately with ``CircuitOpenError``. After ``reset_timeout`` seconds
+    one trial request is let through: success closes the circuit again,
+    failure keeps it open for another ``reset_timeout``. A trial that ends
+    any other way (cancelled, or refused for a reason that says nothing
+    about the endpoint) must be handed back with ``release_trial`` so the
+    next request can try again.
+    """
+
+    def __init__(self, base_url, failure_threshold=5, reset_timeout=30.0):
+        self.base_url = base_url
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_closed(self):
+        with self._lock:
+            return self._opened_at is None
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now.
+
+        Returns an id to pass to ``release_trial`` if the request is the
+        trial of a half-open circuit, otherwise None.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout or self._trial is not None:
+                raise CircuitOpenError(self.base_url, max(0.0, self.reset_timeout - waited))
+            logger.info('Circuit for %s half-open, sending a trial request', self.base_url)
+            self._trials += 1
+            self._trial = self._trials
+            return self._trial
+
+    def release_trial(self, trial):
+        """Let another request be the trial, unless ``trial`` was already recorded"""
+        with self._lock:
+            if trial is not None and self._trial == trial:
+                logger.debug('Trial request to %s ended without a result', self.base_url)
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info('Circuit for %s closed', self.base_url)
+            self._failures = 0
+            self._opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning('Circuit for %s opened after %s failures', self.base_url, self._failures)
+                self._opened_at = time.monotonic()
+                self._trial = None
+
+
+class RetryLoop:
+    """Breaker bookkeeping and retry decisions for the attempts of one request.
+
+    Shared by the backends, which only differ in how an attempt is sent and
+    how the backoff is waited out. Each attempt is wrapped in ``begin`` and
+    ``end``; ``succeeded`` or ``failed`` records its outcome, and ``failed``
+    returns the delay before the next attempt, or None if the error is
+    final. A reply that already started streaming through ``on_chunk`` is
+    not retried, as its deltas cannot be taken back.
+    """
+
+    def __init__(self, policy, breaker, on_chunk=None):
+        self.policy = policy
+        self.breaker = breaker
+        self.attempt = 1
+        self._emitted = False
+        self._trial = None
+        self.on_chunk = None
+        if on_chunk is not None:
+            def forward(delta):
+                self._emitted = True
+                on_chunk(delta)
+            self.on_chunk = forward
+
+    def begin(self):
+        """Raise CircuitOpenError unless the next attempt may be sent"""
+        self._trial = self.breaker.before_request()
+
+    def succeeded(self, reply):
+        self.breaker.record_success()
+        return reply
+
+    def failed(self, error, cancelled=False):
+        """Seconds to wait before the next attempt after ``error``, or None to give up"""
+        if isinstance(error, CircuitOpenError) or cancelled:
+            return None
+        if self.policy.is_transient(error):
+            self.breaker.record_failure()
+        if self._emitted or not self.policy.should_retry(error, self.attempt):
+            return None
+        delay = self.policy.backoff(self.attempt, error)
+        logger.warning('OpenAI attempt %s failed (%s), retrying in %.2fs', self.attempt, error, delay)
+        self.attempt += 1
+        return delay
+
+    def end(self):
+        # A cancelled or non-transient trial says nothing about the endpoint
+        self.breaker.release_trial(self._trial)
+        self._trial = None
+
+
+class LatencyTracker:
+    """Recent time-to-first-token samples of an endpoint, for the hedge delay"""
+
+    def __init__(self, window=100, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, fraction):
+        """The quantile of recent samples, or None until there are enough"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            return percentile(list(self._samples), fraction)
+
+
+class EndpointHealth:
+    """Circuit breakers and latency trackers keyed by base URL"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            failure_threshold=settings.get('circuit_failure_threshold', 5),
+            reset_timeout=settings.get('circuit_reset_s', 30),
+        )
+
+    def _get(self, base_url):
+        with self._lock:
+            entry = self._endpoints.get(base_url)
+            if entry is None:
+                entry = (CircuitBreaker(base_url, self.failure_threshold, self.reset_timeout),
+                    LatencyTracker())
+                self._endpoints[base_url] = entry
+            return entry
+
+    def breaker(self, base_url):
+        return self._get(base_url)[0]
+
+    def latency(self, base_url):
+        return self._get(base_url)[1]
+
+    def hedge_delay(self, base_url, policy):
+        """Delay after which a second request is sent, or None to not hedge"""
+        if not policy.hedge:
+            return None
+        breaker, latency = self._get(base_url)
+        p95 = latency.quantile(0.95)
+        # Without enough history, or against a failing endpoint, hedging only adds load
+        if p95 is None or not breaker.is_closed:
+            return None
+        return max(p95, policy.hedge_min_delay)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+class AttemptRace:
+    """Lets the first of a request's attempts to produce output win.
+
+    An attempt calls ``claim`` when it has its first token (or its whole
+    reply). Only the first claim succeeds; the other attempts are closed
+    through the callbacks they registered with ``on_lose``.
+    """
+
+    def __init__(self):
+        self.winner = None
+        self.decided = threading.Event()
+        self._closers = {}
+        self._lock = threading.Lock()
+
+    def on_lose(self, attempt, close):
+        """Register how to abort ``attempt`` if another one wins"""
+        with self._lock:
+            lost = self.winner is not None and self.winner != attempt
+            if not lost:
+                self._closers[attempt] = close
+        if lost:
+            close()
+
+    def claimer(self, attempt, latency):
+        """``claim`` for ``attempt`` that records its time to first output in ``latency``"""
+        started = time.perf_counter()
+
+        def claim():
+            if not self.claim(attempt):
+                return False
+            latency.record(time.perf_counter() - started)
+            return True
+        return claim
+
+    def claim(self, attempt):
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+                self.decided.set()
+                losers = [close for other, close in self._closers.items() if other != attempt]
+            else:
+                losers = []
+            won = self.winner == attempt
+        for close in losers:
+            try:
+                close()
+            except Exception as e:
+                logger.debug('AttemptRace: error closing losing attempt: %s', e)
+        return won
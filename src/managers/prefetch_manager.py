@@ -0,0 +1,187 @@
+import atexit
+import json
+import os
+import threading
+import logging
+from src.utils.worker_pool import CancelToken
+
+class PrefetchSlot:
+    """Holds the outcome of one speculative rewrite until the UI claims it.
+
+    Chunks, chunk progress, the final result or an error are buffered until
+    ``attach`` is called; after that they are forwarded to the attached
+    callbacks.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        self._chunks = []
+        self._progress = None
+        self._done = False
+        self._result = None
+        self._error = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def on_chunk(self, delta):
+        with self._lock:
+            self._chunks.append(delta)
+            if self._listener and self._listener[2]:
+                self._listener[2](delta)
+
+    def on_progress(self, completed, total):
+        with self._lock:
+            self._progress = (completed, total)
+            if self._listener and self._listener[3]:
+                self._listener[3](completed, total)
+
+    def on_success(self, result):
+        with self._lock:
+            self._done = True
+            self._result = result
+            if self._listener:
+                self._listener[0](result)
+
+    def on_error(self, error):
+        with self._lock:
+            self._done = True
+            self._error = error
+            if self._listener:
+                self._listener[1](error)
+
+    def attach(self, on_success, on_error, on_chunk=None, on_progress=None):
+        """Replay what has arrived so far and forward everything that follows"""
+        with self._lock:
+            if on_progress and self._progress:
+                on_progress(*self._progress)
+            if self._done:
+                if self._error is not None:
+                    on_error(self._error)
+                else:
+                    on_success(self._result)
+                return
+            if on_chunk and self._chunks:
+                on_chunk(''.join(self._chunks))
+            self._listener = (on_success, on_error, on_chunk, on_progress)
+
+
+class PrefetchManager:
+    """Speculatively rewrites new text with the user's most used options.
+
+    Usage counts are kept in a small JSON file, written at most every
+    ``save_delay`` seconds and at exit. When text arrives, the top options
+    are started right away (at most ``prefetch_max_concurrent``) and parked
+    in slots that ``claim`` hands over when the user picks one of them.
+    Requests are sent exactly like the ones they stand in for, including
+    the reduce step of the ``reduce_options``.
+    """
+
+    def __init__(self, rewrite_manager, settings_manager, usage_file="usage_stats.json", save_delay=5.0):
+        logging.debug('PrefetchManager.__init__ called')
+        self.rewrite_manager = rewrite_manager
+        self.settings_manager = settings_manager
+        self.usage_file = usage_file
+        self.save_delay = save_delay
+        self.usage_counts = self._load_usage()
+        self._slots = {}
+        self._text = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        atexit.register(self.flush)
+        logging.debug('PrefetchManager.__init__ finished')
+
+    def _load_usage(self):
+        try:
+            with open(self.usage_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logging.warning("Could not read usage stats, starting fresh: %s", e)
+            return {}
+
+    def record_usage(self, option, category):
+        """Count a user-selected option so future prefetches favour it"""
+        if not self.settings_manager.snapshot().get('speculative_prefetch', False):
+            return
+        key = f"{category}/{option}"
+        with self._lock:
+            self.usage_counts[key] = self.usage_counts.get(key, 0) + 1
+            # Written later by a timer, so no disk I/O delays the request
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """Write pending usage counts to disk immediately."""
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                usage_counts = dict(self.usage_counts)
+                self._dirty = False
+            temp_file = f"{self.usage_file}.tmp"
+            try:
+                with open(temp_file, 'w') as f:
+                    json.dump(usage_counts, f)
+                os.replace(temp_file, self.usage_file)
+            except OSError as e:
+                logging.error("Error saving usage stats: %s", e)
+
+    def _top_options(self, snapshot, limit):
+        """Most used options that still exist in the settings, best first"""
+        ranked = sorted(self.usage_counts.items(), key=lambda item: item[1], reverse=True)
+        options = []
+        for key, _ in ranked:
+            category, _, option = key.partition('/')
+            prompt = snapshot.prompt_for(option, category)
+            if prompt is not None:
+                options.append((category, option, prompt))
+            if len(options) >= limit:
+                break
+        return options
+
+    def start(self, text):
+        """Cancel earlier speculation and prefetch the top options for text"""
+        self.cancel_all()
+        snapshot = self.settings_manager.snapshot()
+        if not snapshot.get('speculative_prefetch', False) or not text.strip():
+            return
+
+        budget = snapshot.get('prefetch_max_concurrent', 2)
+        with self._lock:
+            self._text = text
+            for category, option, prompt in self._top_options(snapshot, budget):
+                logging.debug('PrefetchManager: prefetching %s.%s', category, option)
+                slot = PrefetchSlot(CancelToken(f'prefetch:{category}/{option}'))
+                self._slots[(category, option)] = slot
+                reduce = option in snapshot.get('reduce_options', ['Summary', 'Keypoints'])
+                self.rewrite_manager.rewrite_text(text, prompt, slot.on_success, slot.on_error,
+                    on_chunk=slot.on_chunk, cancel_token=slot.token, reduce=reduce,
+                    on_progress=slot.on_progress, snapshot=snapshot, option=option)
+
+    def claim(self, text, option, category):
+        """Hand over the slot for (category, option) if it was prefetched for text"""
+        with self._lock:
+            if text != self._text:
+                return None
+            slot = self._slots.pop((category, option), None)
+            if slot is not None:
+                logging.debug('PrefetchManager: claimed %s.%s', category, option)
+            return slot
+
+    def cancel_all(self):
+        """Cancel every unclaimed speculative request"""
+        with self._lock:
+            slots = list(self._slots.values())
+            self._slots.clear()
+            self._text = None
+        for slot in slots:
+            slot.token.cancel()
@@ -1,63 +1,216 @@
 import logging
+import threading
+from src.managers.token_budget import TokenBudget, TokenBudgetError
+from src.utils.text_chunker import estimate_tokens, split_text, PARAGRAPH_SEPARATOR
+from src.utils.logging_setup import Preview
 
 class RewriteManager:
-    def __init__(self, llm_manager, settings_manager, clipboard_handler):
+    def __init__(self, llm_manager, settings_manager, clipboard_handler, cache=None):
         logging.debug('RewriteManager.__init__ called')
         self.llm_manager = llm_manager
         self.settings_manager = settings_manager
         self.clipboard_handler = clipboard_handler
+        self.cache = cache
         logging.debug('RewriteManager.__init__ finished')
 
-    def rewrite_text(self, text, prompt, on_success, on_error):
-        """Rewrite the text using the provided prompt"""
+    def _stream_callback(self, snapshot, on_chunk):
+        """Return on_chunk if streaming is enabled in settings, otherwise None"""
+        if on_chunk is None or not snapshot.get('stream_responses', True):
+            return None
+        return on_chunk
+
+    def _generate(self, snapshot, system_message, prompt, text, on_success, on_error, on_chunk=None,
+            cancel_token=None, regenerate=False, reduce=False, on_progress=None, option=None, on_usage=None):
+        """Send a request, splitting selections over the chunk or context budget into several calls"""
+        budget = TokenBudget.from_settings(snapshot)
+        try:
+            plan = budget.plan(system_message, prompt, text, option, snapshot.get('chunk_token_budget', 2000))
+        except TokenBudgetError as e:
+            logging.warning('RewriteManager: refusing request: %s', e)
+            on_error(e)
+            return
+        if plan.chunk_tokens is None:
+            self._generate_single(snapshot, system_message, prompt, text, on_success, on_error,
+                on_chunk=on_chunk, cancel_token=cancel_token, regenerate=regenerate,
+                max_tokens=plan.max_tokens, input_tokens=plan.input_tokens, on_usage=on_usage)
+            return
+
+        chunks = split_text(text, plan.chunk_tokens)
+        logging.debug('RewriteManager: splitting selection into %s chunks', len(chunks))
+        on_chunk = self._stream_callback(snapshot, on_chunk)
+        results = [None] * len(chunks)
+        state = {'completed': 0, 'emitted': 0, 'failed': False}
+        lock = threading.Lock()
+
+        def on_chunk_done(index, response):
+            with lock:
+                if state['failed']:
+                    return
+                results[index] = response or ''
+                state['completed'] += 1
+                completed = state['completed']
+                # Stream finished chunks in order; a reduce step streams its own output instead
+                if on_chunk is not None and not reduce:
+                    while state['emitted'] < len(results) and results[state['emitted']] is not None:
+                        prefix = PARAGRAPH_SEPARATOR if state['emitted'] else ''
+                        on_chunk(prefix + results[state['emitted']])
+                        state['emitted'] += 1
+            if on_progress is not None:
+                on_progress(completed, len(chunks))
+            if completed < len(chunks):
+                return
+
+            combined = PARAGRAPH_SEPARATOR.join(results)
+            if reduce and budget.fits(system_message, prompt, combined, option):
+                logging.debug('RewriteManager: reducing chunk results')
+                overhead = budget.overhead_tokens(system_message, prompt)
+                combined_tokens = estimate_tokens(combined)
+                self._generate_single(snapshot, system_message, prompt, combined, on_success, on_error,
+                    on_chunk=on_chunk, cancel_token=cancel_token, regenerate=regenerate,
+                    max_tokens=budget.output_cap(combined_tokens, option),
+                    input_tokens=overhead + combined_tokens, on_usage=on_usage)
+            else:
+                if reduce:
+                    logging.warning('RewriteManager: chunk results exceed the model context, not reducing')
+                on_success(combined)
+
+        def on_chunk_error(error):
+            with lock:
+                if state['failed']:
+                    return
+                state['failed'] = True
+            on_error(error)
+
+        if on_progress is not None:
+            on_progress(0, len(chunks))
+        overhead = budget.overhead_tokens(system_message, prompt)
+        for index, chunk in enumerate(chunks):
+            chunk_tokens = estimate_tokens(chunk)
+            self._generate_single(snapshot, system_message, prompt, chunk,
+                lambda response, index=index: on_chunk_done(index, response), on_chunk_error,
+                cancel_token=cancel_token, regenerate=regenerate,
+                max_tokens=budget.output_cap(chunk_tokens, option),
+                input_tokens=overhead + chunk_tokens, on_usage=on_usage)
+
+    def _generate_single(self, snapshot, system_message, prompt, text, on_success, on_error,
+            on_chunk=None, cancel_token=None, regenerate=False, max_tokens=None, input_tokens=None,
+            on_usage=None):
+        """Serve a request from the result cache or send it to the LLM"""
+        api_key = snapshot.get('api_key')
+        base_url = snapshot.get('base_url')
+        model = snapshot.get('model')
+        temperature = snapshot.get('temperature', 0.7)
+
+        cache_key = None
+        if self.cache is not None and snapshot.get('cache_enabled', True):
+            cache_key = self.cache.make_key(model, base_url, system_message, prompt, text, temperature,
+                max_tokens)
+            if not regenerate:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logging.debug('RewriteManager: serving result from cache')
+                    # Like a reply from the LLM, never call back on the caller's thread
+                    self.llm_manager.dispatch(on_success, cached)
+                    return
+
+        # Tracks the call in flight: its output cap and whether its reply was cut off
+        state = {'max_tokens': max_tokens, 'truncated': False}
+
+        def on_response(response):
+            cancelled = cancel_token is not None and cancel_token.cancelled
+            if state['truncated'] and state['max_tokens'] is not None and not cancelled:
+                # The cap comes from an estimate of the input; rather than return
+                # half a rewrite, ask again with the reply left uncapped
+                logging.warning('RewriteManager: reply hit the cap of %s output tokens, retrying without it',
+                    state['max_tokens'])
+                send(None, None)
+                return
+            on_success(response)
+            # A reply cut off at max_tokens is incomplete, don't serve it again
+            if cache_key is not None and response and not state['truncated']:
+                self.cache.put(cache_key, response)
+
+        # Always watched for truncation; only passed on when usage is recorded
+        forward_usage = on_usage if snapshot.get('record_token_usage', True) else None
+
+        def record_usage(usage):
+            if usage.get('finish_reason') == 'length':
+                logging.warning('RewriteManager: reply hit the cap of %s output tokens', state['max_tokens'])
+                state['truncated'] = True
+            logging.debug('RewriteManager: used %s prompt (estimated %s) and %s completion tokens',
+                usage.get('prompt_tokens'), input_tokens, usage.get('completion_tokens'))
+            if forward_usage is not None:
+                forward_usage(dict(usage, estimated_prompt_tokens=input_tokens, max_tokens=state['max_tokens']))
+
+        def send(call_max_tokens, call_on_chunk):
+            state['max_tokens'] = call_max_tokens
+            state['truncated'] = False
+            self.llm_manager.generate_response(
+                api_key=api_key,
+                base_url=base_url,
+                model=model,
+                system_message=system_message,
+                prompt=prompt,
+                selected_text=text,
+                on_success=on_response,
+                on_error=on_error,
+                on_chunk=call_on_chunk,
+                cancel_token=cancel_token,
+                temperature=temperature,
+                max_tokens=call_max_tokens,
+                on_usage=record_usage
+            )
+
+        # The retry is not streamed: its full reply replaces the cut-off one in on_success
+        send(max_tokens, self._stream_callback(snapshot, on_chunk))
+
+    def rewrite_text(self, text, prompt, on_success, on_error, on_chunk=None,
+            cancel_token=None, regenerate=False, reduce=False, on_progress=None, snapshot=None,
+            option=None, on_usage=None):
+        """Rewrite the text using the provided prompt.
+
+        Large selections are rewritten chunk by chunk; with ``reduce`` the chunk
+        results are merged by one more call using the same prompt. ``option``
+        (the tone or format name) sets how many output tokens a reply may use;
+        ``on_usage`` receives the token usage of every call.
+        """
         if text.strip() == '':
             on_error('No text selected or found, please try again!')
             return
 
-        logging.debug(f'RewriteManager.rewrite_text called with text: {text}, prompt: {prompt}')
-        api_key = self.settings_manager.get('api_key')
-        base_url = self.settings_manager.get('base_url')
-        model = self.settings_manager.get('model')
-        system_message = self.settings_manager.get('system_message')
+        logging.debug('RewriteManager.rewrite_text called with text: %s, prompt: %s', Preview(text), Preview(prompt))
+        # One snapshot per request keeps every lookup consistent with a concurrent save
+        snapshot = snapshot or self.settings_manager.snapshot()
 
-        self.llm_manager.generate_response(api_key, base_url, model, system_message,
-            prompt, text, on_success, on_error)
+        self._generate(snapshot, snapshot.get('system_message'), prompt, text, on_success, on_error,
+            on_chunk=on_chunk, cancel_token=cancel_token, regenerate=regenerate,
+            reduce=reduce, on_progress=on_progress, option=option, on_usage=on_usage)
         logging.debug('RewriteManager.rewrite_text finished')
 
     def copy_result(self, text):
-        logging.debug(f'RewriteManager.copy_result called with text: {text}')
+        logging.debug('RewriteManager.copy_result called with text: %s', Preview(text))
         """Copy the rewritten text to the clipboard"""
         self.clipboard_handler.copy_text(text)
         logging.debug('RewriteManager.copy_result finished')
 
     def replace_text(self, text):
-        logging.debug(f'RewriteManager.replace_text called with text: {text}')
+        logging.debug('RewriteManager.replace_text called with text: %s', Preview(text))
         """Replace the selected text with the rewritten text"""
         self.clipboard_handler.replace_text(text)
         logging.debug('RewriteManager.replace_text finished')
 
-    def handle_custom_request(self, text, custom_prompt, on_success, on_error):
+    def handle_custom_request(self, text, custom_prompt, on_success, on_error, on_chunk=None,
+            cancel_token=None, regenerate=False, on_progress=None, on_usage=None):
         """Handle custom user requests with dedicated system message"""
         if text.strip() == '':
             on_error('No text selected or found, please try again!')
             return
 
-        logging.debug(f'Handling custom request with text: {text}, prompt: {custom_prompt}')
+        logging.debug('Handling custom request with text: %s, prompt: %s', Preview(text), Preview(custom_prompt))
         
         # Get custom system message from settings
-        custom_system_message = self.settings_manager.get('custom_system_message')
-        
-        api_key = self.settings_manager.get('api_key')
-        base_url = self.settings_manager.get('base_url')
-        model = self.settings_manager.get('model')
-
-        self.llm_manager.generate_response(
-            api_key=api_key,
-            base_url=base_url,
-            model=model,
-            system_message=custom_system_message,
-            prompt=custom_prompt,
-            selected_text=text,
-            on_success=on_success,
-            on_error=on_error
-        )
+        snapshot = self.settings_manager.snapshot()
+
+        self._generate(snapshot, snapshot.get('custom_system_message'), custom_prompt, text, on_success, on_error,
+            on_chunk=on_chunk, cancel_token=cancel_token, regenerate=regenerate,
+            on_progress=on_progress, on_usage=on_usage)
@@ -1,16 +1,26 @@
+import atexit
 import json
 import os
+import threading
 import logging
+from src.managers.settings_snapshot import SettingsSnapshot
 
 class SettingsManager:
-    def __init__(self, settings_file="settings.json"):
+    def __init__(self, settings_file="settings.json", save_delay=0.5):
         self.settings_file = settings_file
-        logging.info(f"Initializing SettingsManager with settings file: {settings_file}")
+        logging.info("Initializing SettingsManager with settings file: %s", settings_file)
+        self.save_delay = save_delay
+        self._save_lock = threading.RLock()
+        self._save_timer = None
+        self._dirty = False
+        self._version = 0
+        self._snapshot = None
         self.settings = self.load_settings()
+        atexit.register(self.flush)
 
     def load_settings(self):
         """Load settings from the JSON file."""
-        logging.info(f"Loading settings from {self.settings_file}")
+        logging.info("Loading settings from %s", self.settings_file)
         try:
             with open(self.settings_file, 'r') as f:
                 settings = json.load(f)
@@ -21,30 +31,41 @@ class SettingsManager:
                             settings[category][option].setdefault('icon', 'static\material_icons_round\toggle\round_radio_button_checked_black_48dp_white.png')
                 return settings
         except FileNotFoundError:
-            logging.warning(f"Settings file not found at {self.settings_file}, creating with defaults")
+            logging.warning("Settings file not found at %s, creating with defaults", self.settings_file)
             default_settings = self.get_default_settings()
             self.save_settings(default_settings)
             return default_settings
         except json.JSONDecodeError:
-            logging.error(f"Error decoding settings file, falling back to defaults.")
+            logging.error("Error decoding settings file, falling back to defaults.")
             return self.get_default_settings()
 
     def reload(self):
         """Reload settings from the file."""
-        logging.info(f"Reloading settings from {self.settings_file}")
+        logging.info("Reloading settings from %s", self.settings_file)
         self.settings = self.load_settings()
 
     def get(self, key, default=None):
         """Get a setting by key."""
         value = self.settings.get(key, default)
-        logging.debug(f"Getting setting {key}: {value}")
+        logging.debug("Getting setting %s", key)
         return value
 
     def set(self, key, value):
         """Set a setting."""
-        logging.info(f"Setting {key} to {value}")
-        self.settings[key] = value
-        self.save_settings()
+        logging.info("Setting %s", key)
+        with self._save_lock:
+            self.settings[key] = value
+            self.save_settings()
+
+    def snapshot(self):
+        """Get an immutable snapshot of the current settings.
+
+        The snapshot is rebuilt only after the settings changed.
+        """
+        with self._save_lock:
+            if self._snapshot is None:
+                self._snapshot = SettingsSnapshot.build(self.settings, self._version)
+            return self._snapshot
 
     def get_all(self):
         """Get all settings."""
@@ -54,29 +75,57 @@ class SettingsManager:
     def set_all(self, settings_dict):
         """Set all settings at once."""
         logging.info("Updating all settings")
-        self.settings = settings_dict
-        self.save_settings()
+        self.save_settings(settings_dict)
 
     def save_settings(self, settings=None):
-        """Save settings to the JSON file."""
-        logging.info(f"Saving settings to {self.settings_file}")
-        if settings is not None:
-            self.settings = settings
-            
-        try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(self.settings, f, indent=4)
-            self.reload()
-            logging.debug("Settings saved successfully")
-        except Exception as e:
-            logging.error(f"Error saving settings: {str(e)}")
+        """Schedule a write of the settings to the JSON file.
+
+        Writes are debounced by ``save_delay`` seconds so bursts of set/set_all
+        calls produce a single write. The in-memory copy is authoritative, so
+        nothing is re-read after saving.
+        """
+        with self._save_lock:
+            if settings is not None:
+                self.settings = settings
+            self._version += 1
+            self._snapshot = None
+            self._dirty = True
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes to disk immediately."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            logging.info("Saving settings to %s", self.settings_file)
+            try:
+                self._write_atomic(json.dumps(self.settings, indent=4))
+                self._dirty = False
+                logging.debug("Settings saved successfully")
+            except Exception as e:
+                logging.error("Error saving settings: %s", e)
+
+    def _write_atomic(self, content):
+        # Write a temp file next to the target and rename it over, so a crash never leaves a torn file
+        temp_file = f"{self.settings_file}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.settings_file)
 
     def reset_to_defaults(self):
         """Reset settings to default values."""
         logging.info("Resetting settings to defaults")
         default_settings = self.get_default_settings()
-        self.settings = default_settings
-        self.save_settings()
+        self.save_settings(default_settings)
 
 
     def get_default_settings(self):
@@ -91,6 +140,41 @@ class SettingsManager:
             'custom_system_message': (
                 "You are a helpful tool called Open Rewrite. Follow the user's custom instructions exactly as provided."
             ),
+            'stream_responses': True,
+            'stream_flush_interval_ms': 50,
+            'max_concurrent_requests': 4,
+            'llm_backend': 'threads',
+            'connect_timeout_ms': 5000,
+            'read_timeout_ms': 60000,
+            'retry_max_attempts': 3,
+            'retry_base_delay_ms': 500,
+            'retry_max_delay_ms': 8000,
+            'circuit_failure_threshold': 5,
+            'circuit_reset_s': 30,
+            'hedge_requests': False,
+            'hedge_min_delay_ms': 200,
+            'temperature': 0.7,
+            'cache_enabled': True,
+            'cache_max_entries': 200,
+            'cache_ttl_hours': 168,
+            'speculative_prefetch': False,
+            'prefetch_max_concurrent': 2,
+            'chunk_token_budget': 2000,
+            'model_context_tokens': 128000,
+            'max_selection_tokens': 50000,
+            'min_output_tokens': 256,
+            'max_output_tokens': 4096,
+            'default_output_token_ratio': 1.5,
+            'output_token_ratios': {'Concise': 0.75, 'Summary': 0.5, 'Keypoints': 0.75, 'List': 1.5, 'Markdown': 2.0},
+            'record_token_usage': True,
+            'reduce_options': ['Summary', 'Keypoints'],
+            'clipboard_timeout_ms': 500,
+            'restore_clipboard': True,
+            'update_check_enabled': True,
+            'update_check_interval_hours': 6,
+            'update_download_segments': 4,
+            'tracing_enabled': True,
+            'trace_buffer_size': 200,
             'tones': {
                 "Friendly": {
                     "prompt": "Rewrite the text in a friendly tone. Ensure it sounds approachable and warm. Do not assume anything or add any new information. don't use funky words.",
@@ -0,0 +1,72 @@
+import sys
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+def _freeze(value):
+    """Read-only copy of nested dicts and lists from the settings JSON"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def calculate_window_height(total_options):
+    """Calculate the main window height for the given number of options"""
+    # Fixed heights
+    header_height = 44  # 2.75rem
+    input_height = 44   # 2.75rem
+    separator_height = 18  # 0.25rem + margins
+
+    # Each option is 28px (1.75rem)
+    options_height = total_options * 28
+
+    # Extra height because of header.
+    if sys.platform == "win32": # windows
+        extra_height = 56
+    else:
+        extra_height = 0
+
+    # Total height is sum of all components
+    total_height = header_height + input_height + separator_height + options_height + extra_height + 25
+
+    # Add some padding
+    return min(max(total_height, 300), 800)  # Keep between 300-800px
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """Immutable view of the settings at one version.
+
+    Values needed on the rewrite hot path are precomputed once per change, so
+    a request reads one consistent snapshot instead of several separate
+    lookups that could straddle a concurrent ``set_all``. Nested dicts and
+    lists are frozen too (as read-only mappings and tuples).
+    """
+
+    version: int
+    values: Mapping
+    prompts: Mapping[Tuple[str, str], str]
+    window_height: int
+
+    @classmethod
+    def build(cls, settings, version):
+        values = _freeze(settings)
+        prompts = {}
+        for category in ('tones', 'formats'):
+            for option, data in (values.get(category) or {}).items():
+                prompts[(category, option)] = data.get('prompt')
+        return cls(
+            version=version,
+            values=values,
+            prompts=MappingProxyType(prompts),
+            window_height=calculate_window_height(len(prompts)),
+        )
+
+    def get(self, key, default=None):
+        """Get a setting by key."""
+        return self.values.get(key, default)
+
+    def prompt_for(self, option, category):
+        """Prompt for an option, or None if it does not exist."""
+        return self.prompts.get((category, option))
@@ -0,0 +1,137 @@
+import math
+from dataclasses import dataclass
+
+from src.utils.text_chunker import estimate_tokens
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Role markers and the <prompt>/<text> tags around the two messages
+MESSAGE_OVERHEAD_TOKENS = 16
+# Estimates are rough (~4 ASCII chars per token), so leave part of the context unused
+CONTEXT_HEADROOM = 0.9
+# A chunk smaller than this is not worth a request
+MIN_CHUNK_TOKENS = 64
+
+DEFAULT_OUTPUT_TOKEN_RATIOS = {
+    'Concise': 0.75,
+    'Summary': 0.5,
+    'Keypoints': 0.75,
+    'List': 1.5,
+    'Markdown': 2.0,
+}
+
+
+class TokenBudgetError(Exception):
+    """The selection cannot be sent within the configured token limits"""
+
+
+@dataclass(frozen=True)
+class RequestPlan:
+    """How one request is sent: as one call with ``max_tokens``, or split into chunks"""
+
+    input_tokens: int
+    max_tokens: int = None
+    chunk_tokens: int = None
+
+
+class TokenBudget:
+    """Sizes requests against the model context and caps their replies.
+
+    The reply of a rewrite is about as long as its input, scaled by the
+    option's ratio (a summary needs far fewer tokens than Markdown), and
+    kept between ``min_output_tokens`` and ``max_output_tokens``. That cap is
+    sent as ``max_tokens`` so a runaway reply cannot take unbounded time or
+    cost; with ``max_output_tokens`` at 0 nothing is sent. Requests without
+    an option (custom instructions) may use the whole ``max_output_tokens``.
+
+    A selection whose input and reply would not fit ``context_tokens`` is
+    split into chunks that do, and one above ``max_selection_tokens`` is
+    refused before anything is sent.
+    """
+
+    def __init__(self, context_tokens=128000, max_selection_tokens=50000, min_output_tokens=256,
+            max_output_tokens=4096, output_ratios=None, default_output_ratio=1.5):
+        self.context_tokens = context_tokens
+        self.max_selection_tokens = max_selection_tokens
+        self.min_output_tokens = min_output_tokens
+        self.max_output_tokens = max_output_tokens
+        self.output_ratios = DEFAULT_OUTPUT_TOKEN_RATIOS if output_ratios is None else output_ratios
+        self.default_output_ratio = default_output_ratio
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            context_tokens=settings.get('model_context_tokens', 128000),
+            max_selection_tokens=settings.get('max_selection_tokens', 50000),
+            min_output_tokens=settings.get('min_output_tokens', 256),
+            max_output_tokens=settings.get('max_output_tokens', 4096),
+            output_ratios=settings.get('output_token_ratios', DEFAULT_OUTPUT_TOKEN_RATIOS),
+            default_output_ratio=settings.get('default_output_token_ratio', 1.5),
+        )
+
+    @staticmethod
+    def overhead_tokens(system_message, prompt):
+        """Estimated tokens of everything in a request but the selected text"""
+        return estimate_tokens(system_message or '') + estimate_tokens(prompt or '') + MESSAGE_OVERHEAD_TOKENS
+
+    def _expected_output(self, text_tokens, option):
+        """Tokens to reserve for the reply to ``text_tokens`` of input"""
+        if option is None:
+            expected = self.max_output_tokens or self.min_output_tokens
+        else:
+            ratio = self.output_ratios.get(option, self.default_output_ratio)
+            expected = math.ceil(text_tokens * ratio)
+            if self.max_output_tokens:
+                expected = min(expected, self.max_output_tokens)
+        return max(expected, self.min_output_tokens)
+
+    def output_cap(self, text_tokens, option=None):
+        """``max_tokens`` for a reply to ``text_tokens`` of input, or None for no cap"""
+        if not self.max_output_tokens:
+            return None
+        return self._expected_output(text_tokens, option)
+
+    def max_text_tokens(self, overhead, option=None):
+        """Largest selection that fits the context together with its reply"""
+        available = int(self.context_tokens * CONTEXT_HEADROOM) - overhead
+        low, high = 0, max(0, available)
+        # Input plus reply grows with the input, so search for the largest fit
+        while low < high:
+            middle = (low + high + 1) // 2
+            if middle + self._expected_output(middle, option) <= available:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def fits(self, system_message, prompt, text, option=None):
+        """Whether ``text`` can be sent in one request"""
+        overhead = self.overhead_tokens(system_message, prompt)
+        return estimate_tokens(text) <= self.max_text_tokens(overhead, option)
+
+    def plan(self, system_message, prompt, text, option=None, chunk_tokens=None):
+        """Decide how to send ``text``; raises TokenBudgetError if it cannot be sent.
+
+        ``chunk_tokens`` splits selections above it even when they would fit
+        the context, so the chunks can be rewritten in parallel.
+        """
+        text_tokens = estimate_tokens(text)
+        if self.max_selection_tokens and text_tokens > self.max_selection_tokens:
+            raise TokenBudgetError(
+                f'The selection is about {text_tokens} tokens, more than the limit of '
+                f'{self.max_selection_tokens}. Select less text or raise max_selection_tokens in the settings.')
+
+        overhead = self.overhead_tokens(system_message, prompt)
+        limit = self.max_text_tokens(overhead, option)
+        if limit < MIN_CHUNK_TOKENS:
+            raise TokenBudgetError(
+                f'The system message and prompt leave no room for the text in the model context of '
+                f'{self.context_tokens} tokens. Shorten them or raise model_context_tokens in the settings.')
+        if chunk_tokens:
+            limit = min(limit, chunk_tokens)
+
+        if text_tokens <= limit:
+            return RequestPlan(overhead + text_tokens, self.output_cap(text_tokens, option))
+        logger.debug('TokenBudget: %s tokens over the limit of %s, chunking', text_tokens, limit)
+        return RequestPlan(overhead + text_tokens, chunk_tokens=limit)
@@ -0,0 +1,182 @@
+import json
+import os
+import re
+import threading
+import time
+import email.utils
+import logging
+
+GITHUB_LATEST_RELEASE_URL = "https://api.github.com/repos/SomaRe/open_rewrite/releases/latest"
+
+def version_key(version):
+    """Sort key for versions like ``0.10.1`` or ``v1.2.0-rc1``.
+
+    Numeric parts compare as numbers, so 0.10.0 sorts after 0.9.0, and a
+    pre-release sorts before the release it leads up to.
+    """
+    match = re.match(r'v?(\d+(?:\.\d+)*)(.*)', version.strip())
+    if not match:
+        return ((0,), 0, version)
+    numbers = tuple(int(part) for part in match.group(1).split('.'))
+    # Trailing zeros don't matter: 1.0 == 1.0.0
+    while len(numbers) > 1 and numbers[-1] == 0:
+        numbers = numbers[:-1]
+    suffix = match.group(2).lstrip('-.+')
+    return (numbers, 0 if suffix else 1, suffix)
+
+def is_newer(candidate, current):
+    return version_key(candidate) > version_key(current)
+
+
+class UpdateChecker:
+    """Polls the latest release in the background and caches the answer.
+
+    The last response is kept in ``cache_file`` with its ETag and
+    Last-Modified, so later checks are conditional requests that GitHub
+    answers with 304 without counting them against the rate limit. When the
+    API says the limit is used up (or asks to back off), no request is sent
+    before the reset time and the cached release is served instead.
+    ``latest_release`` never touches the network and never waits for a
+    check in flight.
+    """
+
+    def __init__(self, cache_file, api_url=GITHUB_LATEST_RELEASE_URL, interval=6 * 3600,
+            initial_delay=30, timeout=10, min_check_interval=60):
+        logging.debug('UpdateChecker.__init__ called with api_url=%s', api_url)
+        self.cache_file = cache_file
+        self.api_url = api_url
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.timeout = timeout
+        self.min_check_interval = min_check_interval
+        self._cache = self._load_cache()
+        self._lock = threading.Lock()
+        # Serializes checks; held during the request, unlike _lock
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        logging.debug('UpdateChecker.__init__ finished')
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable update cache %s: %s", self.cache_file, e)
+            return {}
+        # A cache written for another endpoint says nothing about this one
+        return cache if cache.get('url') == self.api_url else {}
+
+    def _save_cache(self):
+        temp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            logging.warning("Could not write update cache %s: %s", self.cache_file, e)
+
+    def latest_release(self):
+        """The cached release JSON (or None) and the time it was last confirmed"""
+        with self._lock:
+            return self._cache.get('release'), self._cache.get('checked_at')
+
+    def check(self, force=False):
+        """Refresh the cache with a conditional request and return the release JSON.
+
+        Returns the cached release without a request while rate limited, or
+        when the last check is less than ``min_check_interval`` seconds old
+        and ``force`` is not set. Raises on network errors if nothing is cached.
+        """
+        import requests
+
+        with self._check_lock:
+            with self._lock:
+                now = time.time()
+                retry_at = self._cache.get('retry_at') or 0
+                if now < retry_at:
+                    logging.info("Update check rate limited for %.0fs, using cached release", retry_at - now)
+                    return self._cache.get('release')
+                if not force and now - (self._cache.get('checked_at') or 0) < self.min_check_interval:
+                    return self._cache.get('release')
+
+                previous = self._cache.get('release')
+                headers = {'Accept': 'application/vnd.github+json'}
+                if previous is not None:
+                    if self._cache.get('etag'):
+                        headers['If-None-Match'] = self._cache['etag']
+                    if self._cache.get('last_modified'):
+                        headers['If-Modified-Since'] = self._cache['last_modified']
+
+            # The lock is released for the request so latest_release stays instant
+            try:
+                response = requests.get(self.api_url, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                if previous is not None:
+                    logging.warning("Update check failed, using cached release", exc_info=True)
+                    return previous
+                raise
+
+            with self._lock:
+                self._cache['url'] = self.api_url
+                self._cache['retry_at'] = self._retry_at(response)
+                if response.status_code == 304:
+                    logging.info("Latest release unchanged (304)")
+                    self._cache['checked_at'] = now
+                elif response.status_code in (403, 429) and self._cache['retry_at']:
+                    logging.warning("Update check rate limited until %s",
+                        time.strftime('%H:%M:%S', time.localtime(self._cache['retry_at'])))
+                    self._save_cache()
+                    if previous is not None:
+                        return previous
+                    response.raise_for_status()
+                else:
+                    response.raise_for_status()
+                    self._cache.update({
+                        'release': response.json(),
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'checked_at': now,
+                    })
+                self._save_cache()
+                return self._cache.get('release')
+
+    @staticmethod
+    def _retry_at(response):
+        """Epoch time before which no further request should be sent, or None"""
+        headers = response.headers
+        retry_after = headers.get('Retry-After')
+        if retry_after:
+            if retry_after.isdigit():
+                return time.time() + int(retry_after)
+            try:
+                return email.utils.parsedate_to_datetime(retry_after).timestamp()
+            except (TypeError, ValueError):
+                pass
+        if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset', '').isdigit():
+            return float(headers['X-RateLimit-Reset'])
+        if response.status_code in (403, 429):
+            # Secondary rate limits may come without headers; wait at least a minute
+            return time.time() + 60 if 'rate limit' in response.text.lower() else None
+        return None
+
+    def start(self):
+        """Check after ``initial_delay`` seconds and then every ``interval`` seconds"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='update-checker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop.wait(delay):
+            try:
+                self.check()
+            except Exception as e:
+                logging.warning("Background update check failed: %s", e)
+            delay = self.interval
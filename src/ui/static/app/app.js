@@ -1,8 +1,16 @@
-import { marked } from "https://cdn.jsdelivr.net/npm/marked/lib/marked.esm.js";
+import { renderMarkdown, clearMarkdown } from "./markdownRenderer.js";
+import { bridgeCall, bridgeChunk } from "./bridge.js";
+import { iconMarkup, hydrateIcons } from "../icons.js";
 
 // Global variables
 let currentText = '';
 let currentResult = '';
+let lastRequest = null;
+let compareMode = false;
+let compareSelection = [];
+let compareResults = [];
+let renderScheduled = false;
+let resultPaintReported = false;
 
 // Define all functions first
 
@@ -13,10 +21,24 @@ function focusInput() {
     }
 }
 
+// Tell Python when a view has reached the screen, closing its latency trace
+function reportPaint(view) {
+    requestAnimationFrame(() => pywebview.api.trace_paint(view));
+}
+
+function reportResultPaint() {
+    if (!resultPaintReported) {
+        resultPaintReported = true;
+        reportPaint('result');
+    }
+}
+
 function handleSelectedText(text) {
     currentText = text;
+    setCompareMode(false);
     document.getElementById('options-view').classList.remove('hidden');
     document.getElementById('result-view').classList.add('hidden');
+    reportPaint('options');
     
     // Clear and focus the input field
     const inputField = document.getElementById('custom-input-field');
@@ -27,29 +49,59 @@ function handleSelectedText(text) {
 }
 
 function showOptionsView() {
+    // Leaving the result view abandons the in-flight rewrite
+    pywebview.api.cancel_request();
     document.getElementById('options-view').classList.remove('hidden');
     document.getElementById('result-view').classList.add('hidden');
 }
 
 function showLoading() {
+    currentResult = '';
+    resultPaintReported = false;
+    document.getElementById('result-actions').classList.remove('hidden');
     document.getElementById('loading-indicator').classList.remove('hidden');
-    document.getElementById('result-text').textContent = '';
+    const resultText = document.getElementById('result-text');
+    clearMarkdown(resultText);
+    resultText.textContent = '';
 }
 
 function hideLoading() {
     document.getElementById('loading-indicator').classList.add('hidden');
+    document.getElementById('progress-text').classList.add('hidden');
+}
+
+function showProgress(completed, total) {
+    const progressText = document.getElementById('progress-text');
+    progressText.textContent = `${completed} of ${total} parts done`;
+    progressText.classList.remove('hidden');
 }
 
 function showResult(result) {
     currentResult = result;
-    // Convert markdown to HTML using marked
-    const htmlContent = marked.parse(result);
-    document.getElementById('result-text').innerHTML = htmlContent;
+    // Convert markdown to HTML in the markdown worker
+    renderMarkdown(document.getElementById('result-text'), result, reportResultPaint);
     hideLoading();
 }
 
+function renderResult() {
+    renderScheduled = false;
+    renderMarkdown(document.getElementById('result-text'), currentResult, reportResultPaint);
+}
+
+function appendResult(chunk) {
+    // Streamed deltas arrive in batches; re-render at most once per frame
+    currentResult += chunk;
+    document.getElementById('loading-indicator').classList.add('hidden');
+    if (!renderScheduled) {
+        renderScheduled = true;
+        requestAnimationFrame(renderResult);
+    }
+}
+
 function showError(error) {
-    document.getElementById('result-text').textContent = `Error: ${error}`;
+    const resultText = document.getElementById('result-text');
+    clearMarkdown(resultText);
+    resultText.textContent = `Error: ${error}`;
     hideLoading();
 }
 
@@ -108,14 +160,18 @@ function loadOptions() {
 
 function createOptionButton(name, icon, category) {
     const button = document.createElement('button');
-    button.className = 'flex items-center w-full p-1 h-7 hover:bg-zinc-700 transition-colors text-left';
+    button.className = 'option-button flex items-center w-full p-1 h-7 hover:bg-zinc-700 transition-colors text-left';
     button.innerHTML = `
-        <img class="w-4 h-4 mr-2" src="${icon}" alt="${name}">
+        ${iconMarkup(icon, 'w-4 h-4 mr-2', name)}
         <span class="text-sm">${name}</span>
     `;
 
     button.addEventListener('click', () => {
-        selectOption(name, category);
+        if (compareMode) {
+            toggleCompareSelection(name, category, button);
+        } else {
+            selectOption(name, category);
+        }
     });
 
     return button;
@@ -129,9 +185,111 @@ function selectOption(option, category) {
     showLoading();
     
     // Call the Python API to rewrite the text
+    lastRequest = { option, category };
     pywebview.api.rewrite_text(currentText, option, category);
 }
 
+function setCompareMode(enabled) {
+    compareMode = enabled;
+    compareSelection = [];
+    document.querySelectorAll('.option-button').forEach(button => button.classList.remove('bg-zinc-600'));
+    document.getElementById('compare-button').classList.toggle('bg-zinc-700', enabled);
+}
+
+function toggleCompareMode() {
+    // In compare mode the same button runs the selection, or leaves the mode if nothing is selected
+    if (compareMode && compareSelection.length > 0) {
+        runCompare();
+    } else {
+        setCompareMode(!compareMode);
+    }
+}
+
+function toggleCompareSelection(option, category, button) {
+    const index = compareSelection.findIndex(item => item.option === option && item.category === category);
+    if (index === -1) {
+        compareSelection.push({ option, category });
+        button.classList.add('bg-zinc-600');
+    } else {
+        compareSelection.splice(index, 1);
+        button.classList.remove('bg-zinc-600');
+    }
+}
+
+function createCompareCard(option, index) {
+    const card = document.createElement('div');
+    card.className = 'mb-4 p-2 rounded bg-zinc-700';
+    card.innerHTML = `
+        <div class="flex items-center justify-between mb-2">
+            <span class="text-sm font-bold">${option}</span>
+            <div class="flex space-x-2">
+                <button class="p-1 rounded bg-blue-500 hover:bg-blue-700" onclick="copyCompareResult(${index})">
+                    ${iconMarkup('static/material_icons_round/content/round_content_copy_black_48dp_white.png', 'w-4 h-4')}
+                </button>
+                <button class="p-1 rounded bg-green-500 hover:bg-green-700" onclick="replaceCompareResult(${index})">
+                    ${iconMarkup('static/material_icons_round/editor/round_mode_black_48dp_white.png', 'w-4 h-4')}
+                </button>
+            </div>
+        </div>
+        <div id="compare-loading-${index}" class="animate-spin rounded-full h-6 w-6 border-t-2 border-b-2 border-blue-500"></div>
+        <div id="compare-result-${index}" class="text-base select-text"></div>
+    `;
+    return card;
+}
+
+function runCompare() {
+    const selection = compareSelection;
+    setCompareMode(false);
+
+    document.getElementById('result-title').textContent = 'Compare';
+    document.getElementById('options-view').classList.add('hidden');
+    document.getElementById('result-view').classList.remove('hidden');
+    document.getElementById('result-actions').classList.add('hidden');
+    hideLoading();
+
+    currentResult = '';
+    resultPaintReported = false;
+    compareResults = selection.map(() => '');
+    const container = document.getElementById('result-text');
+    clearMarkdown(container);
+    container.innerHTML = '';
+    selection.forEach((item, index) => container.appendChild(createCompareCard(item.option, index)));
+
+    pywebview.api.compare_options(currentText, selection.map(item => [item.option, item.category]));
+}
+
+function appendCompareResult(index, chunk) {
+    compareResults[index] += chunk;
+    document.getElementById(`compare-loading-${index}`)?.classList.add('hidden');
+    renderMarkdown(document.getElementById(`compare-result-${index}`), compareResults[index], reportResultPaint);
+}
+
+function showCompareResult(index, result) {
+    compareResults[index] = result;
+    document.getElementById(`compare-loading-${index}`)?.classList.add('hidden');
+    renderMarkdown(document.getElementById(`compare-result-${index}`), result, reportResultPaint);
+}
+
+function showCompareError(index, error) {
+    document.getElementById(`compare-loading-${index}`)?.classList.add('hidden');
+    const resultText = document.getElementById(`compare-result-${index}`);
+    clearMarkdown(resultText);
+    resultText.textContent = `Error: ${error}`;
+}
+
+function copyCompareResult(index) {
+    if (compareResults[index]) {
+        pywebview.api.copy_to_clipboard(compareResults[index]);
+    }
+}
+
+function replaceCompareResult(index) {
+    if (compareResults[index]) {
+        pywebview.api.replace_text(compareResults[index]);
+        handleSelectedText('');
+    }
+}
+
 function sendCustomRequest() {
     const customInput = document.getElementById('custom-input-field')?.value.trim();
     if (!customInput) {
@@ -145,9 +303,24 @@ function sendCustomRequest() {
     
     showLoading();
     
+    lastRequest = { customPrompt: customInput };
     pywebview.api.handle_custom_request(currentText, customInput);
 }
 
+function regenerateResult() {
+    if (!lastRequest) {
+        return;
+    }
+    showLoading();
+
+    // Bypass the result cache and ask the model again
+    if (lastRequest.customPrompt !== undefined) {
+        pywebview.api.handle_custom_request(currentText, lastRequest.customPrompt, true);
+    } else {
+        pywebview.api.rewrite_text(currentText, lastRequest.option, lastRequest.category, true);
+    }
+}
+
 function copyResult() {
     if (currentResult) {
         pywebview.api.copy_to_clipboard(currentResult);
@@ -163,6 +336,7 @@ function replaceResult() {
 
 // Initialize the app
 function initializeApp() {
+    hydrateIcons();
     loadOptions();
     focusInput();
     
@@ -186,9 +360,13 @@ function initializeApp() {
 }
 
 // Expose functions to window object (for HTML and pywebview)
+window.bridgeCall = bridgeCall;
+window.bridgeChunk = bridgeChunk;
 window.focusInput = focusInput;
 window.handleSelectedText = handleSelectedText;
 window.showResult = showResult;
+window.appendResult = appendResult;
+window.showProgress = showProgress;
 window.showError = showError;
 window.toggleSettingsMenu = toggleSettingsMenu;
 window.showOptionsView = showOptionsView;
@@ -202,6 +380,13 @@ window.exitApp = () => {
 };
 window.copyResult = copyResult;
 window.replaceResult = replaceResult;
+window.regenerateResult = regenerateResult;
+window.toggleCompareMode = toggleCompareMode;
+window.appendCompareResult = appendCompareResult;
+window.showCompareResult = showCompareResult;
+window.showCompareError = showCompareError;
+window.copyCompareResult = copyCompareResult;
+window.replaceCompareResult = replaceCompareResult;
 window.sendCustomRequest = sendCustomRequest;
 window.selectOption = selectOption;
 window.refreshOptions = loadOptions;
@@ -0,0 +1,29 @@
+// Python calls page functions as bridgeCall(name, args) with JSON-encoded
+// arguments. Large strings are sent ahead in pieces with bridgeChunk and
+// passed as {"$payload": id} placeholders, which are swapped for the joined
+// pieces here.
+
+const pendingPayloads = new Map();
+
+function isPayload(arg) {
+    return arg !== null && typeof arg === 'object' && '$payload' in arg;
+}
+
+export function bridgeChunk(id, chunk) {
+    if (!pendingPayloads.has(id)) {
+        pendingPayloads.set(id, []);
+    }
+    pendingPayloads.get(id).push(chunk);
+}
+
+export function bridgeCall(name, args) {
+    const resolved = args.map(arg => {
+        if (!isPayload(arg)) {
+            return arg;
+        }
+        const chunks = pendingPayloads.get(arg.$payload) || [];
+        pendingPayloads.delete(arg.$payload);
+        return chunks.join('');
+    });
+    window[name](...resolved);
+}
@@ -0,0 +1,79 @@
+// Renders Markdown into elements through a worker so a large result never
+// blocks the popup. While a parse is in flight further updates to the same
+// element are coalesced into one follow-up parse of the latest text.
+
+const worker = createWorker();
+const targets = new Map();
+const requests = new Map();
+let nextRequestId = 0;
+
+function createWorker() {
+    try {
+        const markdownWorker = new Worker('static/app/markdownWorker.js');
+        markdownWorker.onmessage = handleMessage;
+        markdownWorker.onerror = (error) => console.error('Markdown worker error:', error);
+        return markdownWorker;
+    } catch (error) {
+        console.error('Could not start markdown worker:', error);
+        return null;
+    }
+}
+
+function send(element, target) {
+    const id = ++nextRequestId;
+    target.busy = true;
+    target.sent = target.text;
+    requests.set(id, { element, target });
+    worker.postMessage({ id, text: target.text });
+}
+
+function handleMessage(event) {
+    const { id, html, error } = event.data;
+    const request = requests.get(id);
+    requests.delete(id);
+    // The element was cleared or re-targeted since this parse was sent
+    if (!request || targets.get(request.element) !== request.target) {
+        return;
+    }
+    const { element, target } = request;
+    target.busy = false;
+    if (error !== undefined) {
+        console.error('Error rendering markdown:', error);
+        element.textContent = target.sent;
+    } else {
+        element.innerHTML = html;
+    }
+    if (target.onRendered) {
+        target.onRendered();
+    }
+    if (target.text !== target.sent) {
+        send(element, target);
+    } else {
+        targets.delete(element);
+    }
+}
+
+export function renderMarkdown(element, text, onRendered = null) {
+    if (!worker) {
+        element.textContent = text;
+        if (onRendered) {
+            onRendered();
+        }
+        return;
+    }
+    let target = targets.get(element);
+    if (!target) {
+        target = { text: '', sent: null, busy: false };
+        targets.set(element, target);
+    }
+    target.text = text;
+    target.onRendered = onRendered;
+    if (!target.busy) {
+        send(element, target);
+    }
+}
+
+// Drop pending renders so a late parse can't overwrite new content
+export function clearMarkdown(element) {
+    targets.delete(element);
+}
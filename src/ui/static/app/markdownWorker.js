@@ -0,0 +1,11 @@
+// Parses Markdown off the UI thread with the vendored, pinned marked build
+importScripts('../vendor/marked/marked.js');
+
+self.onmessage = (event) => {
+    const { id, text } = event.data;
+    try {
+        self.postMessage({ id, html: marked.parse(text) });
+    } catch (error) {
+        self.postMessage({ id, error: String(error) });
+    }
+};
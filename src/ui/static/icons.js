@@ -0,0 +1,67 @@
+// Icons are drawn from the sprite sheet in icon_atlas.css, keyed by their path
+// below static/. When the atlas has not been built (e.g. a dev checkout
+// without Pillow) the loose PNG is used as the background instead.
+
+const ICON_ROOT = 'material_icons_round/';
+let atlasAvailable = null;
+
+function hasAtlas() {
+    if (atlasAvailable === null) {
+        const probe = document.createElement('span');
+        probe.className = 'icon-sprite';
+        document.body.appendChild(probe);
+        atlasAvailable = getComputedStyle(probe).backgroundImage !== 'none';
+        probe.remove();
+    }
+    return atlasAvailable;
+}
+
+// Stored icon paths come as "static/...", "static\..." or full URLs
+export function iconKey(src) {
+    const path = (src || '').replace(/\\/g, '/');
+    const index = path.indexOf(ICON_ROOT);
+    return index !== -1 ? path.substring(index) : null;
+}
+
+export function setIcon(element, src) {
+    const key = iconKey(src);
+    element.dataset.src = src;
+    element.classList.add('icon-sprite');
+    if (key && hasAtlas()) {
+        element.dataset.icon = key;
+        element.style.backgroundImage = '';
+        element.style.backgroundSize = '';
+        element.style.backgroundPosition = '';
+        element.style.backgroundRepeat = '';
+        element.style.display = '';
+        element.style.flexShrink = '';
+    } else {
+        delete element.dataset.icon;
+        element.style.backgroundImage = `url("${key ? 'static/' + key : src}")`;
+        element.style.backgroundSize = 'contain';
+        element.style.backgroundPosition = 'center';
+        element.style.backgroundRepeat = 'no-repeat';
+        // Without the atlas stylesheet the span is inline and its w-*/h-* size would not apply
+        element.style.display = 'inline-block';
+        element.style.flexShrink = '0';
+    }
+}
+
+export function iconMarkup(src, classes = '', alt = '') {
+    const span = document.createElement('span');
+    span.className = classes;
+    span.setAttribute('role', 'img');
+    span.setAttribute('aria-label', alt);
+    setIcon(span, src);
+    return span.outerHTML;
+}
+
+// Apply the fallback to icons written directly into the HTML
+export function hydrateIcons(root = document) {
+    if (hasAtlas()) {
+        return;
+    }
+    root.querySelectorAll('.icon-sprite[data-icon]').forEach(element => {
+        setIcon(element, 'static/' + element.dataset.icon);
+    });
+}
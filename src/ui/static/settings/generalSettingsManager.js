@@ -1,3 +1,5 @@
+import { loadPerformance } from './performanceManager.js';
+
 export function showSection(section) {
     document.querySelectorAll('[id$="-section"]').forEach(el => {
         el.classList.add('hidden');
@@ -8,6 +10,10 @@ export function showSection(section) {
         button.classList.remove('bg-zinc-700');
     });
     document.querySelector(`nav button[onclick="showSection('${section}')"]`).classList.add('bg-zinc-700');
+
+    if (section === 'performance') {
+        loadPerformance();
+    }
 }
 
 export function checkStartupStatus() {
@@ -40,6 +46,8 @@ export function loadSettings() {
         document.getElementById('base_url').value = settings.base_url || 'https://api.openai.com/v1';
         document.getElementById('model').value = settings.model || 'gpt-4o-mini';
         document.getElementById('system_message').value = settings.system_message || '';
+        document.getElementById('cache-toggle').checked = settings.cache_enabled !== false;
+        document.getElementById('prefetch-toggle').checked = settings.speculative_prefetch === true;
 
         const tonesList = document.getElementById('tones-list');
         tonesList.innerHTML = '';
@@ -63,8 +71,17 @@ export function loadSettings() {
     // document.getElementById('update-status').textContent = `Current Version: ${document.getElementById('current-version-display').textContent}`;
     document.getElementById('update-result').textContent = '';
     document.getElementById('release-notes-container').classList.add('hidden');
+    document.getElementById('update-progress-container').classList.add('hidden');
     document.getElementById('check-update-button').disabled = false;
     document.getElementById('check-update-button').textContent = 'Check for Updates';
+
+    // Served from the background checker's cache, so this never waits on the network
+    pywebview.api.get_cached_update().then(status => {
+        if (status.update_available) {
+            document.getElementById('update-result').textContent =
+                `Version ${status.latest_version} is available. Check for Updates to install it.`;
+        }
+    });
 }
 
 export function checkForUpdate() {
@@ -93,7 +110,7 @@ export function checkForUpdate() {
 
             newInstallButton.textContent = `Download & Install v${result.latest_version}`;
             newInstallButton.onclick = () => { // Use arrow function to capture result.download_url
-                promptAndUpdate(result.download_url, result.latest_version);
+                promptAndUpdate(result);
             };
 
         } else if (result.error) {
@@ -109,20 +126,44 @@ export function checkForUpdate() {
     });
 }
 
-function promptAndUpdate(downloadUrl, version) {
+function formatMegabytes(bytes) {
+    return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
+
+// Called from Python while the update downloads
+export function updateDownloadProgress(progress) {
+    const container = document.getElementById('update-progress-container');
+    const bar = document.getElementById('update-progress-bar');
+    container.classList.remove('hidden');
+    if (progress.total) {
+        const percent = Math.min(100, (progress.downloaded / progress.total) * 100);
+        bar.style.width = `${percent}%`;
+        document.getElementById('update-result').textContent =
+            `Downloading update: ${formatMegabytes(progress.downloaded)} of ${formatMegabytes(progress.total)} (${percent.toFixed(0)}%)`;
+    } else {
+        document.getElementById('update-result').textContent =
+            `Downloading update: ${formatMegabytes(progress.downloaded)}`;
+    }
+}
+
+function promptAndUpdate(release) {
+    const version = release.latest_version;
     const installButton = document.getElementById('install-update-button'); // Get the potentially new button
     if (confirm(`Are you sure you want to download and install version ${version}? The application will close and restart.`)) {
         installButton.disabled = true;
         installButton.textContent = 'Downloading...';
         document.getElementById('update-result').textContent = 'Downloading update, please wait...';
 
-        pywebview.api.download_and_install_update(downloadUrl).then(installResult => {
+        pywebview.api.download_and_install_update(
+            release.download_url, release.sha256, release.delta_url || null, release.delta_sha256 || null
+        ).then(installResult => {
             // This part might not be reached if the app exits quickly
             if (installResult.success) {
                 // Usually the app closes before this is shown
                 document.getElementById('update-result').textContent = 'Update process started. The app will now close.';
             } else {
                 document.getElementById('update-result').textContent = `Update failed: ${installResult.error}`;
+                document.getElementById('update-progress-container').classList.add('hidden');
                 installButton.disabled = false;
                 installButton.textContent = `Download & Install v${version}`;
             }
@@ -142,24 +183,26 @@ export function saveSettings() {
         base_url: document.getElementById('base_url').value,
         model: document.getElementById('model').value,
         system_message: document.getElementById('system_message').value,
+        cache_enabled: document.getElementById('cache-toggle').checked,
+        speculative_prefetch: document.getElementById('prefetch-toggle').checked,
         tones: {},
         formats: {}
     };
 
     document.querySelectorAll('.tone').forEach(toneElement => {
         const name = toneElement.dataset.name;
-        const fullIconPath = toneElement.querySelector('.tone-icon').src;
-        const staticIndex = fullIconPath.indexOf('static/');
-        const icon = staticIndex !== -1 ? fullIconPath.substring(staticIndex) : '';
+        const iconPath = toneElement.querySelector('.tone-icon').dataset.src.replace(/\\/g, '/');
+        const staticIndex = iconPath.indexOf('static/');
+        const icon = staticIndex !== -1 ? iconPath.substring(staticIndex) : '';
         const prompt = toneElement.querySelector('.tone-prompt').textContent;
         settings.tones[name] = { icon: icon, prompt: prompt };
     });
     
     document.querySelectorAll('.format').forEach(formatElement => {
         const name = formatElement.dataset.name;
-        const fullIconPath = formatElement.querySelector('.format-icon').src;
-        const staticIndex = fullIconPath.indexOf('static/');
-        const icon = staticIndex !== -1 ? fullIconPath.substring(staticIndex) : '';
+        const iconPath = formatElement.querySelector('.format-icon').dataset.src.replace(/\\/g, '/');
+        const staticIndex = iconPath.indexOf('static/');
+        const icon = staticIndex !== -1 ? iconPath.substring(staticIndex) : '';
         const prompt = formatElement.querySelector('.format-prompt').textContent;
         settings.formats[name] = { icon: icon, prompt: prompt };
     });
@@ -1,5 +1,15 @@
+import { iconMarkup, setIcon } from '../icons.js';
+
 let currentIconField = null;
 let currentCategory = null;
+let iconCategories = null;
+
+// Icons are fetched and rendered one page at a time as the grid is scrolled
+const ICON_PAGE_SIZE = 60;
+let loadedCount = 0;
+let totalCount = 0;
+let pageRequest = null;
+let pageObserver = null;
 
 export function openIconSelector(type) {
     currentIconField = type;
@@ -14,53 +24,85 @@ export function closeIconSelector() {
 
 export async function loadIcons() {
     try {
-        const iconsByCategory = await pywebview.api.get_available_icons();
-        const categories = Object.keys(iconsByCategory);
-        
-        // Load category tabs
-        const categoryTabs = document.getElementById('icon-categories');
-        const tabsContainer = categoryTabs.querySelector('div');
-        tabsContainer.innerHTML = '';
-        categories.forEach(category => {
-            const tab = document.createElement('button');
-            tab.className = 'px-4 py-2 rounded-md text-sm font-medium whitespace-nowrap';
-            tab.textContent = category;
-            tab.addEventListener('click', () => showCategoryIcons(category, iconsByCategory[category]));
-            
-            if (!currentCategory) {
-                tab.classList.add('bg-zinc-700', 'text-white');
-                currentCategory = category;
-            } else {
-                tab.classList.add('text-zinc-400', 'hover:text-white');
-            }
-            tabsContainer.appendChild(tab);
-        });
+        // Categories are loaded once per settings window
+        if (!iconCategories) {
+            iconCategories = await pywebview.api.get_icon_categories();
 
+            const categoryTabs = document.getElementById('icon-categories');
+            const tabsContainer = categoryTabs.querySelector('div');
+            tabsContainer.innerHTML = '';
+            Object.keys(iconCategories).forEach(category => {
+                const tab = document.createElement('button');
+                tab.className = 'px-4 py-2 rounded-md text-sm font-medium whitespace-nowrap text-zinc-400 hover:text-white';
+                tab.textContent = category;
+                tab.addEventListener('click', () => showCategoryIcons(category));
+                tabsContainer.appendChild(tab);
+            });
+        }
+
+        const categories = Object.keys(iconCategories);
         if (categories.length > 0) {
-            showCategoryIcons(currentCategory, iconsByCategory[currentCategory]);
+            showCategoryIcons(currentCategory || categories[0]);
         }
     } catch (error) {
         console.error('Error loading icons:', error);
     }
 }
 
-export function showCategoryIcons(category, icons) {
+function handleIconClick(iconSrc) {
+    if (currentIconField === 'tone') {
+        const preview = document.getElementById('new-tone-icon-preview');
+        setIcon(preview, iconSrc);
+        preview.style.display = 'block';
+    } else if (currentIconField === 'format') {
+        const preview = document.getElementById('new-format-icon-preview');
+        setIcon(preview, iconSrc);
+        preview.style.display = 'block';
+    }
+    closeIconSelector();
+}
+
+function appendIcons(icons) {
     const iconGrid = document.getElementById('icon-grid');
-    iconGrid.innerHTML = '';
-    
-    // Add click handler for icons
-    const handleIconClick = (iconSrc) => {
-        if (currentIconField === 'tone') {
-            const preview = document.getElementById('new-tone-icon-preview');
-            preview.src = iconSrc;
-            preview.style.display = 'block';
-        } else if (currentIconField === 'format') {
-            const preview = document.getElementById('new-format-icon-preview');
-            preview.src = iconSrc;
-            preview.style.display = 'block';
+    const sentinel = document.getElementById('icon-grid-sentinel');
+    icons.forEach(icon => {
+        const iconDiv = document.createElement('div');
+        iconDiv.className = 'flex flex-col items-center p-2 cursor-pointer hover:bg-zinc-700 rounded';
+        iconDiv.innerHTML = iconMarkup("static/" + icon, 'w-8 h-8', icon);
+        iconDiv.addEventListener('click', () => handleIconClick("static/" + icon));
+        iconGrid.insertBefore(iconDiv, sentinel);
+    });
+}
+
+async function loadNextPage() {
+    if (pageRequest || (totalCount && loadedCount >= totalCount)) {
+        return;
+    }
+    const category = currentCategory;
+    const request = pywebview.api.get_icons_page(category, loadedCount, ICON_PAGE_SIZE);
+    pageRequest = request;
+    try {
+        const page = await request;
+        // Ignore pages of a category the user already switched away from
+        if (category !== currentCategory) {
+            return;
         }
-        closeIconSelector();
-    };
+        totalCount = page.total;
+        loadedCount += page.icons.length;
+        appendIcons(page.icons);
+    } catch (error) {
+        console.error('Error loading icon page:', error);
+    } finally {
+        // A category switch may have started another request meanwhile; leave that one marked
+        if (pageRequest === request) {
+            pageRequest = null;
+        }
+    }
+}
+
+export function showCategoryIcons(category) {
+    const iconGrid = document.getElementById('icon-grid');
+    iconGrid.innerHTML = '';
 
     const categoryTabs = document.getElementById('icon-categories');
     categoryTabs.querySelectorAll('button').forEach(tab => {
@@ -73,17 +115,29 @@ export function showCategoryIcons(category, icons) {
         }
     });
 
-    icons.forEach(icon => {
-        const iconDiv = document.createElement('div');
-        iconDiv.className = 'flex flex-col items-center p-2 cursor-pointer hover:bg-zinc-700 rounded';
-        iconDiv.innerHTML = `
-            <img class="w-8 h-8" src="static/${icon}" alt="${icon}">
-        `;
-        iconDiv.addEventListener('click', () => handleIconClick("static/" + icon));
-        iconGrid.appendChild(iconDiv);
-    });
-
     currentCategory = category;
+    loadedCount = 0;
+    totalCount = 0;
+    pageRequest = null;
+
+    // The sentinel sits after the last icon; when it scrolls into view the next page is loaded
+    const sentinel = document.createElement('div');
+    sentinel.id = 'icon-grid-sentinel';
+    sentinel.className = 'h-1';
+    sentinel.style.gridColumn = '1 / -1';
+    iconGrid.appendChild(sentinel);
+
+    if (pageObserver) {
+        pageObserver.disconnect();
+    }
+    pageObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, { root: iconGrid, rootMargin: '200px' });
+    pageObserver.observe(sentinel);
+
+    loadNextPage();
 }
 
 // Close modal when clicking outside
@@ -0,0 +1,50 @@
+function formatValue(value, unit) {
+    if (unit === 'tokens/s') {
+        return `${value.toFixed(1)} tok/s`;
+    }
+    if (unit === 'tokens') {
+        return `${Math.round(value)} tok`;
+    }
+    return value >= 1000 ? `${(value / 1000).toFixed(2)} s` : `${value.toFixed(1)} ms`;
+}
+
+export function loadPerformance() {
+    pywebview.api.get_trace_summary().then(summary => {
+        const status = document.getElementById('performance-status');
+        status.textContent = summary.enabled
+            ? `${summary.traces} recent operations recorded`
+            : 'Tracing is disabled (tracing_enabled in settings.json)';
+
+        const table = document.getElementById('performance-table');
+        table.innerHTML = '';
+        summary.stages.forEach(row => {
+            const tr = document.createElement('tr');
+            tr.className = 'border-b border-zinc-700';
+            [row.trace, row.stage, row.count, formatValue(row.p50, row.unit), formatValue(row.p95, row.unit)]
+                .forEach((value, index) => {
+                    const td = document.createElement('td');
+                    td.className = 'py-2';
+                    if (index >= 2) {
+                        td.style.textAlign = 'right';
+                    }
+                    td.textContent = value;
+                    tr.appendChild(td);
+                });
+            table.appendChild(tr);
+        });
+    }).catch(error => {
+        console.error('Error loading performance summary:', error);
+    });
+}
+
+export function clearTraces() {
+    pywebview.api.clear_traces().then(() => loadPerformance());
+}
+
+export function exportTraces(format) {
+    pywebview.api.export_traces(format).then(result => {
+        document.getElementById('performance-result').textContent = result.message;
+    }).catch(error => {
+        document.getElementById('performance-result').textContent = `Export failed: ${error}`;
+    });
+}
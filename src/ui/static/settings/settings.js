@@ -1,13 +1,15 @@
 import * as IconSelector from './iconSelector.js';
 import * as GeneralSettings from './generalSettingsManager.js';
 import * as ToneFormatManager from './toneFormatManager.js';
+import * as PerformanceManager from './performanceManager.js';
 
 // Expose functions to the global namespace
 const exportedFunctions = {
   openIconSelector: IconSelector.openIconSelector,
   closeIconSelector: IconSelector.closeIconSelector,
   ...GeneralSettings,
-  ...ToneFormatManager
+  ...ToneFormatManager,
+  ...PerformanceManager
 };
 
 for (const [name, func] of Object.entries(exportedFunctions)) {
@@ -1,10 +1,12 @@
+import { iconMarkup, setIcon } from '../icons.js';
+
 export function createItemElement(name, data, type) {
     const itemDiv = document.createElement('div');
     itemDiv.classList.add('bg-zinc-900', 'p-4', type);
     itemDiv.dataset.name = name;
     itemDiv.innerHTML = `
         <div class="flex items-center mb-3">
-            <img class="w-6 h-6 mr-3 ${type}-icon" src="${data.icon}" alt="${name}">
+            ${iconMarkup(data.icon, `w-6 h-6 mr-3 ${type}-icon`, name)}
             <span class="font-semibold text-lg ${type}-name">${name}</span>
         </div>
         <div class="text-sm text-zinc-300 mb-4 ${type}-prompt line-clamp-3">${data.prompt}</div>
@@ -50,10 +52,10 @@ export function addNewTone() {
 export function editTone(toneElement) {
     originalToneElement = toneElement.cloneNode(true);
     const name = toneElement.dataset.name;
-    const icon = toneElement.querySelector('.tone-icon').src;
+    const icon = toneElement.querySelector('.tone-icon').dataset.src;
     const prompt = toneElement.querySelector('.tone-prompt').textContent;
     document.getElementById('new-tone-name').value = name;
-    document.getElementById('new-tone-icon-preview').src = icon;
+    setIcon(document.getElementById('new-tone-icon-preview'), icon);
     document.getElementById('new-tone-icon-preview').style.display = 'block';
     document.getElementById('new-tone-prompt').value = prompt;
     showNewToneForm();
@@ -90,7 +92,7 @@ function hideNewItemForm(type) {
     const form = document.getElementById(`new-${type}-form`);
     form.classList.add('hidden');
     document.getElementById(`new-${type}-name`).value = "";
-    document.getElementById(`new-${type}-icon-preview`).src = "";
+    delete document.getElementById(`new-${type}-icon-preview`).dataset.src;
     document.getElementById(`new-${type}-icon-preview`).style.display = 'none';
     document.getElementById(`new-${type}-prompt`).value = "";
     if (window[`original${type.charAt(0).toUpperCase() + type.slice(1)}Element`]) {
@@ -106,7 +108,7 @@ export function hideNewFormatForm() {
 
 function addNewItem(type) {
     const name = document.getElementById(`new-${type}-name`).value;
-    const icon = document.getElementById(`new-${type}-icon-preview`).src;
+    const icon = document.getElementById(`new-${type}-icon-preview`).dataset.src;
     const prompt = document.getElementById(`new-${type}-prompt`).value;
 
     if (name && icon && prompt) {
@@ -128,10 +130,10 @@ export function addNewFormat() {
 export function editFormat(formatElement) {
     originalFormatElement = formatElement.cloneNode(true);
     const name = formatElement.dataset.name;
-    const icon = formatElement.querySelector('.format-icon').src;
+    const icon = formatElement.querySelector('.format-icon').dataset.src;
     const prompt = formatElement.querySelector('.format-prompt').textContent;
     document.getElementById('new-format-name').value = name;
-    document.getElementById('new-format-icon-preview').src = icon;
+    setIcon(document.getElementById('new-format-icon-preview'), icon);
     document.getElementById('new-format-icon-preview').style.display = 'block';
     document.getElementById('new-format-prompt').value = prompt;
     showNewFormatForm();
@@ -1,93 +1,202 @@
 import sys
 import os
 import time
+import hashlib
+import argparse
 import shutil
 import subprocess
 import logging
 
-# Basic logging for the updater script itself
-log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "updater.log")
+# Basic logging for the updater itself; a frozen updater's __file__ is in a folder deleted at exit
+log_dir = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else os.path.abspath(__file__))
+log_file = os.path.join(log_dir, "updater.log")
 logging.basicConfig(filename=log_file, level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 def log(message):
     logging.info(message)
 
-def main(current_exe_path, downloaded_exe_path):
-    log("Updater script started.")
-    log(f"Current executable: {current_exe_path}")
-    log(f"Downloaded update: {downloaded_exe_path}")
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    # 1. Wait for the main application to exit completely
-    log("Waiting for main application to close...")
-    time.sleep(3) # Adjust sleep time if needed
+def wait_for_exit(pid, timeout):
+    """Block until process ``pid`` has exited; returns False on timeout"""
+    if sys.platform == 'win32':
+        import ctypes
+        SYNCHRONIZE = 0x00100000
+        WAIT_OBJECT_0 = 0
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(SYNCHRONIZE, False, pid)
+        if not handle:
+            # The process is already gone
+            return True
+        try:
+            return kernel32.WaitForSingleObject(handle, int(timeout * 1000)) == WAIT_OBJECT_0
+        finally:
+            kernel32.CloseHandle(handle)
 
-    # 2. Rename the current executable
-    backup_exe_path = current_exe_path + ".old"
-    try:
-        if os.path.exists(backup_exe_path):
-            log(f"Removing existing backup file: {backup_exe_path}")
-            os.remove(backup_exe_path)
+    if hasattr(os, 'pidfd_open'):
+        import select
+        try:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pidfd = None
+        if pidfd is not None:
+            try:
+                # The descriptor becomes readable when the process exits
+                return bool(select.select([pidfd], [], [], timeout)[0])
+            finally:
+                os.close(pidfd)
+
+    # No way to wait on an unrelated process here, so poll it
+    deadline = time.monotonic() + timeout
+    interval = 0.01
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        time.sleep(interval)
+        interval = min(interval * 2, 0.2)
+    return False
+
+def retry_while_locked(action, description, deadline):
+    """Run ``action`` until it stops failing with a sharing violation or the deadline passes.
+
+    The executable can stay locked for a moment after the process exited,
+    e.g. while an antivirus scanner still has it open.
+    """
+    interval = 0.02
+    while True:
+        try:
+            return action()
+        except PermissionError as e:
+            if time.monotonic() + interval > deadline:
+                raise
+            log(f"{description} is locked ({e}), retrying in {interval:.2f}s")
+            time.sleep(interval)
+            interval = min(interval * 2, 0.5)
+
+def stage_update(current_exe_path, downloaded_exe_path, expected_sha256):
+    """Copy the update next to the executable and verify it, while the app is still exiting.
+
+    A rename within one directory is atomic, a move from the temp folder may not be.
+    """
+    staged_path = current_exe_path + ".new"
+    with open(downloaded_exe_path, 'rb') as source, open(staged_path, 'wb') as target:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            target.write(chunk)
+        target.flush()
+        os.fsync(target.fileno())
+    if os.path.exists(current_exe_path):
+        shutil.copymode(current_exe_path, staged_path)
+
+    # Whether downloaded whole or patched from a delta, only install the published build
+    if expected_sha256:
+        actual_sha256 = sha256_file(staged_path)
+        if actual_sha256.lower() != expected_sha256.lower():
+            os.remove(staged_path)
+            raise ValueError(f"checksum {actual_sha256} does not match {expected_sha256}")
+        log("Checksum verified.")
+    return staged_path
+
+def swap(current_exe_path, staged_path, backup_exe_path, deadline):
+    """Put the staged executable in place, keeping the old one as the backup"""
+    if os.path.exists(backup_exe_path):
+        log(f"Removing existing backup file: {backup_exe_path}")
+        retry_while_locked(lambda: os.remove(backup_exe_path), backup_exe_path, deadline)
+    if os.path.exists(current_exe_path):
         log(f"Renaming {current_exe_path} to {backup_exe_path}")
-        os.rename(current_exe_path, backup_exe_path)
-        log("Rename successful.")
-    except OSError as e:
-        log(f"Error renaming current executable: {e}")
-        log("Update failed: Could not rename the running application.")
-        # Attempt to restore if rename failed partially? Maybe too complex.
-        sys.exit(1) # Exit updater with error
+        retry_while_locked(lambda: os.replace(current_exe_path, backup_exe_path), current_exe_path, deadline)
+    try:
+        log(f"Renaming {staged_path} to {current_exe_path}")
+        retry_while_locked(lambda: os.replace(staged_path, current_exe_path), staged_path, deadline)
+    except OSError:
+        rollback(current_exe_path, backup_exe_path)
+        raise
 
-    # 3. Move the downloaded executable to the original path
+def rollback(current_exe_path, backup_exe_path):
+    log(f"Rolling back: renaming {backup_exe_path} to {current_exe_path}")
     try:
-        log(f"Moving {downloaded_exe_path} to {current_exe_path}")
-        shutil.move(downloaded_exe_path, current_exe_path)
-        log("Move successful.")
+        os.replace(backup_exe_path, current_exe_path)
     except OSError as e:
-        log(f"Error moving downloaded executable: {e}")
-        log("Update failed: Could not move the new version into place.")
-        # Attempt to restore the backup
-        try:
-            log(f"Attempting to restore backup: Renaming {backup_exe_path} back to {current_exe_path}")
-            os.rename(backup_exe_path, current_exe_path)
-        except OSError as restore_e:
-            log(f"CRITICAL ERROR: Could not restore backup: {restore_e}")
-        sys.exit(1) # Exit updater with error
+        log(f"CRITICAL ERROR: Could not restore backup: {e}")
+
+def main(current_exe_path, downloaded_exe_path, expected_sha256=None, pid=None, timeout=30.0):
+    started = time.monotonic()
+    deadline = started + timeout
+    log("Updater script started.")
+    log(f"Current executable: {current_exe_path}")
+    log(f"Downloaded update: {downloaded_exe_path}")
 
-    # 4. Clean up the backup file (optional, keep for rollback?)
+    # 1. Stage and verify the update while the main application shuts down
     try:
-        if os.path.exists(backup_exe_path):
-            log(f"Removing backup file: {backup_exe_path}")
-            os.remove(backup_exe_path)
+        staged_path = stage_update(current_exe_path, downloaded_exe_path, expected_sha256)
+    except (OSError, ValueError) as e:
+        log(f"Update failed: could not stage the update: {e}")
+        sys.exit(1)
+
+    # 2. Wait for the main application to exit
+    if pid is not None:
+        log(f"Waiting for process {pid} to exit...")
+        if not wait_for_exit(pid, max(0.0, deadline - time.monotonic())):
+            log(f"Update failed: process {pid} did not exit within {timeout}s")
+            os.remove(staged_path)
+            sys.exit(1)
+        log(f"Process {pid} exited after {time.monotonic() - started:.2f}s")
+
+    # 3. Swap in the new executable, rolling back on failure
+    backup_exe_path = current_exe_path + ".old"
+    try:
+        swap(current_exe_path, staged_path, backup_exe_path, deadline)
     except OSError as e:
-        log(f"Warning: Could not remove backup file {backup_exe_path}: {e}")
+        log(f"Update failed: could not replace the application: {e}")
+        sys.exit(1)
+    log(f"Swap finished {time.monotonic() - started:.2f}s after the updater started")
 
-    # 5. Restart the application
+    # 4. Restart the application, going back to the old version if it cannot start
     log(f"Restarting application: {current_exe_path}")
     try:
         subprocess.Popen([current_exe_path])
         log("Application restart command issued.")
     except OSError as e:
         log(f"Error restarting application: {e}")
-        log("Update completed, but failed to restart the application automatically.")
-        sys.exit(1) # Exit with error, but update is technically done
+        rollback(current_exe_path, backup_exe_path)
+        try:
+            subprocess.Popen([current_exe_path])
+        except OSError as restart_e:
+            log(f"Could not restart the previous version either: {restart_e}")
+        sys.exit(1)
+
+    # 5. Clean up the backup and the download
+    for path in (backup_exe_path, downloaded_exe_path):
+        try:
+            retry_while_locked(lambda: os.remove(path), path, time.monotonic() + 5)
+        except OSError as e:
+            log(f"Warning: Could not remove {path}: {e}")
 
     log("Updater script finished successfully.")
     sys.exit(0) # Exit updater successfully
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        log("Usage: updater.py <current_exe_path> <downloaded_exe_path>")
-        sys.exit(1)
-
-    current_exe = sys.argv[1]
-    downloaded_exe = sys.argv[2]
+    parser = argparse.ArgumentParser(description="Replace the Open Rewrite executable with a downloaded update")
+    parser.add_argument("current_exe", help="path of the installed executable")
+    parser.add_argument("downloaded_exe", help="path of the downloaded update")
+    parser.add_argument("--sha256", help="published SHA-256 the update must match")
+    parser.add_argument("--pid", type=int, help="process to wait for before replacing the executable")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the exit and file locks")
+    args = parser.parse_args()
 
-    # Basic check if paths exist
-    if not os.path.exists(current_exe):
-        log(f"Error: Current executable path does not exist: {current_exe}")
-        # sys.exit(1) # Allow proceeding, maybe it just closed
-    if not os.path.exists(downloaded_exe):
-        log(f"Error: Downloaded executable path does not exist: {downloaded_exe}")
+    if not os.path.exists(args.downloaded_exe):
+        log(f"Error: Downloaded executable path does not exist: {args.downloaded_exe}")
         sys.exit(1)
 
-    main(current_exe, downloaded_exe)
\ No newline at end of file
+    main(args.current_exe, args.downloaded_exe, args.sha256, args.pid, args.timeout)
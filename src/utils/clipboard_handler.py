@@ -1,13 +1,23 @@
 from pynput import keyboard
 import pyperclip
+import sys
 import time
 import threading
 import logging
+from src.utils.worker_pool import WorkerPool
+from src.utils.logging_setup import Preview
 
 class ClipboardHandler:
-    def __init__(self):
+    def __init__(self, worker_pool=None, capture_timeout=0.5, restore_clipboard=True,
+            restore_delay=0.3):
         logging.debug('ClipboardHandler.__init__ called')
         self.keyboard_controller = keyboard.Controller()
+        # A single worker keeps overlapping hotkey presses from interleaving Ctrl+C
+        self.worker_pool = worker_pool or WorkerPool(max_workers=1, name='clipboard')
+        self.capture_timeout = capture_timeout
+        self.restore_clipboard = restore_clipboard
+        self.restore_delay = restore_delay
+        self.last_capture_latency = None
         self.callbacks = []
         logging.debug('ClipboardHandler.__init__ finished')
         
@@ -18,19 +28,51 @@ class ClipboardHandler:
         logging.debug('ClipboardHandler.register_callback finished')
         
     def text_copied(self, text):
-        logging.debug(f'ClipboardHandler.text_copied called with text: {text}')
+        logging.debug('ClipboardHandler.text_copied called with text: %s', Preview(text))
         """Call all registered callbacks with the copied text"""
         for callback in self.callbacks:
             callback(text)
         logging.debug('ClipboardHandler.text_copied finished')
-        logging.debug(f"Copied text: `{text.strip()[:20]}`...")
+
+    @staticmethod
+    def _sequence_number():
+        """Clipboard sequence number on Windows, None where it is unavailable"""
+        if sys.platform != "win32":
+            return None
+        try:
+            import ctypes
+            return ctypes.windll.user32.GetClipboardSequenceNumber()
+        except Exception:
+            return None
+
+    def _wait_for_change(self, sequence, deadline):
+        """Poll with backoff until the clipboard changed or the deadline passed"""
+        delay = 0.005
+        while True:
+            if sequence is not None:
+                # The sequence bumps when the copy starts; wait until text is there too
+                text = pyperclip.paste() if self._sequence_number() != sequence else ''
+            else:
+                text = pyperclip.paste()
+            if text:
+                return text
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ''
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, 0.05)
             
     def get_highlighted_text(self):
         logging.debug('ClipboardHandler.get_highlighted_text called')
         """Get highlighted text using keyboard shortcuts"""
         def _get_text():
             logging.debug('_get_text called')
+            start = time.monotonic()
             old_clipboard = pyperclip.paste()
+            sequence = self._sequence_number()
+            if sequence is None:
+                # Without a sequence number, clear the clipboard so any copy is a visible change
+                pyperclip.copy('')
             
             # Release alt key if it's pressed
             self.keyboard_controller.release(keyboard.Key.alt)
@@ -42,29 +84,37 @@ class ClipboardHandler:
             self.keyboard_controller.release(keyboard.Key.ctrl)
             
             # Wait for clipboard to update
-            time.sleep(0.1)
-            
-            new_clipboard = pyperclip.paste()
+            new_clipboard = self._wait_for_change(sequence, start + self.capture_timeout)
+            self.last_capture_latency = time.monotonic() - start
+            if new_clipboard:
+                logging.info('Clipboard capture took %.1f ms', self.last_capture_latency * 1000)
+            else:
+                logging.info('Clipboard capture timed out after %.1f ms', self.last_capture_latency * 1000)
+
+            # An empty paste() may hide non-text content, which must not be overwritten
+            if old_clipboard and (self.restore_clipboard or not new_clipboard):
+                pyperclip.copy(old_clipboard)
             
             # Notify about the copied text
             self.text_copied(new_clipboard)
             logging.debug('_get_text finished')
             
-        # Run in a separate thread to not block the UI
-        thread = threading.Thread(target=_get_text)
-        thread.daemon = True
-        thread.start()
+        # Run on the worker pool to not block the UI
+        self.worker_pool.submit(_get_text)
         logging.debug('ClipboardHandler.get_highlighted_text finished')
         
     def copy_text(self, text):
-        logging.debug(f'ClipboardHandler.copy_text called with text: {text}')
+        logging.debug('ClipboardHandler.copy_text called with text: %s', Preview(text))
         """Copy text to clipboard"""
         pyperclip.copy(text)
         logging.debug('ClipboardHandler.copy_text finished')
         
     def replace_text(self, text):
-        logging.debug(f'ClipboardHandler.replace_text called with text: {text}')
+        logging.debug('ClipboardHandler.replace_text called with text: %s', Preview(text))
         """Replace currently selected text with new text"""
+        previous_clipboard = pyperclip.paste() if self.restore_clipboard else None
+        if not previous_clipboard:
+            previous_clipboard = None
         self.copy_text(text)
         
         # Paste the text
@@ -72,4 +122,15 @@ class ClipboardHandler:
         self.keyboard_controller.press('v')
         self.keyboard_controller.release('v')
         self.keyboard_controller.release(keyboard.Key.ctrl)
+
+        if previous_clipboard is not None:
+            def _restore():
+                if pyperclip.paste() == text:
+                    pyperclip.copy(previous_clipboard)
+            # The target app reads the clipboard asynchronously, so give the paste time to land.
+            # Wait on a timer, not the worker, so the next capture isn't queued behind the delay;
+            # the restore itself still runs on the worker, in order with captures.
+            timer = threading.Timer(self.restore_delay, self.worker_pool.submit, args=(_restore,))
+            timer.daemon = True
+            timer.start()
         logging.debug('ClipboardHandler.replace_text finished')
@@ -0,0 +1,204 @@
+"""Binary deltas between two versions of the application executable.
+
+Both files are cut into content-defined chunks (a gear rolling hash picks
+the cut points, so an insertion only changes the chunks around it). Every
+chunk of the new file that also occurs in the old one becomes a copy
+instruction; the rest is stored literally. The instruction stream is LZMA
+compressed. Most of a PyInstaller one-file bundle (the runtime, the icons,
+pywebview) is unchanged between releases, so the delta is a fraction of
+the full executable.
+
+The header records the SHA-256 of both files: ``apply_delta`` refuses a
+source that is not the exact file the delta was made from, and checks the
+result before writing it.
+
+Create a delta (done by the release workflow):
+
+    python -m src.utils.delta create old.exe new.exe update.delta
+"""
+import hashlib
+import json
+import lzma
+import os
+import random
+import struct
+import sys
+import logging
+
+MAGIC = b'ORDELTA1'
+MIN_CHUNK = 2 * 1024
+MAX_CHUNK = 64 * 1024
+# Cut where the top 13 bits of the hash are zero, about every 8 KB
+CUT_MASK = ((1 << 13) - 1) << (64 - 13)
+HASH_MASK = (1 << 64) - 1
+_gear_random = random.Random(0x6F72)
+GEAR = [_gear_random.getrandbits(64) for _ in range(256)]
+
+COPY = b'C'
+DATA = b'D'
+COPY_STRUCT = struct.Struct('<QI')
+DATA_STRUCT = struct.Struct('<I')
+
+
+class DeltaError(Exception):
+    """The delta is malformed or does not fit the source file"""
+
+
+def chunk_boundaries(data):
+    """End offsets of the content-defined chunks of ``data``"""
+    gear = GEAR
+    size = len(data)
+    boundaries = []
+    start = 0
+    while start < size:
+        end = min(start + MAX_CHUNK, size)
+        h = 0
+        for index in range(min(start + MIN_CHUNK, end), end):
+            h = ((h << 1) + gear[data[index]]) & HASH_MASK
+            if not h & CUT_MASK:
+                end = index + 1
+                break
+        boundaries.append(end)
+        start = end
+    return boundaries
+
+
+def _chunks(data):
+    start = 0
+    for end in chunk_boundaries(data):
+        yield start, end
+        start = end
+
+
+def _digest(chunk):
+    return hashlib.blake2b(chunk, digest_size=16).digest()
+
+
+def encode_delta(source, target):
+    """Return the delta that turns the bytes ``source`` into ``target``"""
+    index = {}
+    for start, end in _chunks(source):
+        index.setdefault(_digest(source[start:end]), start)
+
+    ops = []
+    copy_offset = copy_length = 0
+    literal = bytearray()
+
+    def flush_copy():
+        if copy_length:
+            ops.append(COPY + COPY_STRUCT.pack(copy_offset, copy_length))
+
+    def flush_literal():
+        if literal:
+            ops.append(DATA + DATA_STRUCT.pack(len(literal)) + bytes(literal))
+            literal.clear()
+
+    for start, end in _chunks(target):
+        chunk = target[start:end]
+        offset = index.get(_digest(chunk))
+        if offset is not None and source[offset:offset + len(chunk)] == chunk:
+            flush_literal()
+            if copy_length and copy_offset + copy_length == offset:
+                copy_length += len(chunk)
+            else:
+                flush_copy()
+                copy_offset, copy_length = offset, len(chunk)
+        else:
+            flush_copy()
+            copy_length = 0
+            literal += chunk
+    flush_copy()
+    flush_literal()
+
+    header = json.dumps({
+        'source_sha256': hashlib.sha256(source).hexdigest(),
+        'source_size': len(source),
+        'target_sha256': hashlib.sha256(target).hexdigest(),
+        'target_size': len(target),
+    }).encode()
+    return MAGIC + DATA_STRUCT.pack(len(header)) + header + lzma.compress(b''.join(ops))
+
+
+def read_header(delta):
+    if delta[:len(MAGIC)] != MAGIC:
+        raise DeltaError('Not a delta file')
+    offset = len(MAGIC)
+    (header_size,) = DATA_STRUCT.unpack_from(delta, offset)
+    offset += DATA_STRUCT.size
+    try:
+        header = json.loads(delta[offset:offset + header_size])
+    except ValueError as e:
+        raise DeltaError(f'Malformed delta header: {e}') from e
+    return header, offset + header_size
+
+
+def decode_delta(source, delta):
+    """Apply the bytes ``delta`` to ``source`` and return the verified target"""
+    header, offset = read_header(delta)
+    if hashlib.sha256(source).hexdigest() != header['source_sha256']:
+        raise DeltaError('The installed version is not the one this delta was made for')
+    try:
+        ops = lzma.decompress(delta[offset:])
+    except lzma.LZMAError as e:
+        raise DeltaError(f'Corrupt delta: {e}') from e
+
+    target = bytearray()
+    position = 0
+    while position < len(ops):
+        kind = ops[position:position + 1]
+        position += 1
+        if kind == COPY:
+            start, length = COPY_STRUCT.unpack_from(ops, position)
+            position += COPY_STRUCT.size
+            if start + length > len(source):
+                raise DeltaError('Copy outside of the source file')
+            target += source[start:start + length]
+        elif kind == DATA:
+            (length,) = DATA_STRUCT.unpack_from(ops, position)
+            position += DATA_STRUCT.size
+            target += ops[position:position + length]
+            position += length
+        else:
+            raise DeltaError(f'Unknown delta instruction {kind!r}')
+
+    if len(target) != header['target_size'] or hashlib.sha256(target).hexdigest() != header['target_sha256']:
+        raise DeltaError('The patched file does not match the expected checksum')
+    return bytes(target)
+
+
+def create_delta(source_path, target_path, delta_path):
+    """Write the delta from ``source_path`` to ``target_path``; returns its size"""
+    with open(source_path, 'rb') as f:
+        source = f.read()
+    with open(target_path, 'rb') as f:
+        target = f.read()
+    delta = encode_delta(source, target)
+    with open(delta_path, 'wb') as f:
+        f.write(delta)
+    logging.info("Delta %s: %s bytes for a %s byte target", delta_path, len(delta), len(target))
+    return len(delta)
+
+
+def apply_delta(source_path, delta_path, output_path):
+    """Patch ``source_path`` with ``delta_path`` into ``output_path``; returns its SHA-256"""
+    with open(source_path, 'rb') as f:
+        source = f.read()
+    with open(delta_path, 'rb') as f:
+        delta = f.read()
+    target = decode_delta(source, delta)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(target)
+    os.replace(tmp_path, output_path)
+    return hashlib.sha256(target).hexdigest()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) == 5 and sys.argv[1] == 'create':
+        create_delta(*sys.argv[2:])
+    elif len(sys.argv) == 5 and sys.argv[1] == 'apply':
+        print(apply_delta(*sys.argv[2:]))
+    else:
+        print('Usage: python -m src.utils.delta create|apply <source> <target|delta> <delta|output>')
+        sys.exit(1)
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Persist segment offsets after this many new bytes, so a crash loses little
+STATE_SAVE_BYTES = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class DownloadError(Exception):
+    """The download failed or its checksum did not match"""
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SegmentedDownloader:
+    """Downloads a file in parallel HTTP Range segments and can resume.
+
+    Data goes to ``<dest>.part`` and the offsets reached by every segment to
+    ``<dest>.part.json``. Started again for the same URL, the download picks
+    up where each segment stopped, as long as the server still reports the
+    same size and validator (ETag or Last-Modified). Servers without Range
+    support get one plain request and no resume.
+
+    The finished file is checked against ``expected_sha256`` before it is
+    moved to ``dest``; a mismatch deletes it and raises ``DownloadError``.
+    ``on_progress(downloaded, total)`` is called from the download threads,
+    at most every ``progress_interval`` seconds and once at the end.
+    """
+
+    def __init__(self, segments=4, timeout=(10, 30), retries=3, progress_interval=0.2, session=None):
+        logging.debug('SegmentedDownloader.__init__ called with segments=%s', segments)
+        self.segments = max(1, segments)
+        self.timeout = timeout
+        self.retries = retries
+        self.progress_interval = progress_interval
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is None:
+            # Imported on first use to keep it off the startup path
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def download(self, url, dest, expected_sha256=None, on_progress=None):
+        """Download ``url`` to ``dest`` and return ``dest``"""
+        logging.info("Downloading %s to %s", url, dest)
+        part_path = dest + '.part'
+        state_path = part_path + '.json'
+
+        total, validator, ranges = self._probe(url)
+        if not ranges or not total:
+            logging.info("Server does not support ranges, downloading in one request")
+            self._download_whole(url, part_path, total, on_progress)
+        else:
+            state = self._load_state(state_path, url, total, validator)
+            if state is None or not os.path.exists(part_path):
+                state = {'url': url, 'size': total, 'validator': validator,
+                         'segments': self._plan(total)}
+                with open(part_path, 'wb') as f:
+                    f.truncate(total)
+            else:
+                logging.info("Resuming download at %s of %s bytes", self._done(state), total)
+            self._download_segments(url, part_path, state_path, state, on_progress)
+
+        if expected_sha256:
+            actual = sha256_file(part_path)
+            if actual.lower() != expected_sha256.lower():
+                self._discard(part_path, state_path)
+                raise DownloadError(f"Checksum mismatch: expected {expected_sha256}, got {actual}")
+            logging.info("Checksum verified: %s", actual)
+        os.replace(part_path, dest)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return dest
+
+    def _probe(self, url):
+        """Return (size, validator, supports ranges) from a one-byte range request"""
+        response = self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True,
+            timeout=self.timeout, allow_redirects=True)
+        try:
+            response.raise_for_status()
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            if response.status_code == 206:
+                # Content-Range: bytes 0-0/<size>
+                size = response.headers.get('Content-Range', '').rpartition('/')[2]
+                return (int(size) if size.isdigit() else None), validator, True
+            return int(response.headers.get('Content-Length') or 0) or None, validator, False
+        finally:
+            response.close()
+
+    def _plan(self, total):
+        size = -(-total // self.segments)
+        return [{'start': start, 'end': min(start + size, total) - 1, 'done': 0}
+                for start in range(0, total, size)]
+
+    @staticmethod
+    def _done(state):
+        return sum(segment['done'] for segment in state['segments'])
+
+    @staticmethod
+    def _load_state(state_path, url, total, validator):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('url') != url or state.get('size') != total or state.get('validator') != validator:
+            logging.info("Partial download is for a different file, starting over")
+            return None
+        return state
+
+    @staticmethod
+    def _discard(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _download_segments(self, url, part_path, state_path, state, on_progress):
+        lock = threading.Lock()
+        progress = _Progress(state['size'], self._done(state), self.progress_interval, on_progress)
+
+        def save_state():
+            with lock:
+                tmp_path = state_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, state_path)
+
+        def fetch(segment):
+            attempt = 0
+            while segment['start'] + segment['done'] <= segment['end']:
+                done_before = segment['done']
+                try:
+                    self._fetch_segment(url, part_path, segment, progress, save_state)
+                    if segment['done'] == done_before:
+                        # A response that ends cleanly without data would otherwise be retried forever
+                        raise DownloadError(f"No data received for the segment at {segment['start']}")
+                except Exception as e:
+                    # Only failures in a row count; a dropped connection that made progress resets them
+                    attempt = 1 if segment['done'] > done_before else attempt + 1
+                    if attempt > self.retries:
+                        raise
+                    logging.warning("Segment at %s failed (%s), retrying", segment['start'], e)
+                    time.sleep(min(2 ** (attempt - 1), 10))
+
+        pending = [segment for segment in state['segments']
+                   if segment['start'] + segment['done'] <= segment['end']]
+        try:
+            with ThreadPoolExecutor(max_workers=len(pending) or 1, thread_name_prefix='download') as pool:
+                for future in [pool.submit(fetch, segment) for segment in pending]:
+                    future.result()
+        except Exception as e:
+            raise DownloadError(f"Download failed: {e}") from e
+        finally:
+            save_state()
+        progress.finish()
+
+    def _fetch_segment(self, url, part_path, segment, progress, save_state):
+        offset = segment['start'] + segment['done']
+        response = self.session.get(url, headers={'Range': f"bytes={offset}-{segment['end']}"},
+            stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise DownloadError(f"Expected a partial response, got {response.status_code}")
+            unsaved = 0
+            with open(part_path, 'r+b') as f:
+                f.seek(offset)
+                for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+                    # Never write past the segment, whatever the server sends
+                    chunk = chunk[:segment['end'] + 1 - (segment['start'] + segment['done'])]
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    segment['done'] += len(chunk)
+                    progress.add(len(chunk))
+                    unsaved += len(chunk)
+                    if unsaved >= STATE_SAVE_BYTES:
+                        f.flush()
+                        save_state()
+                        unsaved = 0
+        finally:
+            response.close()
+
+    def _download_whole(self, url, part_path, total, on_progress):
+        progress = _Progress(total, 0, self.progress_interval, on_progress)
+        try:
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+            try:
+                response.raise_for_status()
+                with open(part_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+                        f.write(chunk)
+                        progress.add(len(chunk))
+            finally:
+                response.close()
+        except Exception as e:
+            raise DownloadError(f"Download failed: {e}") from e
+        progress.finish()
+
+
+class _Progress:
+    """Thread-safe byte counter that reports at most every ``interval`` seconds"""
+
+    def __init__(self, total, downloaded, interval, callback):
+        self.total = total
+        self.downloaded = downloaded
+        self.interval = interval
+        self.callback = callback
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.downloaded += count
+            now = time.monotonic()
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+            downloaded = self.downloaded
+        self._report(downloaded)
+
+    def finish(self):
+        self._report(self.downloaded)
+
+    def _report(self, downloaded):
+        if self.callback is None:
+            return
+        try:
+            self.callback(downloaded, self.total)
+        except Exception as e:
+            logging.warning('Download progress callback failed: %s', e)
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import logging
+
+class BackgroundEventLoop:
+    """An asyncio event loop running on its own daemon thread.
+
+    Coroutines are scheduled from any thread with ``submit``, which returns a
+    ``concurrent.futures.Future``. The thread is started on first use.
+    """
+
+    def __init__(self, name='event-loop'):
+        logging.debug('BackgroundEventLoop.__init__ called with name=%s', name)
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+        logging.debug('BackgroundEventLoop %s stopped', self.name)
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a Future for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Run a plain callback on the loop thread"""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        """Stop the loop; pending coroutines are abandoned"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1)
+            self._loop = None
+            self._thread = None
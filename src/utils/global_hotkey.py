@@ -19,7 +19,7 @@ class GlobalHotKey:
         self.listener.start()
 
     def update_hotkey(self, new_combination):
-        logging.debug(f'Updating hotkey to {new_combination}')
+        logging.debug('Updating hotkey to %s', new_combination)
         self.hotkey_combination = new_combination
         self.start_listener()
         
@@ -0,0 +1,64 @@
+import math
+import os
+from src.utils.icon_manifest import STATIC_DIR, build_manifest
+from src.utils.resource_path import resource_path
+
+ATLAS_IMAGE_NAME = 'icon_atlas.png'
+ATLAS_CSS_NAME = 'icon_atlas.css'
+CELL_SIZE = 48
+
+def _position(index, count):
+    # Percentage offsets stay correct whatever size the element is rendered at
+    if count <= 1:
+        return 0
+    return round(index / (count - 1) * 100, 4)
+
+def build_atlas(static_dir, cell_size=CELL_SIZE):
+    """Pack every white icon into one sprite sheet and write its CSS map.
+
+    Each icon gets a ``.icon-sprite[data-icon="<path>"]`` rule, where the path
+    is the one listed in the icon manifest. Needs Pillow, which is only
+    required at build time. Returns the number of packed icons.
+    """
+    from PIL import Image
+
+    paths = [path for icons in build_manifest(static_dir)['icons'].values() for path in icons]
+    columns = max(1, math.ceil(math.sqrt(len(paths))))
+    rows = max(1, math.ceil(len(paths) / columns))
+
+    atlas = Image.new('RGBA', (columns * cell_size, rows * cell_size))
+    rules = []
+    for index, path in enumerate(paths):
+        column, row = index % columns, index // columns
+        with Image.open(os.path.join(static_dir, *path.split('/'))) as icon:
+            icon = icon.convert('RGBA')
+            if icon.size != (cell_size, cell_size):
+                icon = icon.resize((cell_size, cell_size), Image.LANCZOS)
+            atlas.paste(icon, (column * cell_size, row * cell_size))
+        rules.append(
+            f'.icon-sprite[data-icon="{path}"]{{background-position:'
+            f'{_position(column, columns)}% {_position(row, rows)}%}}'
+        )
+
+    image_path = os.path.join(static_dir, ATLAS_IMAGE_NAME)
+    atlas.save(f"{image_path}.tmp", format='PNG', optimize=True)
+    os.replace(f"{image_path}.tmp", image_path)
+
+    css = [
+        '.icon-sprite{display:inline-block;flex-shrink:0;'
+        f'background-image:url("{ATLAS_IMAGE_NAME}");background-repeat:no-repeat;'
+        'background-origin:content-box;background-clip:content-box;'
+        f'background-size:{columns * 100}% {rows * 100}%}}',
+        *rules,
+    ]
+    css_path = os.path.join(static_dir, ATLAS_CSS_NAME)
+    with open(f"{css_path}.tmp", 'w') as f:
+        f.write('\n'.join(css) + '\n')
+    os.replace(f"{css_path}.tmp", css_path)
+    return len(paths)
+
+
+if __name__ == '__main__':
+    # Build step: python -m src.utils.icon_atlas
+    count = build_atlas(resource_path(STATIC_DIR))
+    print(f"Wrote {ATLAS_IMAGE_NAME} and {ATLAS_CSS_NAME} with {count} icons")
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import threading
+import logging
+from src.utils.resource_path import resource_path
+
+STATIC_DIR = os.path.join('src', 'ui', 'static')
+ICON_DIR_NAME = 'material_icons_round'
+MANIFEST_NAME = 'icon_manifest.json'
+
+def _icon_dir_mtime(icon_dir):
+    """Newest mtime of the icon root and its category folders.
+
+    Adding or removing an icon touches its category folder, so this catches
+    changes with one stat per category instead of one per file.
+    """
+    mtimes = [os.path.getmtime(icon_dir)]
+    for entry in os.scandir(icon_dir):
+        if entry.is_dir():
+            mtimes.append(entry.stat().st_mtime)
+    return max(mtimes)
+
+def build_manifest(static_dir):
+    """Walk the icon folders and list the white icons by category"""
+    icon_dir = os.path.join(static_dir, ICON_DIR_NAME)
+    icons = {}
+    for entry in sorted(os.scandir(icon_dir), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        icons[entry.name] = sorted(
+            f"{ICON_DIR_NAME}/{entry.name}/{name}"
+            for name in os.listdir(entry.path)
+            if name.endswith('white.png')
+        )
+    return {'mtime': _icon_dir_mtime(icon_dir), 'icons': icons}
+
+def write_manifest(static_dir, manifest):
+    path = os.path.join(static_dir, MANIFEST_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
+
+
+class IconManifest:
+    """Icon listing loaded once from a prebuilt manifest and served from memory.
+
+    The manifest is generated at build time (``python -m src.utils.icon_manifest``)
+    or on first use, and rebuilt when the icon folders' mtime no longer matches.
+    Frozen builds trust the bundled manifest since extraction resets mtimes.
+    """
+
+    def __init__(self, static_dir=None):
+        self.static_dir = static_dir or resource_path(STATIC_DIR)
+        self._icons = None
+        self._lock = threading.Lock()
+
+    @property
+    def icons(self):
+        with self._lock:
+            if self._icons is None:
+                self._icons = self._load()
+            return self._icons
+
+    def _load(self):
+        path = os.path.join(self.static_dir, MANIFEST_NAME)
+        try:
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            if getattr(sys, 'frozen', False):
+                return manifest['icons']
+            if manifest.get('mtime') == _icon_dir_mtime(os.path.join(self.static_dir, ICON_DIR_NAME)):
+                return manifest['icons']
+            logging.info("Icon manifest is stale, rebuilding")
+        except FileNotFoundError:
+            logging.info("Icon manifest not found, building it")
+        except (json.JSONDecodeError, KeyError, OSError) as e:
+            logging.warning("Could not read icon manifest, rebuilding: %s", e)
+
+        manifest = build_manifest(self.static_dir)
+        try:
+            write_manifest(self.static_dir, manifest)
+        except OSError as e:
+            logging.warning("Could not write icon manifest: %s", e)
+        return manifest['icons']
+
+    def categories(self):
+        """Category names with their icon counts"""
+        return {category: len(icons) for category, icons in self.icons.items()}
+
+    def page(self, category, offset=0, limit=60):
+        """One page of icon paths for a category"""
+        icons = self.icons.get(category, [])
+        return {
+            'icons': icons[offset:offset + limit],
+            'total': len(icons),
+        }
+
+
+if __name__ == '__main__':
+    # Build step: python -m src.utils.icon_manifest
+    static_dir = resource_path(STATIC_DIR)
+    manifest = build_manifest(static_dir)
+    write_manifest(static_dir, manifest)
+    print(f"Wrote {MANIFEST_NAME} with {sum(len(v) for v in manifest['icons'].values())} icons")
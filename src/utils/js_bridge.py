@@ -0,0 +1,48 @@
+import itertools
+import json
+import logging
+
+CHUNK_SIZE = 64 * 1024
+
+def to_js(value):
+    """Encode a value as a JS literal.
+
+    JSON is valid JS for every input, unlike a Python repr. U+2028 and U+2029
+    are escaped since older engines reject them inside string literals.
+    """
+    return json.dumps(value, ensure_ascii=False).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+
+
+class JSBridge:
+    """Calls page functions with JSON-encoded arguments.
+
+    Calls go through the page's ``bridgeCall``. Strings longer than
+    ``chunk_size`` are first sent in pieces with ``bridgeChunk`` and then
+    passed as a ``{"$payload": id}`` placeholder, which the page swaps for
+    the joined pieces. evaluate_js evaluates each script in one go on the UI
+    thread, so this keeps every single evaluation short.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._ids = itertools.count(1)
+
+    def encode_call(self, function, *args):
+        """Build the scripts for one bridged call, in the order they must run"""
+        scripts = []
+        encoded_args = []
+        for arg in args:
+            if isinstance(arg, str) and len(arg) > self.chunk_size:
+                payload_id = next(self._ids)
+                for start in range(0, len(arg), self.chunk_size):
+                    scripts.append(f"bridgeChunk({payload_id}, {to_js(arg[start:start + self.chunk_size])})")
+                logging.debug('JSBridge: sending %s chars to %s in %s chunks', len(arg), function, len(scripts))
+                arg = {'$payload': payload_id}
+            encoded_args.append(arg)
+        scripts.append(f"bridgeCall({to_js(function)}, {to_js(encoded_args)})")
+        return scripts
+
+    def call(self, window, function, *args):
+        """Call ``function`` in the window's page with ``args``"""
+        for script in self.encode_call(function, *args):
+            window.evaluate_js(script)
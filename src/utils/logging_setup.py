@@ -0,0 +1,89 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(threadName)s - %(message)s'
+
+def configure_logging(level=None, log_file="open_rewrite.log", max_bytes=1_000_000, backup_count=3):
+    """Route all logging through a queue to a rotating file and the console.
+
+    Callers only format the message and put the record on a queue; console
+    and disk writes happen on the listener thread. The level defaults to INFO, DEBUG when
+    WEBVIEW_DEBUG is set, and can be overridden with OPEN_REWRITE_LOG_LEVEL.
+    """
+    if level is None:
+        debug = os.environ.get('WEBVIEW_DEBUG', 'False').lower() == 'true'
+        level = os.environ.get('OPEN_REWRITE_LOG_LEVEL', 'DEBUG' if debug else 'INFO').upper()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    try:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'))
+    except OSError as e:
+        logging.getLogger(__name__).warning('Could not open log file %s: %s', log_file, e)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class Preview:
+    """Lazily formatted, truncated view of a payload for log messages.
+
+    Use as a %-style argument so nothing is copied unless the record is emitted:
+    ``logging.debug('text: %s', Preview(text))``.
+    """
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit=40):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        if self.value is None:
+            return 'None'
+        text = str(self.value)
+        if len(text) <= self.limit:
+            return repr(text)
+        return f'{text[:self.limit]!r}... ({len(text)} chars)'
+
+
+class Redacted:
+    """Lazily formatted settings summary with secrets masked and prompts elided"""
+
+    __slots__ = ('settings',)
+
+    SECRET_KEYS = ('api_key',)
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def __str__(self):
+        if not isinstance(self.settings, dict):
+            return str(self.settings)
+        summary = {}
+        for key, value in self.settings.items():
+            if key in self.SECRET_KEYS:
+                summary[key] = '***' if value else ''
+            elif isinstance(value, dict):
+                summary[key] = f'<{len(value)} entries>'
+            elif isinstance(value, str):
+                summary[key] = str(Preview(value))
+            else:
+                summary[key] = value
+        return str(summary)
@@ -3,7 +3,7 @@ import sys
 import logging
 
 def resource_path(relative_path):
-    logging.debug(f'resource_path called with relative_path: {relative_path}')
+    logging.debug('resource_path called with relative_path: %s', relative_path)
     """ Get absolute path to resource, works for dev and for PyInstaller """
     try:
         # PyInstaller creates a temp folder and stores path in _MEIPASS
@@ -12,5 +12,5 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
 
     result = os.path.join(base_path, relative_path)
-    logging.debug(f'resource_path returning: {result}')
+    logging.debug('resource_path returning: %s', result)
     return result
@@ -0,0 +1,43 @@
+import time
+import logging
+from contextlib import contextmanager
+
+class StartupProfiler:
+    """Records how long each startup phase takes.
+
+    Phases are timed with ``perf_counter`` relative to process start; when
+    enabled (``--profile-startup``) the breakdown is printed by ``report``.
+    """
+
+    def __init__(self, enabled=False, start=None):
+        self.enabled = enabled
+        self.start = start if start is not None else time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one named phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        """Record a phase that was timed elsewhere"""
+        self.phases.append((name, seconds))
+
+    def mark(self, name):
+        """Record a milestone as time elapsed since process start"""
+        self.record(name, time.perf_counter() - self.start)
+
+    def report(self):
+        """Print the recorded phases if profiling is enabled"""
+        if not self.enabled:
+            return
+        lines = ['Startup profile:']
+        for name, seconds in self.phases:
+            lines.append(f'  {name:<40} {seconds * 1000:9.1f} ms')
+        report = '\n'.join(lines)
+        print(report, flush=True)
+        logging.info(report)
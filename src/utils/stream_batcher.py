@@ -0,0 +1,66 @@
+import threading
+import time
+import logging
+
+class StreamBatcher:
+    """Coalesces streamed text deltas into periodic flushes.
+
+    The first delta is flushed immediately so the first token shows up as soon
+    as it arrives; after that deltas are buffered and flushed at most once per
+    ``interval`` seconds, or earlier once ``max_chunks`` deltas are pending.
+    """
+
+    def __init__(self, flush, interval=0.05, max_chunks=32):
+        logging.debug('StreamBatcher.__init__ called')
+        self.flush = flush
+        self.interval = interval
+        self.max_chunks = max_chunks
+        self._pending = []
+        self._last_flush = 0.0
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def add(self, delta):
+        """Buffer a delta and flush if the interval or chunk budget is reached"""
+        if not delta:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._pending.append(delta)
+            elapsed = time.monotonic() - self._last_flush
+            if elapsed >= self.interval or len(self._pending) >= self.max_chunks:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval - elapsed, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def close(self):
+        """Flush whatever is still pending and stop accepting deltas"""
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            if not self._closed:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        text = ''.join(self._pending)
+        self._pending = []
+        try:
+            self.flush(text)
+        except Exception as e:
+            logging.error('StreamBatcher flush failed: %s', e)
@@ -0,0 +1,81 @@
+import math
+import re
+
+# Rough average for English text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+def estimate_tokens(text):
+    """Cheap token estimate used to decide whether a selection needs chunking.
+
+    Only ASCII text packs about four characters into a token; CJK and most
+    other scripts take a token or more per character, so every non-ASCII
+    character is counted as a whole token to keep the estimate on the safe side.
+    """
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return math.ceil(ascii_chars / CHARS_PER_TOKEN) + len(text) - ascii_chars
+
+def _split_sentences(paragraph):
+    return [s for s in re.split(r'(?<=[.!?])\s+', paragraph) if s]
+
+def _hard_split(text, max_tokens):
+    """Cut text into the longest pieces that stay within max_tokens"""
+    pieces = []
+    start = 0
+    while start < len(text):
+        # A piece has at least max_tokens characters (all non-ASCII) and at most
+        # max_tokens * CHARS_PER_TOKEN (all ASCII); search for the longest fit
+        low = min(len(text), start + max(max_tokens, 1))
+        high = min(len(text), start + max_tokens * CHARS_PER_TOKEN)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(text[start:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        pieces.append(text[start:low])
+        start = low
+    return pieces
+
+def _pack(pieces, max_tokens, separator):
+    """Greedily pack pieces into chunks that stay within max_tokens"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        piece_tokens = estimate_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def split_text(text, max_tokens):
+    """Split text into chunks of at most max_tokens (estimated).
+
+    Paragraph boundaries are preferred, then sentence boundaries; only a single
+    sentence longer than the budget is cut mid-text.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text.strip()):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        sentences = []
+        for sentence in _split_sentences(paragraph):
+            if estimate_tokens(sentence) > max_tokens:
+                sentences.extend(_hard_split(sentence, max_tokens))
+            else:
+                sentences.append(sentence)
+        # Sentences of one paragraph are packed separately so chunks keep paragraph breaks
+        pieces.extend(_pack(sentences, max_tokens, ' '))
+
+    return _pack(pieces, max_tokens, PARAGRAPH_SEPARATOR)
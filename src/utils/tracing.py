@@ -0,0 +1,246 @@
+import itertools
+import json
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Trace:
+    """Spans of one user-visible operation, e.g. a selection or a rewrite.
+
+    Timestamps come from ``time.perf_counter`` and are kept relative to the
+    trace start. Stages are recorded either as spans (``span`` or
+    ``begin``/``end``) or as instant marks. A trace can still receive marks
+    after it finished, for stages reported late such as the first paint.
+    """
+
+    def __init__(self, tracer, trace_id, name, attrs):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.perf_counter()
+        self.end_time = None
+        self.spans = []
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return time.perf_counter() - self.start
+
+    def begin(self, name):
+        """Start a span that is closed by ``end`` with the same name"""
+        with self._lock:
+            self._open[name] = self._now()
+
+    def end(self, name, **attrs):
+        """Close a span started with ``begin``; returns its duration in seconds"""
+        now = self._now()
+        with self._lock:
+            start = self._open.pop(name, None)
+            if start is None:
+                return None
+            self.spans.append({'name': name, 'start': start, 'end': now, 'attrs': attrs})
+        return now - start
+
+    @contextmanager
+    def span(self, name, **attrs):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name, **attrs)
+
+    def mark(self, name, once=False, **attrs):
+        """Record an instant; with ``once`` only the first mark of that name counts"""
+        now = self._now()
+        with self._lock:
+            if once and any(span['name'] == name for span in self.spans):
+                return
+            self.spans.append({'name': name, 'start': now, 'end': now, 'attrs': attrs})
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def finish(self, **attrs):
+        """Close the trace and hand it to the tracer's ring buffer"""
+        with self._lock:
+            if self.end_time is not None:
+                return
+            self.attrs.update(attrs)
+            self.end_time = self._now()
+        self.tracer._record(self)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.trace_id,
+                'name': self.name,
+                'attrs': dict(self.attrs),
+                'duration_ms': None if self.end_time is None else self.end_time * 1000,
+                'spans': [
+                    {
+                        'name': span['name'],
+                        'start_ms': span['start'] * 1000,
+                        'duration_ms': (span['end'] - span['start']) * 1000,
+                        'attrs': dict(span['attrs']),
+                    }
+                    for span in self.spans
+                ],
+            }
+
+
+class LLMTiming:
+    """Times one LLM call inside a trace: time to first token and tokens/sec.
+
+    Pass ``on_chunk`` through for every streamed delta and call ``finish``
+    once the reply is complete. Each delta is counted as one token, which is
+    what OpenAI-compatible streams send, unless the provider reported its
+    usage through ``on_usage``; then its counts are used and recorded too.
+    """
+
+    def __init__(self, trace, name='llm'):
+        self.trace = trace
+        self.name = name
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.tokens = 0
+        self.usage = {}
+        trace.begin(name)
+
+    def on_chunk(self, delta):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            self.trace.mark(f'{self.name} first token', once=True)
+        self.tokens += 1
+
+    def on_usage(self, usage):
+        """Add up the usage of every call making up the reply (one per chunk)"""
+        for key in ('prompt_tokens', 'estimated_prompt_tokens', 'completion_tokens'):
+            if usage.get(key) is not None:
+                self.usage[key] = self.usage.get(key, 0) + usage[key]
+
+    def finish(self, response=None, **attrs):
+        ended = time.perf_counter()
+        if self.first_token is None:
+            # Not streamed (or served from cache): the whole reply is the first byte
+            from src.utils.text_chunker import estimate_tokens
+            self.first_token = ended
+            self.tokens = estimate_tokens(response or '')
+            generating = ended - self.started
+        else:
+            generating = ended - self.first_token
+        if 'completion_tokens' in self.usage:
+            self.tokens = self.usage['completion_tokens']
+        attrs = dict(self.usage, **attrs)
+        self.trace.end(
+            self.name,
+            ttfb_ms=(self.first_token - self.started) * 1000,
+            tokens=self.tokens,
+            tokens_per_second=self.tokens / generating if generating > 0 else None,
+            **attrs
+        )
+
+
+class Tracer:
+    """Keeps the last ``capacity`` finished traces in memory.
+
+    Tracing only stores a few floats per stage, so it stays on by default;
+    with ``enabled`` off traces are still handed out but never kept.
+    """
+
+    def __init__(self, capacity=200, enabled=True):
+        logging.debug('Tracer.__init__ called with capacity=%s', capacity)
+        self.enabled = enabled
+        self.epoch = time.perf_counter()
+        self._traces = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_trace(self, name, **attrs):
+        return Trace(self, next(self._ids), name, attrs)
+
+    def _record(self, trace):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._traces.append(trace)
+
+    def traces(self):
+        with self._lock:
+            return list(self._traces)
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+    def summary(self):
+        """p50/p95 per trace kind and stage, in milliseconds"""
+        durations = {}
+        for trace in self.traces():
+            data = trace.to_dict()
+            rows = [('total', data['duration_ms'])]
+            for span in data['spans']:
+                if span['duration_ms'] > 0:
+                    rows.append((span['name'], span['duration_ms']))
+                else:
+                    # Instants are reported as time since the trace started
+                    rows.append((span['name'], span['start_ms']))
+                for key in ('ttfb_ms', 'tokens_per_second', 'prompt_tokens', 'completion_tokens'):
+                    if span['attrs'].get(key) is not None:
+                        rows.append((f"{span['name']} {key.replace('_ms', '')}", span['attrs'][key]))
+            for stage, value in rows:
+                if value is not None:
+                    durations.setdefault((data['name'], stage), []).append(value)
+
+        return [
+            {
+                'trace': trace_name,
+                'stage': stage,
+                'count': len(values),
+                'p50': percentile(values, 0.5),
+                'p95': percentile(values, 0.95),
+                'unit': self._unit(stage),
+            }
+            for (trace_name, stage), values in durations.items()
+        ]
+
+    @staticmethod
+    def _unit(stage):
+        if stage.endswith('tokens_per_second'):
+            return 'tokens/s'
+        return 'tokens' if stage.endswith('_tokens') else 'ms'
+
+    def export_json(self):
+        return json.dumps([trace.to_dict() for trace in self.traces()], indent=2)
+
+    def export_chrome_trace(self):
+        """Export in the Trace Event format read by chrome://tracing and Perfetto"""
+        events = []
+        for trace in self.traces():
+            data = trace.to_dict()
+            base_us = (trace.start - self.epoch) * 1_000_000
+            events.append({
+                'name': data['name'], 'cat': 'trace', 'ph': 'X', 'pid': 1, 'tid': data['id'],
+                'ts': base_us, 'dur': (data['duration_ms'] or 0) * 1000, 'args': data['attrs'],
+            })
+            for span in data['spans']:
+                event = {
+                    'name': span['name'], 'cat': data['name'], 'pid': 1, 'tid': data['id'],
+                    'ts': base_us + span['start_ms'] * 1000, 'args': span['attrs'],
+                }
+                if span['duration_ms'] > 0:
+                    event.update(ph='X', dur=span['duration_ms'] * 1000)
+                else:
+                    event.update(ph='i', s='t')
+                events.append(event)
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
@@ -0,0 +1,98 @@
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+
+class CancelToken:
+    """Cooperative cancellation flag shared between a request and its worker.
+
+    Callbacks registered with ``on_cancel`` run once when the token is
+    cancelled (immediately if it already is), which lets a worker close an
+    open HTTP stream from another thread.
+    """
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id
+        self._cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """Cancel the token and run its registered callbacks"""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        logging.debug('CancelToken %s cancelled', self.request_id)
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def on_cancel(self, callback):
+        """Register a callback to run when the token is cancelled"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    @staticmethod
+    def _run_callback(callback):
+        try:
+            callback()
+        except Exception as e:
+            logging.warning('CancelToken callback failed: %s', e)
+
+
+class WorkerPool:
+    """Bounded pool of daemon worker threads.
+
+    Works like ``ThreadPoolExecutor`` but its threads are daemons, so a
+    request stuck on the network never keeps the application from exiting.
+    Threads are started lazily up to ``max_workers``; extra work is queued.
+    """
+
+    def __init__(self, max_workers=4, name='worker'):
+        logging.debug('WorkerPool.__init__ called with max_workers=%s, name=%s', max_workers, name)
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._threads = []
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) and return a Future for its result"""
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        self._adjust_thread_count()
+        return future
+
+    def _adjust_thread_count(self):
+        # Reuse an idle worker if there is one
+        if self._idle.acquire(timeout=0):
+            return
+        with self._lock:
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f'{self.name}-{len(self._threads)}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    logging.error('WorkerPool %s: task failed: %s', self.name, e)
+                    future.set_exception(e)
+            self._idle.release()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from src.managers.llm.async_openai_manager import AsyncOpenAIManager
+from src.managers.llm.openai_manager import OpenAIManager
+from src.managers.llm.resilience import CircuitOpenError, EndpointHealth, RetryPolicy
+from src.utils.worker_pool import CancelToken
+
+BASE_URL = 'http://llm.test/v1/'
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+
+def bad_request():
+    request = httpx.Request('POST', BASE_URL + 'chat/completions')
+    return openai.BadRequestError('bad request', response=httpx.Response(400, request=request), body=None)
+
+
+class FakeClient:
+    """Stands in for the OpenAI client; ``create`` is whatever the test needs"""
+
+    def __init__(self, create):
+        self.chat = self
+        self.completions = self
+        self.create = create
+
+
+def half_open_health():
+    health = EndpointHealth(failure_threshold=1, reset_timeout=0.05)
+    health.breaker(BASE_URL).record_failure()
+    time.sleep(0.06)
+    return health
+
+
+def assert_trial_allowed(health):
+    breaker = health.breaker(BASE_URL)
+    trial = breaker.before_request()
+    assert trial is not None
+    breaker.release_trial(trial)
+
+
+def test_release_trial_ignores_recorded_trials():
+    health = half_open_health()
+    breaker = health.breaker(BASE_URL)
+    first = breaker.before_request()
+    breaker.record_failure()
+    time.sleep(0.06)
+    second = breaker.before_request()
+    # The first trial ending late must not free the second one
+    breaker.release_trial(first)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.release_trial(second)
+    assert_trial_allowed(health)
+
+
+def test_non_transient_trial_is_released():
+    health = half_open_health()
+    manager = OpenAIManager(policy=RetryPolicy(max_attempts=1), health=health)
+
+    def create(**kwargs):
+        raise bad_request()
+
+    with pytest.raises(openai.BadRequestError):
+        manager._call_with_retries(FakeClient(create), BASE_URL, 'model', MESSAGES, {},
+            None, None, None)
+    assert not health.breaker(BASE_URL).is_closed
+    assert_trial_allowed(health)
+
+
+def test_cancelled_trial_is_released():
+    health = half_open_health()
+    manager = OpenAIManager(policy=RetryPolicy(max_attempts=1), health=health)
+    token = CancelToken()
+
+    def create(**kwargs):
+        # Superseded by the next request while waiting for the reply
+        token.cancel()
+        raise openai.APIConnectionError(request=httpx.Request('POST', BASE_URL))
+
+    with pytest.raises(openai.APIConnectionError):
+        manager._call_with_retries(FakeClient(create), BASE_URL, 'model', MESSAGES, {},
+            None, None, token)
+    assert_trial_allowed(health)
+
+
+def test_cancelled_async_trial_is_released():
+    health = half_open_health()
+    manager = AsyncOpenAIManager(policy=RetryPolicy(max_attempts=1), health=health)
+
+    async def create(**kwargs):
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.ensure_future(manager._call_with_retries(FakeClient(create), BASE_URL,
+            'model', MESSAGES, {}, None, None, lambda: False))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(run())
+    finally:
+        manager.close()
+    assert_trial_allowed(health)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+
+import pytest
+
+from benchmarks.mock_release_server import MockReleaseServer
+from src.utils.downloader import DownloadError, SegmentedDownloader
+
+SIZE = 3 * 1024 * 1024
+
+
+def test_resumes_dropped_segments(tmp_path):
+    dest = str(tmp_path / 'update.exe')
+    with MockReleaseServer(size=SIZE, drop_after=512 * 1024) as server:
+        SegmentedDownloader(segments=2).download(server.asset_url, dest, server.sha256)
+        # Every response is cut off, so the segments have to be continued from where they stopped
+        assert server.request_count > 3
+        with open(dest, 'rb') as f:
+            data = f.read()
+        assert len(data) == SIZE
+        assert hashlib.sha256(data).hexdigest() == server.sha256
+    assert not os.path.exists(dest + '.part')
+    assert not os.path.exists(dest + '.part.json')
+
+
+def test_rejects_checksum_mismatch(tmp_path):
+    dest = str(tmp_path / 'update.exe')
+    with MockReleaseServer(size=SIZE) as server:
+        with pytest.raises(DownloadError):
+            SegmentedDownloader().download(server.asset_url, dest, '0' * 64)
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + '.part')
+
+
+class EmptyRangeSession:
+    """Answers every range request with a 206 that ends cleanly without any data"""
+
+    class Response:
+        status_code = 206
+        headers = {'Content-Range': 'bytes 0-0/1000', 'ETag': '"empty"'}
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            return iter(())
+
+        def close(self):
+            pass
+
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        return self.Response()
+
+
+def test_gives_up_on_segments_without_data(tmp_path, monkeypatch):
+    monkeypatch.setattr('src.utils.downloader.time.sleep', lambda seconds: None)
+    session = EmptyRangeSession()
+    with pytest.raises(DownloadError):
+        SegmentedDownloader(segments=1, retries=2, session=session).download(
+            'http://updates.test/update.exe', str(tmp_path / 'update.exe'))
+    # The probe, then the first attempt and two retries
+    assert session.requests == 4
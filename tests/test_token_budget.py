@@ -0,0 +1,57 @@
+from src.managers.rewrite_manager import RewriteManager
+from src.managers.settings_snapshot import SettingsSnapshot
+from src.managers.token_budget import TokenBudget
+from src.utils.text_chunker import estimate_tokens, split_text
+
+CHINESE = '这是一个用于测试的中文句子' * 80
+
+
+class FakeLLM:
+    """Replies with the selected text, cut to ``max_tokens`` characters like a capped reply"""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_response(self, api_key, base_url, model, system_message, prompt, selected_text,
+            on_success, on_error, on_chunk=None, cancel_token=None, temperature=0.7, max_tokens=None,
+            on_usage=None):
+        self.calls.append((max_tokens, on_chunk))
+        reply = selected_text
+        finish_reason = 'stop'
+        if max_tokens is not None and len(reply) > max_tokens:
+            reply, finish_reason = reply[:max_tokens], 'length'
+        if on_chunk is not None:
+            on_chunk(reply)
+        on_usage({'prompt_tokens': None, 'completion_tokens': len(reply), 'finish_reason': finish_reason})
+        on_success(reply)
+
+    def dispatch(self, callback, *args):
+        callback(*args)
+
+
+def test_non_ascii_text_is_estimated_as_at_least_a_token_per_character():
+    assert estimate_tokens('word ' * 100) == 125
+    assert estimate_tokens(CHINESE) >= len(CHINESE)
+    plan = TokenBudget().plan('system', 'Rewrite this', CHINESE, 'Concise', chunk_tokens=2000)
+    assert plan.max_tokens >= 0.75 * len(CHINESE)
+
+
+def test_chunks_of_non_ascii_text_stay_within_the_budget():
+    chunks = split_text(CHINESE, 100)
+    assert ''.join(chunks) == CHINESE
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+
+
+def test_truncated_reply_is_retried_without_the_cap():
+    llm = FakeLLM()
+    manager = RewriteManager(llm, None, None)
+    snapshot = SettingsSnapshot.build({'max_output_tokens': 4096, 'min_output_tokens': 16}, 1)
+    results, streamed = [], []
+
+    manager.rewrite_text('x' * 400, 'Shorten this', results.append, AssertionError,
+        on_chunk=streamed.append, snapshot=snapshot, option='Summary')
+
+    assert results == ['x' * 400]
+    # The capped call streams; the uncapped retry only delivers the full reply
+    assert llm.calls[0][0] == 50 and llm.calls[0][1] is not None
+    assert llm.calls[1] == (None, None)
@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+
+import requests
+
+from benchmarks.mock_release_server import MockReleaseServer
+from src.managers.update_checker import UpdateChecker, is_newer
+
+
+def test_is_newer_compares_numerically():
+    assert is_newer('0.10.0', '0.9.0')
+    assert is_newer('v1.2.0', '1.2.0-rc1')
+    assert not is_newer('1.0', '1.0.0')
+    assert not is_newer('0.9.9', '0.10.0')
+
+
+def test_revalidates_with_etag(tmp_path):
+    with MockReleaseServer(size=1024, version='1.2.3') as server:
+        checker = UpdateChecker(str(tmp_path / 'update_cache.json'), api_url=server.latest_release_url)
+        first = checker.check(force=True)
+        second = checker.check(force=True)
+        assert first['tag_name'] == second['tag_name'] == 'v1.2.3'
+        # The second check sent If-None-Match and got a 304
+        assert server.release_requests == 2
+        assert server.not_modified == 1
+
+        # A new checker picks the ETag up from the cache file
+        reloaded = UpdateChecker(str(tmp_path / 'update_cache.json'), api_url=server.latest_release_url)
+        assert reloaded.latest_release()[0]['tag_name'] == 'v1.2.3'
+        reloaded.check(force=True)
+        assert server.not_modified == 2
+
+
+def test_rate_limit_serves_cached_release(tmp_path):
+    cache_file = tmp_path / 'update_cache.json'
+    cached = {'tag_name': 'v1.0.0', 'assets': []}
+    with MockReleaseServer(size=1024, rate_limit=0) as server:
+        # Cached without an ETag, so the check cannot be answered with a 304
+        cache_file.write_text(json.dumps({'url': server.latest_release_url, 'release': cached}))
+        checker = UpdateChecker(str(cache_file), api_url=server.latest_release_url)
+
+        assert checker.check(force=True) == cached
+        assert server.release_requests == 1
+
+        # Until the reset no request is sent, even when forced
+        assert checker.check(force=True) == cached
+        assert server.release_requests == 1
+        assert json.loads(cache_file.read_text())['retry_at'] > time.time()
+
+
+def test_latest_release_does_not_wait_for_a_check(tmp_path, monkeypatch):
+    release = {'tag_name': 'v1.0.0'}
+    cache_file = tmp_path / 'update_cache.json'
+    cache_file.write_text(json.dumps({'url': 'http://updates.test/latest', 'release': release}))
+    checker = UpdateChecker(str(cache_file), api_url='http://updates.test/latest')
+    requested = threading.Event()
+    unblock = threading.Event()
+
+    def slow_get(*args, **kwargs):
+        requested.set()
+        unblock.wait(5)
+        raise requests.exceptions.ConnectionError('offline')
+
+    monkeypatch.setattr(requests, 'get', slow_get)
+    thread = threading.Thread(target=checker.check, kwargs={'force': True})
+    thread.start()
+    try:
+        assert requested.wait(5)
+        started = time.perf_counter()
+        assert checker.latest_release()[0] == release
+        assert time.perf_counter() - started < 0.5
+    finally:
+        unblock.set()
+        thread.join()
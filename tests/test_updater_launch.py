@@ -0,0 +1,33 @@
+import os
+import sys
+
+from src.apis.settings_api import UPDATER_EXE, SettingsAPI
+
+
+def test_frozen_app_runs_a_copy_of_the_bundled_updater(tmp_path, monkeypatch):
+    bundle = tmp_path / 'bundle'
+    bundle.mkdir()
+    (bundle / UPDATER_EXE).write_bytes(b'updater')
+    temp_dir = tmp_path / 'temp'
+    temp_dir.mkdir()
+    monkeypatch.setattr(sys, 'frozen', True, raising=False)
+    monkeypatch.setattr(sys, '_MEIPASS', str(bundle), raising=False)
+
+    command = SettingsAPI._updater_command(str(temp_dir))
+
+    # Not the app's own executable, and not inside the bundle that is removed at exit
+    assert command == [str(temp_dir / UPDATER_EXE)]
+    assert (temp_dir / UPDATER_EXE).read_bytes() == b'updater'
+
+
+def test_frozen_app_without_updater(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'frozen', True, raising=False)
+    monkeypatch.setattr(sys, '_MEIPASS', str(tmp_path), raising=False)
+    assert SettingsAPI._updater_command(str(tmp_path)) is None
+
+
+def test_development_runs_the_script(tmp_path, monkeypatch):
+    monkeypatch.delattr(sys, 'frozen', raising=False)
+    monkeypatch.delattr(sys, '_MEIPASS', raising=False)
+    command = SettingsAPI._updater_command(str(tmp_path))
+    assert command[1] == os.path.abspath(os.path.join('src', 'updater.py'))